@@ -263,7 +263,9 @@ class IOWO(Elaboratable):
 				#                   jump back to the instruction that reloads the last counter
 	]
 
-	def __init__(self, *, sim = False):
+	def __init__(self, *, sim = False, specialise = False):
+		# Prune the processor down to just what IOWO.program needs
+		self.processor = PIC16(program = IOWO.program if specialise else None)
 		if sim:
 			self.ledR = Signal()
 			self.ledG = Signal()
@@ -277,7 +279,7 @@ class IOWO(Elaboratable):
 		m = Module()
 		m.domains.processor = ClockDomain()
 		m.submodules.bus = pBus = PICBus()
-		m.submodules.processor = processor = DomainRenamer({'sync': 'processor'})(PIC16())
+		m.submodules.processor = processor = DomainRenamer({'sync': 'processor'})(self.processor)
 		# This is not generated when this elaboratable is sim'd.
 		if platform is not None:
 			m.submodules.rom = rom = ROM()
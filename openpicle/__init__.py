@@ -7,7 +7,42 @@ __all__ = (
 )
 
 def cli():
-	from argparse import ArgumentParser, ArgumentDefaultsHelpFormatter
+	from argparse import ArgumentParser, ArgumentDefaultsHelpFormatter, ArgumentTypeError
+
+	def wcetProgram(value):
+		# A bundled program, IOWO's or a flash image file as the system action boots from
+		from .area import bundledPrograms
+		from .system import imageProgram
+		programs = bundledPrograms()
+		if value in programs:
+			return programs[value]
+		elif value == 'IOWO':
+			try:
+				from bitsy import IOWO
+			except ImportError as error:
+				raise ArgumentTypeError(f'bitsy.py could not be imported ({error})')
+			return IOWO.program
+		try:
+			with open(value, 'rb') as file:
+				return imageProgram(file.read())
+		except OSError as error:
+			raise ArgumentTypeError(
+				f'{value!r} is neither a bundled program ({", ".join((*programs, "IOWO"))}) nor a readable image file '
+				f'({error.strerror})'
+			)
+
+	def loopBound(value):
+		address, separator, count = value.partition('=')
+		try:
+			if not separator:
+				raise ValueError
+			address = int(address, 0)
+			count = int(count, 0)
+		except ValueError:
+			raise ArgumentTypeError(f'{value!r} is not of the form ADDRESS=COUNT')
+		if not 0 <= address < 4096 or count < 1:
+			raise ArgumentTypeError(f'{value!r} must have an address from 0 to 0xFFF and a count of at least 1')
+		return address, count
 
 	# Build the command line parser
 	parser = ArgumentParser(formatter_class = ArgumentDefaultsHelpFormatter,
@@ -17,7 +52,65 @@ def cli():
 	# Create action subparsers for building and simulation
 	actions = parser.add_subparsers(dest = 'action', required = True)
 	actions.add_parser('build', help = 'build OpenPICle for OpenLane')
-	actions.add_parser('sim', help = 'Simulate and test the gateware components')
+	simAction = actions.add_parser('sim', help = 'Simulate and test the gateware components')
+	simAction.add_argument('--jobs', '-j', type = int, default = 1,
+		help = 'Number of tests to run in parallel, 0 meaning one per CPU core')
+	simAction.add_argument('--filter', '-k', action = 'append', default = [], dest = 'filters',
+		help = 'Only run tests whose names contain (or glob match) this pattern, may be given multiple times')
+	simAction.add_argument('--junit', type = str, default = None,
+		help = 'Write a JUnit-style XML summary of the results to this file')
+	benchAction = actions.add_parser('bench', formatter_class = ArgumentDefaultsHelpFormatter,
+		help = 'Benchmark simulation throughput of the gateware components')
+	benchAction.add_argument('--cycles', '-n', type = int, default = 20000,
+		help = 'Number of clock cycles to simulate each design for')
+	benchAction.add_argument('--filter', '-k', action = 'append', default = [], dest = 'filters',
+		help = 'Only run benchmarks whose names contain this string, may be given multiple times')
+	benchAction.add_argument('--output', '-o', type = str, default = 'bench.json',
+		help = 'File to write the results to as JSON')
+	benchAction.add_argument('--baseline', '-b', type = str, default = None,
+		help = 'JSON results from a previous run to compare against')
+	profileAction = actions.add_parser('profile', formatter_class = ArgumentDefaultsHelpFormatter,
+		help = 'Profile a core running its bundled program, by address, opcode and loop')
+	profileAction.add_argument('--core', type = str, default = 'PIC16', choices = ('PIC16', 'PipelinedPIC16', 'IOWO', 'Caravel'),
+		help = 'Core (or design) to simulate, Caravel booting PIC16Caravel from flash')
+	profileAction.add_argument('--cycles', '-n', type = int, default = 20000,
+		help = 'Number of clock cycles to simulate for')
+	profileAction.add_argument('--output', '-o', type = str, default = 'profile.json',
+		help = 'File to write the profile to as JSON')
+	wcetAction = actions.add_parser('wcet', formatter_class = ArgumentDefaultsHelpFormatter,
+		help = 'Work out the worst case execution time and call stack depth of a program image')
+	wcetAction.add_argument('program', type = wcetProgram, nargs = '?', default = 'delayLoop',
+		help = 'Program to analyse, either delayLoop, IOWO or a flash image file as taken by system --image')
+	wcetAction.add_argument('--bound', '-b', type = loopBound, action = 'append', default = [], dest = 'bounds',
+		help = 'Loop bound as ADDRESS=COUNT, where ADDRESS is the branch back to the loop\'s start, may be given multiple times')
+	wcetAction.add_argument('--fuse-loops', action = 'store_true', help = 'Analyse for a core built with fuseLoops')
+	wcetAction.add_argument('--interrupts', action = 'store_true',
+		help = 'Include the interrupt handler at 0x004 in the call stack depth')
+	wcetAction.add_argument('--flash', type = str, default = None, choices = ('fastRead', 'continuousRead', 'fullRate'),
+		help = 'Fetch instructions through the QSPI Controller in this mode rather than from a synchronous ROM')
+	wcetAction.add_argument('--frequency', type = float, default = 25e6, help = 'Clock frequency to report times at')
+	systemAction = actions.add_parser('system', formatter_class = ArgumentDefaultsHelpFormatter,
+		help = 'Simulate PIC16Caravel booting from flash, reporting the end to end instruction rate')
+	systemAction.add_argument('--image', type = str, default = None,
+		help = 'Flash image to boot from, rather than the bundled delay loop')
+	systemAction.add_argument('--cycles', '-n', type = int, default = 20000, help = 'Number of clock cycles to simulate for')
+	systemAction.add_argument('--pipelined', action = 'store_true', help = 'Use the pipelined core')
+	systemAction.add_argument('--cache-lines', type = int, default = 0,
+		help = 'Instruction cache lines, 0 fetching through the prefetch buffer instead')
+	systemAction.add_argument('--cache-line-words', type = int, default = 2, help = 'Words in each instruction cache line')
+	systemAction.add_argument('--continuous-read', action = 'store_true', help = 'Read the flash in continuous read mode')
+	systemAction.add_argument('--full-rate', action = 'store_true', help = 'Run the flash clock at the system clock rate')
+	systemAction.add_argument('--dummy-cycles', type = int, default = 4, help = 'Flash dummy cycles for each read')
+	systemAction.add_argument('--output', '-o', type = str, default = 'system.json',
+		help = 'File to write the results to as JSON')
+	areaAction = actions.add_parser('area', formatter_class = ArgumentDefaultsHelpFormatter,
+		help = 'Report the area and Fmax of the cores, generic and specialised to the bundled programs')
+	areaAction.add_argument('--liberty', type = str, default = None,
+		help = 'Liberty file (such as sky130_fd_sc_hd\'s) to also map the cores to for a cell area')
+	areaAction.add_argument('--device', type = str, default = 'up5k', help = 'iCE40 device to place and route for')
+	areaAction.add_argument('--package', type = str, default = 'sg48', help = 'iCE40 package to place and route for')
+	areaAction.add_argument('--output', '-o', type = str, default = 'area.json',
+		help = 'File to write the results to as JSON')
 
 	# Parse the command line and, if `-v` is specified, bump the logging level
 	args = parser.parse_args()
@@ -27,14 +120,69 @@ def cli():
 
 	# Dispatch the action requested
 	if args.action == 'sim':
-		from unittest.loader import TestLoader
-		from unittest.runner import TextTestRunner
+		from os import cpu_count
+		from time import perf_counter
+		from .testRunner import discoverTests, runTests, printSummary, writeJUnit
+
+		jobs = args.jobs if args.jobs > 0 else cpu_count()
+		begin = perf_counter()
+		outcomes = runTests(discoverTests(filters = args.filters), jobs = jobs)
+		elapsed = perf_counter() - begin
+
+		printSummary(outcomes, elapsed)
+		if args.junit is not None:
+			writeJUnit(outcomes, args.junit, elapsed = elapsed)
+		return 0 if all(outcome.status in ('pass', 'skip') for outcome in outcomes) else 1
+	elif args.action == 'bench':
+		from .bench import runBenchmarks, printResults, writeResults, readResults
+
+		baseline = readResults(args.baseline) if args.baseline is not None else None
+		results = runBenchmarks(cycles = args.cycles, filters = args.filters)
+		printResults(results, baseline)
+		writeResults(results, args.output)
+		return 0
+	elif args.action == 'profile':
+		from .profile import profileProgram, printProfile, writeProfile
 
-		loader = TestLoader()
-		tests = loader.discover(start_dir = 'openpicle.sim', pattern = '*.py')
+		profile, program = profileProgram(args.core, cycles = args.cycles)
+		printProfile(profile, program)
+		writeProfile(profile, args.output)
+		return 0
+	elif args.action == 'wcet':
+		from .wcet import FetchLatency, measureFetchLatency, analyse, printAnalysis
+
+		if args.flash is None:
+			fetchLatency = FetchLatency()
+		else:
+			fetchLatency = measureFetchLatency(continuousRead = args.flash != 'fastRead', fullRate = args.flash == 'fullRate')
+		analysis = analyse(
+			args.program, loopBounds = dict(args.bounds), fetchLatency = fetchLatency,
+			fuseLoops = args.fuse_loops, interrupts = args.interrupts
+		)
+		printAnalysis(analysis, frequency = args.frequency)
+		return 0
+	elif args.action == 'system':
+		from .system import CaravelSystem, programImage, printSystemResult, writeSystemResult
+
+		if args.image is None:
+			from .pic16.programs import delayLoop
+			image = programImage(delayLoop)
+		else:
+			image = args.image
+		system = CaravelSystem(
+			image, pipelined = args.pipelined, cacheLines = args.cache_lines, cacheLineWords = args.cache_line_words,
+			continuousRead = args.continuous_read, flashFullRate = args.full_rate, flashDummyCycles = args.dummy_cycles
+		)
+		result = system.run(args.cycles)
+		printSystemResult(result, frequency = system.platform.default_clk_frequency)
+		writeSystemResult(result, args.output)
+		return 0
+	elif args.action == 'area':
+		from .area import bundledPrograms, areaReport, printAreaReport, writeAreaReport
 
-		runner = TextTestRunner()
-		runner.run(tests)
+		results = areaReport(bundledPrograms(), liberty = args.liberty, device = args.device, package = args.package)
+		printAreaReport(results)
+		writeAreaReport(results, args.output)
 		return 0
 	elif args.action == 'build':
 		platform = OpenPIClePlatform()
@@ -0,0 +1,140 @@
+# SPDX-License-Identifier: BSD-3-Clause
+from json import dump, load
+from pathlib import Path
+from shutil import which
+from subprocess import run, DEVNULL
+from tempfile import TemporaryDirectory
+from typing import Dict, List, NamedTuple, Optional, Sequence
+
+__all__ = (
+	'AreaResult',
+	'bundledPrograms',
+	'areaReport',
+	'printAreaReport',
+	'writeAreaReport',
+)
+
+class AreaResult(NamedTuple):
+	core : str
+	# The program the core was specialised to, or None for the full instruction set
+	program : Optional[str]
+	opcodes : int
+	units : List[str]
+	# iCE40 results from yosys (LUTs and flip-flops) and nextpnr (Fmax, MHz)
+	luts : Optional[int] = None
+	flops : Optional[int] = None
+	fmax : Optional[float] = None
+	# Cell area in µm² against a liberty file, such as sky130_fd_sc_hd's
+	area : Optional[float] = None
+
+def bundledPrograms() -> Dict[str, Sequence[int]]:
+	from .pic16.programs import delayLoop
+	# This is also IOWO.program, the bitsy demo's LED blinker
+	return {'delayLoop': delayLoop}
+
+def _coreVariants(programs):
+	from .pic16 import PIC16
+	from .pic16.pipeline import PipelinedPIC16
+	for core in (PIC16, PipelinedPIC16):
+		yield core.__name__, None, core()
+		for name, program in programs.items():
+			yield core.__name__, name, core(program = program)
+
+def _synthesise(core, workDir : Path, *, liberty, device, package):
+	from torii.back import rtlil
+	ports = [*core.iBus.fields.values(), *core.pBus.fields.values()]
+	(workDir / 'core.il').write_text(rtlil.convert(core, name = 'core', ports = ports))
+
+	script = [
+		'read_rtlil core.il',
+		'synth_ice40 -abc9 -top core -json core.json',
+		'tee -q -o ice40.json stat -json',
+	]
+	if liberty is not None:
+		script += [
+			'design -reset',
+			'read_rtlil core.il',
+			'synth -top core',
+			f'dfflibmap -liberty {liberty}',
+			f'abc -liberty {liberty}',
+			f'tee -q -o asic.json stat -json -liberty {liberty}',
+		]
+	run(['yosys', '-q', '-p', '; '.join(script)], cwd = workDir, check = True, stdout = DEVNULL)
+
+	cells = load((workDir / 'ice40.json').open())['design']['num_cells_by_type']
+	luts = cells.get('SB_LUT4', 0)
+	flops = sum(count for cell, count in cells.items() if cell.startswith('SB_DFF'))
+	area = load((workDir / 'asic.json').open())['design'].get('area') if liberty is not None else None
+
+	fmax = None
+	if which('nextpnr-ice40') is not None:
+		run([
+			'nextpnr-ice40', f'--{device}', '--package', package, '--json', 'core.json',
+			'--pcf-allow-unconstrained', '--report', 'report.json', '--quiet',
+		], cwd = workDir, check = True, stdout = DEVNULL, stderr = DEVNULL)
+		clocks = load((workDir / 'report.json').open()).get('fmax', {})
+		if clocks:
+			fmax = min(clock['achieved'] for clock in clocks.values())
+	return luts, flops, fmax, area
+
+def areaReport(
+	programs : Dict[str, Sequence[int]], *, liberty : Optional[str] = None, device : str = 'up5k',
+	package : str = 'sg48'
+) -> List[AreaResult]:
+	'''Build each core for the full instruction set and specialised to each program, reporting their size.
+
+	Synthesis needs yosys (and nextpnr-ice40 for Fmax) on the PATH. Without it, only what was pruned from
+	each core is reported.
+	'''
+	synthesise = which('yosys') is not None
+	if not synthesise:
+		print('yosys not found, reporting the pruned cores without synthesising them', flush = True)
+	results = []
+	for core, program, dut in _coreVariants(programs):
+		units = [unit for unit in ('logic', 'bitmanip', 'callStack') if dut.usesUnit(unit)]
+		result = AreaResult(core, program, len(dut.opcodes), units)
+		if synthesise:
+			with TemporaryDirectory(prefix = 'openpicle-area-') as workDir:
+				luts, flops, fmax, area = _synthesise(
+					dut, Path(workDir), liberty = liberty, device = device, package = package
+				)
+			result = result._replace(luts = luts, flops = flops, fmax = fmax, area = area)
+		print(f'{core} ({program or "generic"}): done', flush = True)
+		results.append(result)
+	return results
+
+def printAreaReport(results : Sequence[AreaResult]):
+	def formatField(value, generic, spec):
+		if value is None:
+			return f'{"-":>{spec}}'
+		text = f'{value:.1f}' if isinstance(value, float) else f'{value}'
+		# Show how each specialised core compares to the generic one it was pruned from
+		if generic and generic != value:
+			text += f' ({(value - generic) / generic:+.0%})'
+		return f'{text:>{spec}}'
+
+	header = (
+		f'{"core":<16} {"program":<12} {"opcodes":>7} {"units":<26} {"LUTs":>12} {"FFs":>12} '
+		f'{"Fmax (MHz)":>14} {"area (µm²)":>18}'
+	)
+	print(header)
+	print('-' * len(header))
+	generic = {}
+	for result in results:
+		if result.program is None:
+			generic[result.core] = result
+		base = generic.get(result.core) if result.program is not None else None
+		fields = ('luts', 'flops', 'fmax', 'area')
+		luts, flops, fmax, area = (
+			formatField(getattr(result, field), getattr(base, field) if base else None, width)
+			for field, width in zip(fields, (12, 12, 14, 18))
+		)
+		print(
+			f'{result.core:<16} {result.program or "generic":<12} {result.opcodes:>7} '
+			f'{", ".join(result.units) or "-":<26} {luts} {flops} {fmax} {area}'
+		)
+
+def writeAreaReport(results : Sequence[AreaResult], fileName : str):
+	with open(fileName, 'w') as file:
+		dump([result._asdict() for result in results], file, indent = '\t')
+		file.write('\n')
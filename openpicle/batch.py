@@ -0,0 +1,108 @@
+# SPDX-License-Identifier: BSD-3-Clause
+from typing import List, NamedTuple, Optional, Sequence
+
+__all__ = (
+	'BatchResult',
+	'Batch',
+)
+
+class BatchResult(NamedTuple):
+	pc : int
+	wreg : int
+	flags : int
+	pcLatchHigh : int
+	fsr : int
+	bsr : int
+	memory : bytes
+	# From the end of the reset pulse to the state being captured
+	cycles : int
+
+class _Program(NamedTuple):
+	program : Sequence[int]
+	instructions : int
+	memory : bytes
+
+class Batch:
+	'''Runs a queue of programs one after another through a single simulated :class:`PIC16`, so the core is
+	elaborated and the simulator built just once however many programs there are.
+
+	The options are passed through to the core, which is left unspecialised so it runs any program. Each
+	program is served by a :class:`BusModel`, with the register file behind the peripheral bus starting out
+	as the memory given. The core is held in reset for a cycle before each program and, once the requested
+	number of instruction slots have retired, the state is captured when the last of them has taken effect,
+	as it would be in :class:`PIC16Model` after the same number of steps. As every slot takes 4 cycles, a
+	program not done within that many cycles for each slot raises RuntimeError.
+
+	Interrupts are never raised.
+	'''
+
+	def __init__(self, **options):
+		from torii import ClockDomain
+		from .pic16 import PIC16
+		assert 'program' not in options, 'The core must be able to run any program in the batch'
+		self.core = PIC16(**options)
+		self.domain = ClockDomain('sync')
+		self._programs : List[_Program] = []
+
+	def add(self, program : Sequence[int], *, instructions : int, memory : Optional[bytes] = None) -> int:
+		'''Queue a program to run for the given number of instruction slots, returning its index in the results'''
+		assert instructions > 0, 'A program must run for at least one instruction slot'
+		image = [0] * 4096
+		image[:len(program)] = program
+		self._programs.append(_Program(image, instructions, bytes(128) if memory is None else bytes(memory)))
+		return len(self._programs) - 1
+
+	def run(self) -> List[BatchResult]:
+		from torii import Module
+		from torii.sim import Simulator
+		results = []
+		# Own the sync domain so its reset can be driven between programs
+		m = Module()
+		m.domains.sync = self.domain
+		m.submodules.core = self.core
+
+		def process():
+			for program in self._programs:
+				results.append((yield from self._execute(program)))
+
+		sim = Simulator(m)
+		sim.add_clock(1 / 25e6)
+		sim.add_sync_process(process)
+		sim.run()
+		return results
+
+	def _execute(self, program : _Program):
+		from .busModel import BusModel
+		core = self.core
+		memory = bytearray(program.memory)
+
+		yield self.domain.rst.eq(1)
+		yield
+		yield self.domain.rst.eq(0)
+
+		# Coming out of reset the core is in Q0, making its first fetch from address 0
+		bus = BusModel(core.iBus, core.pBus, program = program.program, memory = memory, pc = None)
+		retired = 0
+		# The last instruction has had all its effects by Q2 of the slot after it, 3 cycles on from retiring
+		sinceRetire = None
+		cycles = 0
+		while sinceRetire != 3:
+			if cycles > 4 * program.instructions + 4:
+				raise RuntimeError(f'The core retired only {retired} of {program.instructions} instruction slots')
+			yield from bus.present()
+			yield from bus.complete()
+			if sinceRetire is not None:
+				sinceRetire += 1
+			elif (yield core.retire):
+				retired += 1
+				if retired == program.instructions:
+					sinceRetire = 0
+			if sinceRetire == 3:
+				break
+			cycles += 1
+			yield
+
+		return BatchResult(
+			(yield core.pc), (yield core.wreg), (yield core.flags), (yield core.pcLatchHigh), (yield core.fsr),
+			(yield core.bsr), bytes(memory), cycles
+		)
@@ -0,0 +1,256 @@
+# SPDX-License-Identifier: BSD-3-Clause
+from json import dump, load
+from time import perf_counter
+from typing import Callable, Dict, List, NamedTuple, Optional, Sequence
+
+__all__ = (
+	'BenchResult',
+	'benchmarks',
+	'runBenchmarks',
+	'printResults',
+	'writeResults',
+	'readResults',
+)
+
+class BenchResult(NamedTuple):
+	name : str
+	cycles : int
+	# Instructions (or bus transactions/unit operations for non-processor DUTs) completed
+	operations : int
+	elaborateTime : float
+	simulateTime : float
+
+	@property
+	def cyclesPerSecond(self) -> float:
+		return self.cycles / self.simulateTime if self.simulateTime else 0.0
+
+	@property
+	def operationsPerSecond(self) -> float:
+		return self.operations / self.simulateTime if self.simulateTime else 0.0
+
+class BenchSkipped(Exception):
+	pass
+
+def _simulate(name, dut, testbench, cycles) -> BenchResult:
+	from torii.sim import Simulator
+
+	# testbench() runs for the requested cycle count and then returns the number of operations completed
+	operations = []
+	def process():
+		operations.append((yield from testbench(cycles)))
+
+	begin = perf_counter()
+	sim = Simulator(dut)
+	sim.add_clock(1 / 25e6)
+	sim.add_sync_process(process)
+	elaborated = perf_counter()
+	sim.run()
+	finished = perf_counter()
+	return BenchResult(name, cycles, operations[0], elaborated - begin, finished - elaborated)
+
+def _clocked(dut):
+	# Purely combinational DUTs have no sync domain for the benchmark clock to drive, so give them one
+	from torii import Module, ClockDomain
+	m = Module()
+	m.domains.sync = ClockDomain()
+	m.submodules.dut = dut
+	return m
+
+def _benchPIC16(cycles):
+	from .pic16 import PIC16
+	from .pic16.programs import delayLoop
+	from .busModel import BusModel
+	dut = PIC16()
+	# Instruction fetches stand in for the instructions executed
+	return _simulate('PIC16', dut, BusModel(dut.iBus, dut.pBus, program = delayLoop).run, cycles)
+
+def _benchPipelinedPIC16(cycles):
+	from .pic16.pipeline import PipelinedPIC16
+	from .pic16.programs import delayLoop
+	from .busModel import BusModel
+	dut = PipelinedPIC16()
+	return _simulate('PipelinedPIC16', dut, BusModel(dut.iBus, dut.pBus, program = delayLoop).run, cycles)
+
+def _benchALU(cycles):
+	from random import Random
+	from .pic16.types import ArithOpcode, LogicOpcode
+	from .pic16.alu import ALU
+	dut = ALU()
+	random = Random(0)
+	arithOps = list(ArithOpcode)
+	logicOps = list(LogicOpcode)
+
+	def testbench(cycles):
+		for _ in range(cycles):
+			yield dut.arithOpcode.eq(random.choice(arithOps))
+			yield dut.arithLHS.eq(random.getrandbits(8))
+			yield dut.arithRHS.eq(random.getrandbits(8))
+			yield dut.logicOpcode.eq(random.choice(logicOps))
+			yield dut.logicLHS.eq(random.getrandbits(8))
+			yield dut.logicRHS.eq(random.getrandbits(8))
+			yield
+		return cycles
+	return _simulate('ArithUnit/LogicUnit', dut, testbench, cycles)
+
+def _benchBitmanip(cycles):
+	from random import Random
+	from .pic16.types import BitOpcode
+	from .pic16.bitmanip import Bitmanip
+	dut = Bitmanip()
+	random = Random(0)
+	operations = list(BitOpcode)
+
+	def testbench(cycles):
+		yield dut.enable.eq(1)
+		for _ in range(cycles):
+			yield dut.operation.eq(random.choice(operations))
+			yield dut.value.eq(random.getrandbits(8))
+			yield dut.carryIn.eq(random.getrandbits(1))
+			yield dut.targetBit.eq(random.getrandbits(3))
+			yield
+		return cycles
+	return _simulate('Bitmanip', _clocked(dut), testbench, cycles)
+
+def _benchCallStack(cycles):
+	from .pic16.callStack import CallStack
+	dut = CallStack()
+
+	def testbench(cycles):
+		# Fill the stack then drain it again, with an idle cycle between each operation
+		operations = 0
+		for cycle in range(cycles):
+			if cycle & 1:
+				yield dut.push.eq(0)
+				yield dut.pop.eq(0)
+			else:
+				pushing = (cycle >> 4) & 1 == 0
+				yield dut.valueIn.eq(cycle & 0xFFF)
+				yield dut.push.eq(pushing)
+				yield dut.pop.eq(not pushing)
+				operations += 1
+			yield
+		return operations
+	return _simulate('CallStack', dut, testbench, cycles)
+
+def _benchQSPI(cycles, *, continuousRead = False, fullRate = False):
+	from torii import Elaboratable, Module, Fragment
+	from torii.sim import Settle
+	from .soc.busses.qspi.controller import Controller
+	from .soc.busses.qspi.flash import FlashPlatform
+
+	class DUT(Elaboratable):
+		def __init__(self):
+			self.platform = FlashPlatform()
+			self.controller = Controller(('qspi-flash', 0), continuousRead = continuousRead, fullRate = fullRate)
+
+		def elaborate(self, platform):
+			m = Module()
+			# The controller requests its flash resource during elaboration, so stand in a platform for it
+			m.submodules.controller = Fragment.get(self.controller, self.platform)
+			return m
+
+	dut = DUT()
+	controller = dut.controller
+	bus = dut.platform.bus
+
+	def testbench(cycles):
+		reads = 0
+		for cycle in range(cycles):
+			yield bus.dq.i.eq(cycle & 0xF)
+			yield controller.address.eq(reads * 2)
+			yield controller.read.eq(1)
+			yield Settle()
+			if (yield controller.complete):
+				reads += 1
+			yield
+		return reads
+	modes = ', '.join(mode for mode, enabled in (('XIP', continuousRead), ('full rate', fullRate)) if enabled)
+	return _simulate(f'QSPI Controller/Bus{f" ({modes})" if modes else ""}', dut, testbench, cycles)
+
+def _benchIOWO(cycles):
+	try:
+		from bitsy import IOWO
+	except ImportError as error:
+		raise BenchSkipped(f'bitsy.py could not be imported ({error})')
+	from .busModel import BusModel
+	dut = IOWO(sim = True)
+	# In simulation IOWO brings its instruction bus out to the top level
+	return _simulate('IOWO', dut, BusModel(dut, program = IOWO.program).run, cycles)
+
+def _benchModel(cycles):
+	from .pic16.model import PIC16Model
+	from .pic16.programs import delayLoop
+	begin = perf_counter()
+	model = PIC16Model(delayLoop)
+	elaborated = perf_counter()
+	model.run(cycles // 4)
+	finished = perf_counter()
+	return BenchResult('PIC16Model', model.cycles, model.instructions, elaborated - begin, finished - elaborated)
+
+benchmarks : Dict[str, Callable[[int], BenchResult]] = {
+	'PIC16': _benchPIC16,
+	'PipelinedPIC16': _benchPipelinedPIC16,
+	'ArithUnit/LogicUnit': _benchALU,
+	'Bitmanip': _benchBitmanip,
+	'CallStack': _benchCallStack,
+	'QSPI Controller/Bus': _benchQSPI,
+	'QSPI Controller/Bus (XIP)': lambda cycles: _benchQSPI(cycles, continuousRead = True),
+	'QSPI Controller/Bus (XIP, full rate)': lambda cycles: _benchQSPI(cycles, continuousRead = True, fullRate = True),
+	'IOWO': _benchIOWO,
+	'PIC16Model': _benchModel,
+}
+
+def runBenchmarks(*, cycles : int, filters : Sequence[str] = ()) -> List[BenchResult]:
+	'''Run every benchmark whose name contains one of the filters (or all of them), for the given cycle count'''
+	results = []
+	for name, benchmark in benchmarks.items():
+		if filters and not any(pattern.lower() in name.lower() for pattern in filters):
+			continue
+		try:
+			result = benchmark(cycles)
+		except BenchSkipped as reason:
+			print(f'{name}: skipped, {reason}', flush = True)
+			continue
+		print(f'{name}: {result.cyclesPerSecond:,.0f} cycles/s', flush = True)
+		results.append(result)
+	return results
+
+def printResults(results : Sequence[BenchResult], baseline : Optional[Dict[str, dict]] = None):
+	width = max((len(result.name) for result in results), default = 20)
+	header = f'{"DUT":<{width}} {"cycles":>10} {"elab (s)":>9} {"sim (s)":>9} {"cycles/s":>12} {"ops/s":>12}'
+	if baseline is not None:
+		header += f' {"vs baseline":>12}'
+	print(header)
+	print('-' * len(header))
+	total = sum(result.simulateTime for result in results)
+	for result in results:
+		line = (
+			f'{result.name:<{width}} {result.cycles:>10} {result.elaborateTime:>9.3f} {result.simulateTime:>9.3f} '
+			f'{result.cyclesPerSecond:>12,.0f} {result.operationsPerSecond:>12,.0f}'
+		)
+		if baseline is not None:
+			previous = baseline.get(result.name)
+			if previous is None or not previous.get('cyclesPerSecond'):
+				line += f' {"-":>12}'
+			else:
+				line += f' {result.cyclesPerSecond / previous["cyclesPerSecond"]:>11.2f}x'
+		print(line)
+	print('-' * len(header))
+	if total:
+		slowest = max(results, key = lambda result: result.simulateTime)
+		print(f'{slowest.name} dominates with {slowest.simulateTime / total:.0%} of {total:.3f}s simulating')
+
+def writeResults(results : Sequence[BenchResult], fileName : str):
+	with open(fileName, 'w') as file:
+		dump({
+			result.name: {
+				**result._asdict(),
+				'cyclesPerSecond': result.cyclesPerSecond,
+				'operationsPerSecond': result.operationsPerSecond,
+			} for result in results
+		}, file, indent = '\t')
+		file.write('\n')
+
+def readResults(fileName : str) -> Dict[str, dict]:
+	with open(fileName, 'r') as file:
+		return load(file)
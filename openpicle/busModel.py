@@ -0,0 +1,76 @@
+# SPDX-License-Identifier: BSD-3-Clause
+from typing import Optional, Sequence, Tuple
+
+__all__ = (
+	'BusModel',
+)
+
+class BusModel:
+	'''Serves a core's instruction and peripheral busses from Python in a Torii simulation.
+
+	Instructions come from the program image as they would from a synchronous ROM, each word being presented
+	the cycle after it's read. Sync processes start after the first clock edge, by which point the first
+	fetch (from pc) has already happened. Where the core is yet to make its first fetch, such as when it's
+	just come out of reset, pc should be None. If the core can be held by a fetch unit, give the signal
+	holding it as stall, fetches only being taken while it's low.
+
+	Given a peripheral bus, it is backed by memory, a 128 byte register file which like PICBus presents read
+	data the cycle after pBus.read. iBus can be anything with address, data and read, such as IOWO brings out
+	in simulation.
+
+	Each cycle, :meth:`present` drives the busses and :meth:`complete` then takes the accesses the core made,
+	after which the process yields to the next cycle. In between, the core's outputs for the cycle can be
+	inspected. :meth:`run` and :meth:`process` do all of that for testbenches needing nothing more.
+	'''
+
+	def __init__(
+		self, iBus, pBus = None, *, program : Sequence[int], memory : Optional[bytearray] = None,
+		pc : Optional[int] = 0, stall = None
+	):
+		self.iBus = iBus
+		self.pBus = pBus
+		self.program = program
+		self.memory = bytearray(128) if memory is None else memory
+		self.stall = stall
+		self.fetches = 0
+		self._fetched = 0 if pc is None else program[pc]
+		self._reading = False
+
+	def present(self):
+		'''Present this cycle's instruction word and read data, returning once they've settled'''
+		from torii.sim import Settle
+		yield Settle()
+		yield self.iBus.data.eq(self._fetched)
+		if self.pBus is not None:
+			yield self.pBus.readData.eq(self.memory[(yield self.pBus.address)] if self._reading else 0)
+		yield Settle()
+
+	def complete(self) -> Optional[Tuple[int, int]]:
+		'''Take this cycle's fetch, read and write, returning the write as (address, value) if there was one'''
+		write = None
+		if self.pBus is not None:
+			if (yield self.pBus.write):
+				write = (yield self.pBus.address), (yield self.pBus.writeData)
+				self.memory[write[0]] = write[1]
+			self._reading = yield self.pBus.read
+		if (yield self.iBus.read) and not (self.stall is not None and (yield self.stall)):
+			self._fetched = self.program[(yield self.iBus.address) % len(self.program)]
+			self.fetches += 1
+		return write
+
+	def run(self, cycles : int) -> int:
+		'''Serve the busses for the given number of cycles, returning the number of instructions fetched'''
+		for _ in range(cycles):
+			yield from self.present()
+			yield from self.complete()
+			yield
+		return self.fetches
+
+	def process(self):
+		'''Sync process serving the busses for as long as the simulation runs'''
+		from torii.sim import Passive
+		yield Passive()
+		while True:
+			yield from self.present()
+			yield from self.complete()
+			yield
@@ -6,15 +6,51 @@ __all__ = (
 )
 
 class PIC16Caravel(Elaboratable):
+	def __init__(
+		self, *, pipelined = False, cacheLines = 0, cacheLineWords = 2, continuousRead = False, flashFullRate = False,
+		flashDummyCycles = 4, flashSampleDelay = 0, program = None
+	):
+		self.pipelined = pipelined
+		# Specialise the core to this program image when given
+		self.program = program
+		self.continuousRead = continuousRead
+		# Flash clocking to suit the part fitted, see the QSPI Controller and Bus
+		self.flashFullRate = flashFullRate
+		self.flashDummyCycles = flashDummyCycles
+		self.flashSampleDelay = flashSampleDelay
+		# With no cache lines, instruction fetches go through a single word prefetch buffer instead
+		self.cacheLines = cacheLines
+		self.cacheLineWords = cacheLineWords
+		# For simulation, strobed as the running core issues an instruction fetch and retires an instruction,
+		# with the address of each, and raised while the fetch unit holds the core
+		self.fetch = Signal()
+		self.fetchAddress = Signal(12)
+		self.retire = Signal()
+		self.retirePC = Signal(12)
+		self.stall = Signal()
+
 	def elaborate(self, platform):
 		from .pic16 import PIC16
+		from .pic16.pipeline import PipelinedPIC16
 		from .soc.busses.qspi import QSPIBus
+		from .soc.prefetch import Prefetcher
+		from .soc.icache import InstructionCache
 		m = Module()
 		reset = Signal()
-		busy_n = Signal(reset = 1)
+		busy_n = Signal()
 
-		m.submodules.qspiFlash = qspiFlash = QSPIBus(resourceName = ('spi_flash_4x', 0))
-		m.submodules.pic = pic = ResetInserter(reset)(EnableInserter(busy_n)(PIC16()))
+		m.submodules.qspiFlash = qspiFlash = QSPIBus(
+			resourceName = ('spi_flash_4x', 0), continuousRead = self.continuousRead,
+			dummyCycles = self.flashDummyCycles, fullRate = self.flashFullRate, sampleDelay = self.flashSampleDelay
+		)
+		if self.cacheLines:
+			fetchUnit = InstructionCache(lines = self.cacheLines, lineWords = self.cacheLineWords)
+		else:
+			fetchUnit = Prefetcher()
+		m.submodules.fetchUnit = fetchUnit
+		m.submodules.pic = pic = ResetInserter(reset)(EnableInserter(busy_n)(
+			PipelinedPIC16(program = self.program) if self.pipelined else PIC16(program = self.program)
+		))
 
 		run = platform.request('run', 0)
 		pBus = platform.request('p_bus', 0)
@@ -25,19 +61,27 @@ class PIC16Caravel(Elaboratable):
 		read = pBus.read
 		write = pBus.write
 
-		with m.If(qspiFlash.complete | reset):
-			m.d.sync += busy_n.eq(1)
-		with m.Elif(pic.iBus.read):
-			m.d.sync += busy_n.eq(0)
-
 		m.d.comb += [
 			reset.eq(~qspiFlash.ready),
+			busy_n.eq(~fetchUnit.stall),
 			run.o.eq(qspiFlash.ready & busy_n),
+			self.fetch.eq(pic.iBus.read & busy_n & ~reset),
+			self.fetchAddress.eq(pic.iBus.address),
+			self.retire.eq(pic.retire & busy_n & ~reset),
+			self.retirePC.eq(pic.retirePC),
+			self.stall.eq(fetchUnit.stall & ~reset),
+
+			# Fetches go through the fetch unit, which only holds the core when the word it wants isn't to hand
+			fetchUnit.iBus.address.eq(pic.iBus.address),
+			fetchUnit.iBus.read.eq(pic.iBus.read & ~reset),
+			pic.iBus.data.eq(fetchUnit.iBus.data),
 
 			qspiFlash.address[0].eq(0),
-			qspiFlash.address[1:].eq(pic.iBus.address),
-			pic.iBus.data.eq(qspiFlash.data),
-			qspiFlash.read.eq(pic.iBus.read),
+			qspiFlash.address[1:].eq(fetchUnit.flashAddress),
+			qspiFlash.read.eq(fetchUnit.flashRead),
+			fetchUnit.flashData.eq(qspiFlash.data),
+			fetchUnit.flashReady.eq(qspiFlash.ready),
+			fetchUnit.flashComplete.eq(qspiFlash.complete),
 
 			addr.eq(pic.pBus.address),
 			read.eq(pic.pBus.read),
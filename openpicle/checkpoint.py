@@ -0,0 +1,100 @@
+# SPDX-License-Identifier: BSD-3-Clause
+from json import dump, load
+from typing import Dict, Optional
+
+__all__ = (
+	'toriiVersion',
+	'signalNames',
+	'saveCheckpoint',
+	'loadCheckpoint',
+)
+
+# Torii has no public interface to a simulation's signal values or to the names it gives signals, so
+# checkpoints go through its internals, which were checked against this release
+toriiVersion = '0.8.1'
+
+def _internals(simulator):
+	'''Reach the simulator internals checkpoints need, failing clearly if Torii no longer has them'''
+	import torii
+	from torii.hdl.ir import Fragment
+	from torii.sim.pysim import PySimEngine
+	engine = getattr(simulator, '_engine', None)
+	if engine is not None and not isinstance(engine, PySimEngine):
+		raise TypeError(f'Checkpoints need the pysim engine, not {type(engine).__name__}')
+	state = getattr(engine, '_state', None)
+	required = (
+		('Simulator._fragment', simulator, '_fragment'),
+		('Simulator._engine', simulator, '_engine'),
+		('Fragment._assign_names_to_fragments', Fragment, '_assign_names_to_fragments'),
+		('Fragment._assign_names_to_signals', Fragment, '_assign_names_to_signals'),
+		('PySimEngine._state', engine, '_state'),
+		('_PySimulation.signals', state, 'signals'),
+		('_PySimulation.slots', state, 'slots'),
+		('_PySimulation.get_signal', state, 'get_signal'),
+	)
+	missing = [name for name, value, attribute in required if not hasattr(value, attribute)]
+	if not missing and state.slots:
+		missing = [
+			f'_PySignalState.{attribute}' for attribute in ('curr', 'set') if not hasattr(state.slots[0], attribute)
+		]
+	if missing:
+		raise RuntimeError(
+			f'Checkpoints rely on Torii internals that Torii {torii.__version__} does not have '
+			f'({", ".join(missing)}), they were written against Torii {toriiVersion}'
+		)
+	return simulator._fragment, state
+
+def signalNames(simulator) -> Dict[str, 'Signal']:
+	'''Name every signal in the design being simulated by its place in the hierarchy, leaving out the clocks.
+	Designs constructed the same way get the same names, which is what lets a checkpoint be loaded into a
+	fresh simulation.'''
+	from torii.hdl.ast import SignalSet
+	fragment, _ = _internals(simulator)
+	clocks = SignalSet(domain.clk for domain in fragment.domains.values())
+	names = {}
+	seen = SignalSet()
+	for subfragment, hierarchy in fragment._assign_names_to_fragments(hierarchy = ('top',)).items():
+		for signal, name in subfragment._assign_names_to_signals().items():
+			if signal in seen or signal in clocks:
+				continue
+			seen.add(signal)
+			names['.'.join((*hierarchy, name))] = signal
+	return names
+
+def saveCheckpoint(simulator, fileName : str, *, metadata : Optional[dict] = None):
+	'''Write the value of every signal in the design to fileName, which covers the contents of every Memory
+	and the state of every FSM. Call this from a process after a Settle so nothing is left pending.
+
+	Python state outside the design, such as that of the testbench's own models, isn't captured, but can be
+	stored alongside in metadata.
+	'''
+	_, state = _internals(simulator)
+	values = {}
+	for name, signal in signalNames(simulator).items():
+		index = state.signals.get(signal)
+		values[name] = signal.reset if index is None else state.slots[index].curr
+	with open(fileName, 'w') as file:
+		dump({'metadata': metadata or {}, 'signals': values}, file)
+		file.write('\n')
+
+def loadCheckpoint(simulator, fileName : str) -> dict:
+	'''Restore the signals of a design constructed the same way as the one fileName was saved from, returning
+	the metadata saved with them.
+
+	Call this before running the simulation, or from a process after a Settle (for instance under
+	ToriiTestCase, which resets the simulation before running it), and the design carries on from the
+	checkpoint at the next clock edge. The restored values read back once the simulation has settled.
+	'''
+	_, state = _internals(simulator)
+	with open(fileName, 'r') as file:
+		checkpoint = load(file)
+	names = signalNames(simulator)
+	values = checkpoint['signals']
+	if names.keys() != values.keys():
+		missing = sorted(values.keys() - names.keys()) or sorted(names.keys() - values.keys())
+		raise ValueError(f'The checkpoint is for a different design, starting at {missing[0]}')
+	# Going through set() rather than writing the values in directly has the change wake whatever depends
+	# on each signal, so the combinational logic settles onto the restored state
+	for name, signal in names.items():
+		state.slots[state.get_signal(signal)].set(values[name])
+	return checkpoint['metadata']
@@ -1,41 +1,107 @@
 # SPDX-License-Identifier: BSD-3-Clause
-from torii import Elaboratable, Module, Signal, unsigned
-from .types import Opcodes, ArithOpcode, LogicOpcode, BitOpcode
+from torii import Elaboratable, Module, Signal, Const, Mux, unsigned
+from .types import Opcodes, ArithOpcode, LogicOpcode, BitOpcode, IndirectRegister
 from .busses import *
 
 __all__ = ["PIC16"]
 
 class PIC16(Elaboratable):
-	def __init__(self):
+	'''The 4-cycle PIC16 core.
+
+	Given a program image, the core is specialised to it: only the opcodes the program uses are decoded,
+	and the logic unit, bit manipulation unit and call stack are left out if none of them need it.
+
+	Skips (DECFSZ, INCFSZ, BTFSC and BTFSS) are resolved in Q3 from the file register read in Q2, a taken skip
+	having the next slot's Q0 fetch the instruction after the one skipped over. A skip therefore costs
+	nothing beyond its own slot, the skipped instruction never being fetched.
+
+	With fuseLoops, a DECFSZ or INCFSZ followed by a GOTO runs as one instruction slot. Each GOTO run is kept
+	in a one entry loop buffer, and a skip whose following word is the GOTO held there branches to its target
+	in Q3 if the count didn't reach zero, so the GOTO is neither fetched nor given a slot of its own. The
+	first pass around a loop, or any pass after another GOTO has been run, runs the GOTO as usual.
+
+	Given indirectBase, the four file registers from that address are INDF, POSTINC, POSTDEC and FSR (see
+	IndirectRegister). These are implemented by the core rather than on the peripheral bus: accessing any of
+	the INDF registers accesses the file register FSR holds the address of instead, with POSTINC and
+	POSTDEC then stepping FSR on once the instruction's read and write are both done.
+
+	The enhanced mid-range instructions are supported too. MOVIW and MOVWI use the same FSR, which exists
+	whether or not indirectBase maps it into the file registers. MOVLB loads bsr, which nothing uses yet
+	as the peripheral bus isn't banked.
+
+	With interrupts, raising interrupt has the core take the interrupt at the next slot's Q1, running that
+	slot as a NOP which pushes the address of the instruction it displaced and vectors to 0x004. The slot is
+	stretched by however many cycles the request waited less than the most it can for Q1, so 0x004 is always
+	fetched 6 cycles after interrupt is raised, whatever the Q phase. W, the flags and the PC latch are saved
+	to shadow registers on entry and restored by RETFIE, so handlers need no context save of their own.
+	Interrupts are not taken again until RETFIE. Without interrupts, RETFIE is a plain return.
+
+	For performance monitoring, retire and skipped strobe once for each instruction retired and skip taken,
+	with retirePC holding the address of the instruction retiring, and stackDepth follows the number of
+	entries on the call stack, up to all 8. stackOverflow is set once a call or interrupt entry has pushed
+	onto a full stack, losing its oldest entry.
+	'''
+
+	def __init__(self, *, program = None, fuseLoops = False, indirectBase = None, interrupts = False):
+		from .decoder import usedOpcodes
+		from .callStack import CallStack
+		self.opcodes = frozenset(Opcodes) if program is None else usedOpcodes(program)
+		self.fuseLoops = fuseLoops and Opcodes.GOTO in self.opcodes and \
+			bool({Opcodes.DECFSZ, Opcodes.INCFSZ} & self.opcodes)
+
+		if indirectBase is not None:
+			assert indirectBase % 4 == 0 and 0 <= indirectBase < 128, \
+				'The indirect addressing registers must be a 4 register aligned block'
+		self.indirectBase = indirectBase
+		self.interrupts = interrupts
+
+		# Built here rather than in elaborate so the call stack's entries can be loaded in simulation
+		self.callStack = CallStack() if self.usesUnit('callStack') else None
 		self.iBus = InstructionBus()
 		self.pBus = PeripheralBus()
+		self.interrupt = Signal()
 
 		self.pcLatchHigh = Signal(8)
 
 		self.wreg = Signal(8)
 		self.pc = Signal(12)
 		self.flags = Signal(8)
+		self.fsr = Signal(8)
+		self.bsr = Signal(5)
+
+		self.retire = Signal()
+		self.retirePC = Signal.like(self.pc)
+		self.skipped = Signal()
+		self.stackDepth = Signal(range(9))
+		self.stackOverflow = Signal()
+
+		self.inInterrupt = Signal()
+		self.shadowWReg = Signal.like(self.wreg)
+		self.shadowFlags = Signal.like(self.flags)
+		self.shadowPCLatch = Signal.like(self.pcLatchHigh)
+
+		self.loopValid = Signal()
+		self.loopAddress = Signal.like(self.pc)
+		self.loopTarget = Signal(11)
 
 	def elaborate(self, platform):
-		from .decoder import Decoder
-		from .alu import ArithUnit, LogicUnit
-		from .bitmanip import Bitmanip
-		from .callStack import CallStack
+		from .decoder import Decoder, instructionPatterns
+		from .alu import ArithUnit
 		m = Module()
-		decoder = Decoder()
+		decoder = Decoder(opcodes = self.opcodes)
 		m.submodules.decoder = decoder
-		arithUnit = ArithUnit()
+		# File register data only arrives in Q3, so anything computed from rhs has to be combinational to be
+		# ready for writeback at the end of Q0
+		arithUnit = ArithUnit(negateDomain = 'comb')
 		m.submodules.arith = arithUnit
-		logicUnit = LogicUnit()
-		m.submodules.logic = logicUnit
-		bitmanip = Bitmanip()
-		m.submodules.bitmanip = bitmanip
-		callStack = CallStack()
-		m.submodules.callStack = callStack
+		logicUnit, bitmanip, callStack = self.addUnits(m)
 
 		q = Signal(unsigned(2))
 		actualQ = Signal(unsigned(2))
-		m.d.sync += q.eq(q + 1)
+		# Cycles left to hold an interrupt entry slot in Q3 for
+		entryWait = Signal(range(4))
+		with m.If((q != 3) | (entryWait == 0)):
+			m.d.sync += q.eq(q + 1)
 		m.d.sync += actualQ.eq(q)
 
 		instruction = Signal(14)
@@ -45,27 +111,34 @@ class PIC16(Elaboratable):
 		targetBit = Signal(3)
 		opEnable = Signal()
 		skip = Signal()
-		pause = Signal()
+		skipTaken = Signal()
+		skipping = Signal()
 		pcNext = Signal.like(self.pc)
+		entering = Signal()
+		# How long a pending interrupt request has waited for Q1, up to the most it can
+		requestAge = Signal(range(4))
 
 		carry = self.flags[0]
 		zero = self.flags[1]
 
-		opcode = Signal(Opcodes)
-		arithOpcode = self.mapArithOpcode(m, opcode)
-		logicOpcode = self.mapLogicOpcode(m, opcode)
-		bitOpcode = self.mapBitmanipOpcode(m, opcode)
+		control = decoder.control
+		arithOpcode = control.arithOpcode
+		logicOpcode = control.logicOpcode
+		bitOpcode = control.bitOpcode
 
-		loadsWReg = self.loadsWReg(m, opcode)
-		loadsFReg = self.loadsFReg(m, opcode)
-		loadsLiteral = self.loadsLiteral(m, opcode)
+		loadsWReg = control.loadsWReg
+		loadsFReg = control.loadsFReg
+		loadsLiteral = control.loadsLiteral
 		storesWReg = Signal()
 		storesFReg = Signal()
-		changesFlow = self.changesFlow(m, opcode)
-		loadPCLatchHigh = self.loadPCLatchHigh(m, opcode)
-		isReturn = self.isReturn(m, opcode)
+		changesFlow = control.changesFlow
+		loadPCLatchHigh = control.loadPCLatchHigh
+		isReturn = control.isReturn
 		storesZeroFlag = Signal()
 
+		fileData = Signal(8)
+		selectsFSR = self.selectsFSR(instruction, control.fsrRelative)
+
 		resultFromArith = Signal()
 		resultFromLogic = Signal()
 		resultFromBit = Signal()
@@ -80,67 +153,146 @@ class PIC16(Elaboratable):
 			with m.Case(0):
 				with m.If(storesWReg):
 					m.d.sync += self.wreg.eq(result)
-				with m.Elif(storesFReg):
+				with m.Elif(storesFReg & ~selectsFSR):
 					m.d.sync += [
-						self.pBus.address.eq(instruction[0:7]),
+						self.pBus.address.eq(self.resolveFile(instruction, control.fsrRelative)),
 						self.pBus.writeData.eq(result),
 						self.pBus.write.eq(1)
 					]
+				self.updateFSR(
+					m, instruction, fsrRelative = control.fsrRelative,
+					accesses = control.loadsFReg | control.storesFReg, writes = storesFReg & ~storesWReg, value = result
+				)
+				with m.If(control.storesPCLatch):
+					m.d.sync += self.pcLatchHigh.eq(result[0:7])
+				with m.If(control.storesBSR):
+					m.d.sync += self.bsr.eq(result[0:5])
 				with m.If(storesZeroFlag):
-					m.d.sync += zero.eq(skip)
+					m.d.sync += zero.eq(Mux(resultFromBit, result == 0, skip))
 
 				with m.If(resultFromArith):
 					m.d.sync += carry.eq(arithUnit.carry)
-				with m.Elif(resultFromBit):
-					m.d.sync += carry.eq(bitmanip.carryOut)
+				if bitmanip is not None:
+					with m.Elif(resultFromBit):
+						m.d.sync += carry.eq(bitmanip.carryOut)
 
-				with m.If((opcode == Opcodes.INCFSZ) | (opcode == Opcodes.DECFSZ)):
-					m.d.sync += pause.eq(skip)
+				# Fetch past the instruction being skipped over
+				with m.If(skipping):
+					m.d.sync += [
+						self.pc.eq(pcNext),
+						skipping.eq(0),
+					]
 
 				m.d.comb += [
 					self.iBus.read.eq(1),
 					opEnable.eq(1)
 				]
 			with m.Case(1):
-				with m.If(pause):
-					m.d.sync += instruction.eq(0), # Load a NOP if we're entering a pause cycle.
-				with m.Else():
-					m.d.sync += [
-						instruction.eq(self.iBus.data),
-						self.pBus.address.eq(self.iBus.data[0:7])
-					]
+				m.d.sync += [
+					instruction.eq(self.iBus.data),
+					self.retirePC.eq(self.pc),
+					self.pBus.address.eq(self.resolveFile(self.iBus.data, self.matchesFSRRelative(self.iBus.data)))
+				]
+				if self.interrupts:
+					# Run a NOP in place of the instruction fetched, which is returned to once the handler is done.
+					# The slot is held in Q3 for however many of the 3 cycles the request could have waited on
+					# this Q1 it didn't, so entry always takes the same time.
+					with m.If(self.interrupt & ~self.inInterrupt):
+						m.d.sync += [
+							instruction.eq(0),
+							entering.eq(1),
+							self.inInterrupt.eq(1),
+							entryWait.eq(3 - requestAge),
+						]
 				m.d.sync += carry.eq(carry ^ (resultFromArith & carryInvert))
 
 				m.d.sync += self.pBus.write.eq(0)
 			with m.Case(2):
-				with m.If(pause):
-					m.d.sync += pause.eq(0)
-				with m.If(loadsFReg):
+				with m.If(loadsFReg & ~selectsFSR):
 					m.d.comb += self.pBus.read.eq(1)
 
-				with m.If(opcode == Opcodes.CALL):
-					m.d.sync += [
-						callStack.valueIn.eq(self.pc + 1),
-						callStack.push.eq(1)
-					]
-				with m.Elif(isReturn):
-					m.d.sync += [
-						self.pc.eq(callStack.valueOut),
-						callStack.pop.eq(1)
-					]
+				if callStack is not None:
+					with m.If(control.isCall):
+						m.d.sync += [
+							callStack.valueIn.eq(self.pc + 1),
+							callStack.push.eq(1)
+						]
+					with m.Elif(isReturn):
+						m.d.sync += [
+							self.pc.eq(callStack.valueOut),
+							callStack.pop.eq(1)
+						]
 
 				with m.If(loadPCLatchHigh):
 					m.d.sync += [
 						self.pc[0:11].eq(instruction[0:11]),
 						self.pc[11:].eq(self.pcLatchHigh[3:5])
 					]
+				with m.Elif(control.branchesRelative):
+					m.d.sync += self.pc.eq(
+						self.pc + 1 + self.branchOffset(instruction, fromWReg = loadsWReg, wreg = self.wreg)
+					)
 				with m.Elif(~changesFlow):
 					m.d.sync += self.pc.eq(pcNext)
+
+				if self.interrupts:
+					# The flags are final once the previous instruction's Q1 carry fix-up is done
+					with m.If(entering):
+						m.d.sync += [
+							callStack.valueIn.eq(self.pc),
+							callStack.push.eq(1),
+							self.pc.eq(0x004),
+							self.shadowWReg.eq(self.wreg),
+							self.shadowFlags.eq(self.flags),
+							self.shadowPCLatch.eq(self.pcLatchHigh),
+						]
+					with m.Elif(control.restoresContext):
+						m.d.sync += [
+							self.wreg.eq(self.shadowWReg),
+							self.flags.eq(self.shadowFlags),
+							self.pcLatchHigh.eq(self.shadowPCLatch),
+							self.inInterrupt.eq(0),
+						]
+
+				if self.fuseLoops:
+					gotoPattern = dict((opcode, pattern) for pattern, opcode in instructionPatterns)[Opcodes.GOTO]
+					with m.If(instruction.matches(gotoPattern)):
+						m.d.sync += [
+							self.loopValid.eq(1),
+							self.loopAddress.eq(self.pc),
+							self.loopTarget.eq(instruction[0:11]),
+						]
 			with m.Case(3):
-				with m.If(opcode == Opcodes.CALL):
-					m.d.sync += callStack.push.eq(0)
-				with m.Elif(isReturn):
-					m.d.sync += callStack.pop.eq(0)
+				m.d.comb += [
+					self.retire.eq(~entering),
+					self.skipped.eq(skipTaken),
+				]
+				if callStack is not None:
+					with m.If(control.isCall | entering):
+						m.d.sync += callStack.push.eq(0)
+						with m.If(entryWait == 0):
+							m.d.sync += entering.eq(0)
+					with m.Elif(isReturn):
+						m.d.sync += callStack.pop.eq(0)
+				with m.If(entryWait != 0):
+					m.d.sync += entryWait.eq(entryWait - 1)
+
+				m.d.sync += skipping.eq(skipTaken)
+				if self.fuseLoops:
+					# pc has already moved on to the word after the skip
+					loopHit = self.loopValid & (self.loopAddress == self.pc)
+					with m.If(control.skipsOnZero & loopHit & ~skipTaken):
+						m.d.sync += [
+							self.pc[0:11].eq(self.loopTarget),
+							self.pc[11:].eq(self.pcLatchHigh[3:5])
+						]
+
+		if self.interrupts:
+			with m.If(self.interrupt & ~self.inInterrupt):
+				with m.If(requestAge != 3):
+					m.d.sync += requestAge.eq(requestAge + 1)
+			with m.Else():
+				m.d.sync += requestAge.eq(0)
 
 		with m.If(loadsWReg):
 			m.d.sync += lhs.eq(self.wreg)
@@ -148,21 +300,23 @@ class PIC16(Elaboratable):
 			m.d.sync += lhs.eq(0)
 
 		with m.If(loadsFReg):
-			m.d.sync += rhs.eq(self.pBus.readData)
+			m.d.sync += rhs.eq(fileData)
 		with m.Elif(loadsLiteral):
 			m.d.sync += rhs.eq(instruction[0:8])
 		with m.Else():
 			m.d.sync += rhs.eq(0)
 
-		with m.If((opcode == Opcodes.BCF) | (opcode == Opcodes.BSF)):
+		with m.If((bitOpcode == BitOpcode.BITCLR) | (bitOpcode == BitOpcode.BITSET)):
 			m.d.sync += targetBit.eq(instruction[7:10])
 
 		with m.If(resultFromArith):
 			m.d.comb += result.eq(arithUnit.result)
-		with m.Elif(resultFromLogic):
-			m.d.comb += result.eq(logicUnit.result)
-		with m.Elif(resultFromBit):
-			m.d.comb += result.eq(bitmanip.result)
+		if logicUnit is not None:
+			with m.Elif(resultFromLogic):
+				m.d.comb += result.eq(logicUnit.result)
+		if bitmanip is not None:
+			with m.Elif(resultFromBit):
+				m.d.comb += result.eq(bitmanip.result)
 		with m.Elif(resultZero):
 			m.d.comb += result.eq(0)
 		with m.Elif(resultFromLit):
@@ -175,294 +329,129 @@ class PIC16(Elaboratable):
 
 		m.d.sync += [
 			arithUnit.operation.eq(arithOpcode),
-			logicUnit.operation.eq(logicOpcode),
-			bitmanip.operation.eq(bitOpcode),
-			bitmanip.value.eq(rhs),
-			bitmanip.carryIn.eq(carry),
-			resultFromArith.eq(self.resultFromArith(m, opcode)),
+			resultFromArith.eq(control.resultFromArith),
 			resultFromLogic.eq(logicOpcode != LogicOpcode.NONE),
 			resultFromBit.eq(bitOpcode != BitOpcode.NONE),
-			resultFromLit.eq(opcode == Opcodes.MOVLW),
-			resultFromWReg.eq(opcode == Opcodes.MOVWF),
-			resultZero.eq((opcode == Opcodes.CLRF) | (opcode == Opcodes.CLRW)),
-			storesWReg.eq(self.storesWReg(m, opcode, instruction[7])),
-			storesFReg.eq(self.storesFReg(m, opcode, instruction[7])),
-			storesZeroFlag.eq(self.storesZeroFlag(m, opcode)),
-			carryInvert.eq((arithOpcode == ArithOpcode.SUB) | (arithOpcode == ArithOpcode.DEC)),
+			resultFromLit.eq(control.resultFromLit),
+			resultFromWReg.eq(control.resultFromWReg),
+			resultZero.eq(control.resultZero),
+			storesWReg.eq(control.storesWReg),
+			storesFReg.eq(control.storesFReg),
+			storesZeroFlag.eq(control.storesZeroFlag),
+			carryInvert.eq(
+				(arithOpcode == ArithOpcode.SUB) | (arithOpcode == ArithOpcode.DEC) | (arithOpcode == ArithOpcode.SUBB)
+			),
 		]
 
 		m.d.comb += [
 			decoder.instruction.eq(instruction),
-			opcode.eq(decoder.opcode),
 			arithUnit.enable.eq(opEnable),
 			arithUnit.lhs.eq(lhs),
 			arithUnit.rhs.eq(rhs),
+			arithUnit.carryIn.eq(carry),
 			skip.eq(arithUnit.result == 0),
-			logicUnit.enable.eq(opEnable),
-			logicUnit.lhs.eq(lhs),
-			logicUnit.rhs.eq(rhs),
-			bitmanip.targetBit.eq(targetBit),
-			bitmanip.enable.eq(opEnable),
-			self.iBus.address.eq(self.pc),
+			skipTaken.eq(self.resolveSkip(control, instruction, fileData)),
+			self.iBus.address.eq(Mux(skipping, pcNext, self.pc)),
+			fileData.eq(Mux(selectsFSR, self.fsr, self.pBus.readData)),
 		]
+		if logicUnit is not None:
+			m.d.sync += logicUnit.operation.eq(logicOpcode)
+			m.d.comb += [
+				logicUnit.enable.eq(opEnable),
+				logicUnit.lhs.eq(lhs),
+				logicUnit.rhs.eq(rhs),
+			]
+		if bitmanip is not None:
+			m.d.sync += [
+				bitmanip.operation.eq(bitOpcode),
+				bitmanip.carryIn.eq(carry),
+			]
+			m.d.comb += [
+				bitmanip.value.eq(rhs),
+				bitmanip.targetBit.eq(targetBit),
+				bitmanip.enable.eq(opEnable),
+			]
+		if callStack is not None:
+			m.d.comb += [
+				self.stackDepth.eq(callStack.depth),
+				self.stackOverflow.eq(callStack.overflow),
+			]
 		return m
 
-	def mapArithOpcode(self, m, opcode):
-		result = Signal(ArithOpcode, name = "aluOpcode")
-		with m.Switch(opcode):
-			with m.Case(Opcodes.ADDLW, Opcodes.ADDWF):
-				m.d.comb += result.eq(ArithOpcode.ADD)
-			with m.Case(Opcodes.SUBLW, Opcodes.SUBWF):
-				m.d.comb += result.eq(ArithOpcode.SUB)
-			with m.Case(Opcodes.INCF, Opcodes.INCFSZ):
-				m.d.comb += result.eq(ArithOpcode.INC)
-			with m.Case(Opcodes.DECF, Opcodes.DECFSZ):
-				m.d.comb += result.eq(ArithOpcode.DEC)
-			with m.Default():
-				m.d.comb += result.eq(ArithOpcode.ADD)
-		return result
-
-	def resultFromArith(self, m, opcode):
-		result = Signal(name = "resultFromArith")
-		with m.Switch(opcode):
-			with m.Case(
-				Opcodes.ADDLW,
-				Opcodes.SUBLW,
-				Opcodes.INCF,
-				Opcodes.DECF,
-				Opcodes.ADDWF,
-				Opcodes.SUBWF,
-				Opcodes.INCFSZ,
-				Opcodes.DECFSZ
-			):
-				m.d.comb += result.eq(1)
-			with m.Default():
-				m.d.comb += result.eq(0)
-		return result
-
-	def mapLogicOpcode(self, m, opcode):
-		result = Signal(LogicOpcode, name = "logicOpcode")
-		with m.Switch(opcode):
-			with m.Case(Opcodes.ANDLW, Opcodes.ANDWF):
-				m.d.comb += result.eq(LogicOpcode.AND)
-			with m.Case(Opcodes.IORLW, Opcodes.IORWF):
-				m.d.comb += result.eq(LogicOpcode.OR)
-			with m.Case(Opcodes.XORLW, Opcodes.XORWF):
-				m.d.comb += result.eq(LogicOpcode.XOR)
-			with m.Default():
-				m.d.comb += result.eq(LogicOpcode.NONE)
-		return result
-
-	def mapBitmanipOpcode(self, m, opcode):
-		result = Signal(BitOpcode, name = "bitOpcode")
-		with m.Switch(opcode):
-			with m.Case(Opcodes.RRF):
-				m.d.comb += result.eq(BitOpcode.ROTR)
-			with m.Case(Opcodes.RLF):
-				m.d.comb += result.eq(BitOpcode.ROTL)
-			with m.Case(Opcodes.SWAPF):
-				m.d.comb += result.eq(BitOpcode.SWAP)
-			with m.Case(Opcodes.BCF):
-				m.d.comb += result.eq(BitOpcode.BITCLR)
-			with m.Case(Opcodes.BSF):
-				m.d.comb += result.eq(BitOpcode.BITSET)
-			with m.Default():
-				m.d.comb += result.eq(BitOpcode.NONE)
-		return result
-
-	def loadsWReg(self, m, opcode):
-		result = Signal(name = "loadsWReg")
-		with m.Switch(opcode):
-			with m.Case(
-				Opcodes.MOVWF,
-				Opcodes.ADDWF,
-				Opcodes.SUBWF,
-				Opcodes.ANDWF,
-				Opcodes.IORWF,
-				Opcodes.XORWF,
-				Opcodes.ADDLW,
-				Opcodes.SUBLW,
-				Opcodes.ANDLW,
-				Opcodes.IORLW,
-				Opcodes.XORLW
-			):
-				m.d.comb += result.eq(1)
-			with m.Default():
-				m.d.comb += result.eq(0)
-		return result
-
-	def loadsFReg(self, m, opcode):
-		result = Signal(name = "loadsFReg")
-		with m.Switch(opcode):
-			with m.Case(
-				Opcodes.ADDWF,
-				Opcodes.SUBWF,
-				Opcodes.ANDWF,
-				Opcodes.IORWF,
-				Opcodes.XORWF,
-				Opcodes.INCF,
-				Opcodes.INCFSZ,
-				Opcodes.DECF,
-				Opcodes.DECFSZ,
-				Opcodes.COMF,
-				Opcodes.MOVF,
-				Opcodes.RLF,
-				Opcodes.RRF,
-				Opcodes.SWAPF,
-				Opcodes.BCF,
-				Opcodes.BSF,
-				Opcodes.BTFSC,
-				Opcodes.BTFSS
-			):
-				m.d.comb += result.eq(1)
-			with m.Default():
-				m.d.comb += result.eq(0)
-		return result
-
-	def loadsLiteral(self, m, opcode):
-		result = Signal(name = "loadsLiteral")
-		with m.Switch(opcode):
-			with m.Case(
-				Opcodes.MOVLW,
-				Opcodes.RETLW,
-				Opcodes.ADDLW,
-				Opcodes.SUBLW,
-				Opcodes.ANDLW,
-				Opcodes.IORLW,
-				Opcodes.XORLW
-			):
-				m.d.comb += result.eq(1)
-			with m.Default():
-				m.d.comb += result.eq(0)
-		return result
-
-	def storesWReg(self, m, opcode, dir):
-		result = Signal(name = "storesWReg")
-		with m.Switch(opcode):
-			with m.Case(
-				Opcodes.CLRW,
-				Opcodes.MOVLW,
-				Opcodes.RETLW,
-				Opcodes.ADDLW,
-				Opcodes.SUBLW,
-				Opcodes.ANDLW,
-				Opcodes.IORLW,
-				Opcodes.XORLW
-			):
-				m.d.comb += result.eq(1)
-			with m.Case(
-				Opcodes.CLRF,
-				Opcodes.DECF,
-				Opcodes.DECFSZ,
-				Opcodes.MOVF,
-				Opcodes.COMF,
-				Opcodes.INCF,
-				Opcodes.INCFSZ,
-				Opcodes.RRF,
-				Opcodes.RLF,
-				Opcodes.SWAPF,
-				Opcodes.BCF,
-				Opcodes.BSF
-			):
-				m.d.comb += result.eq(~dir)
-			with m.Default():
-				m.d.comb += result.eq(0)
-		return result
-
-	def storesFReg(self, m, opcode, dir):
-		result = Signal(name = "storesFReg")
-		with m.Switch(opcode):
-			with m.Case(
-				Opcodes.MOVWF,
-				Opcodes.CLRF,
-				Opcodes.SUBWF,
-				Opcodes.DECF,
-				Opcodes.DECFSZ,
-				Opcodes.IORWF,
-				Opcodes.ANDWF,
-				Opcodes.XORWF,
-				Opcodes.ADDWF,
-				Opcodes.MOVF,
-				Opcodes.COMF,
-				Opcodes.INCF,
-				Opcodes.INCFSZ,
-				Opcodes.RRF,
-				Opcodes.RLF,
-				Opcodes.SWAPF
-			):
-				m.d.comb += result.eq(dir)
-			with m.Case(
-				Opcodes.BCF,
-				Opcodes.BSF
-			):
-				m.d.comb += result.eq(1)
-			with m.Default():
-				m.d.comb += result.eq(0)
-		return result
-
-	def changesFlow(self, m, opcode):
-		result = Signal(name = "changesFlow")
-		with m.Switch(opcode):
-			# Need to handle bit test f skip if <condition>..?
-			with m.Case(
-				Opcodes.CALL,
-				Opcodes.GOTO,
-				Opcodes.RETFIE,
-				Opcodes.RETLW,
-				Opcodes.RETURN
-			):
-				m.d.comb += result.eq(1)
-			with m.Default():
-				m.d.comb += result.eq(0)
-		return result
-
-	def isReturn(self, m, opcode):
-		result = Signal(name = "isReturn")
-		with m.Switch(opcode):
-			with m.Case(
-				Opcodes.RETFIE,
-				Opcodes.RETLW,
-				Opcodes.RETURN
-			):
-				m.d.comb += result.eq(1)
-			with m.Default():
-				m.d.comb += result.eq(0)
-		return result
-
-	def loadPCLatchHigh(self, m, opcode):
-		result = Signal(name = "loadPCLatch")
-		with m.Switch(opcode):
-			with m.Case(
-				Opcodes.CALL,
-				Opcodes.GOTO
-			):
-				m.d.comb += result.eq(1)
-			with m.Default():
-				m.d.comb += result.eq(0)
-		return result
-
-	def storesZeroFlag(self, m, opcode):
-		result = Signal(name = "storesZeroFlag")
-		with m.Switch(opcode):
-			with m.Case(
-				Opcodes.CLRW,
-				Opcodes.CLRF,
-				Opcodes.SUBWF,
-				Opcodes.DECF,
-				Opcodes.IORWF,
-				Opcodes.ANDWF,
-				Opcodes.XORWF,
-				Opcodes.ADDWF,
-				Opcodes.MOVF,
-				Opcodes.COMF,
-				Opcodes.INCF,
-				Opcodes.ADDLW,
-				Opcodes.SUBLW,
-				Opcodes.ANDLW,
-				Opcodes.IORLW,
-				Opcodes.XORLW
-			):
-				m.d.comb += result.eq(1)
-			with m.Default():
-				m.d.comb += result.eq(0)
-		return result
+	def resolveSkip(self, control, instruction, value):
+		'''Work out if a skip is taken from the file register value it read, ahead of the arithmetic unit'''
+		countDone = Mux(control.arithOpcode == ArithOpcode.INC, value == 0xFF, value == 0x01)
+		# BTFSC skips if the bit is clear, BTFSS (with bit 10 set) if it's set
+		bitMatches = value.bit_select(instruction[7:10], 1) == instruction[10]
+		return (control.skipsOnZero & countDone) | (control.skipsOnBit & bitMatches)
+
+	def selectsFSR(self, instruction, fsrRelative):
+		'''Check whether an instruction's file register is FSR, which is read and written without using the bus'''
+		if self.indirectBase is None:
+			return Const(0)
+		return ~fsrRelative & (instruction[0:7] == self.indirectBase + IndirectRegister.FSR.value)
+
+	def matchesFSRRelative(self, instruction):
+		'''Match MOVIW and MOVWI from the instruction bits, for when the address is needed ahead of decoding'''
+		from .decoder import instructionPatterns
+		patterns = [
+			pattern for pattern, opcode in instructionPatterns
+			if opcode in (Opcodes.MOVIW, Opcodes.MOVWI) and opcode in self.opcodes
+		]
+		return instruction.matches(*patterns) if patterns else Const(0)
+
+	def resolveFile(self, instruction, fsrRelative):
+		'''Work out the peripheral bus address an instruction accesses, following INDF and MOVIW/MOVWI through FSR'''
+		address = instruction[0:7]
+		if self.indirectBase is not None:
+			throughFSR = (address[2:] == self.indirectBase >> 2) & ~self.selectsFSR(instruction, fsrRelative)
+			address = Mux(throughFSR, self.fsr[0:7], address)
+		# The k[FSR] forms add their signed offset, the others use FSR + 1 for ++FSR, FSR - 1 for --FSR and FSR
+		# for the post-increment and decrement forms
+		offset = Mux(instruction[13], instruction[0:6].as_signed(), Mux(instruction[1], 0, Mux(instruction[0], -1, 1)))
+		return Mux(fsrRelative, (self.fsr + offset)[0:7], address)
+
+	def updateFSR(self, m, instruction, *, fsrRelative, accesses, writes, value):
+		'''Load FSR when it's written, else step it on for MOVIW/MOVWI or an access through POSTINC or POSTDEC'''
+		address = instruction[0:7]
+		with m.If(fsrRelative):
+			with m.If(~instruction[13]):
+				m.d.sync += self.fsr.eq(self.fsr + Mux(instruction[0], -1, 1))
+		if self.indirectBase is not None:
+			with m.Elif(writes & (address == self.indirectBase + IndirectRegister.FSR.value)):
+				m.d.sync += self.fsr.eq(value)
+			with m.Elif(accesses & (address == self.indirectBase + IndirectRegister.POSTINC.value)):
+				m.d.sync += self.fsr.eq(self.fsr + 1)
+			with m.Elif(accesses & (address == self.indirectBase + IndirectRegister.POSTDEC.value)):
+				m.d.sync += self.fsr.eq(self.fsr - 1)
+
+	def branchOffset(self, instruction, *, fromWReg, wreg):
+		'''The offset BRW (from W) or BRA (its signed 9-bit literal) adds to pc + 1'''
+		return Mux(fromWReg, wreg, instruction[0:9].as_signed())
+
+	def usesUnit(self, unit):
+		'''Check whether any of the opcodes this core decodes need the given execution unit'''
+		from .decoder import controlTable
+		needs = {
+			'logic': lambda control: control.logicOpcode != LogicOpcode.NONE,
+			'bitmanip': lambda control: control.bitOpcode != BitOpcode.NONE,
+			'callStack': lambda control: control.isCall or control.isReturn,
+		}[unit]
+		# Interrupt entry pushes the return address whatever the program does
+		if unit == 'callStack' and self.interrupts:
+			return True
+		return any(needs(controlTable[opcode]) for opcode in self.opcodes)
+
+	def addUnits(self, m):
+		'''Build the logic and bit manipulation units any decoded opcode needs and add them to the module along
+		with the call stack, returning all three. A unit no decoded opcode needs is never built, being None
+		instead, so the elaborate methods must leave out any logic that would use it.
+		'''
+		from .alu import LogicUnit
+		from .bitmanip import Bitmanip
+		logicUnit = LogicUnit() if self.usesUnit('logic') else None
+		bitmanip = Bitmanip() if self.usesUnit('bitmanip') else None
+		for name, unit in (('logic', logicUnit), ('bitmanip', bitmanip), ('callStack', self.callStack)):
+			if unit is not None:
+				m.submodules[name] = unit
+		return logicUnit, bitmanip, self.callStack
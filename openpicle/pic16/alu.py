@@ -2,18 +2,24 @@
 from torii import Elaboratable, Module, Signal
 from .types import ArithOpcode, LogicOpcode
 
-__all__ = ('ArithUnit', 'LogicUnit')
+__all__ = ('ArithUnit', 'LogicUnit', 'ALU')
 
 class ArithUnit(Elaboratable):
-	def __init__(self):
+	def __init__(self, *, negateDomain = 'sync'):
 		self.lhs = Signal(8)
 		self.rhs = Signal(8)
 		self.result = Signal(8)
 		self.carry = Signal()
+		self.carryIn = Signal()
 
 		self.enable = Signal()
 		self.operation = Signal(ArithOpcode)
 
+		# Users presenting rhs a cycle ahead of needing the result can have the negation for SUB registered,
+		# while the cores, whose file register data only arrives the cycle it's used, need it computed in the
+		# 'comb' domain instead
+		self._negateDomain = negateDomain
+
 	def elaborate(self, platform):
 		m = Module()
 		lhs = Signal.like(self.lhs)
@@ -33,10 +39,15 @@ class ArithUnit(Elaboratable):
 			with m.Switch(self.operation):
 				with m.Case(ArithOpcode.SUB):
 					m.d.comb += result.eq(lhs + rhs_n)
+				with m.Case(ArithOpcode.ADDC):
+					m.d.comb += result.eq(lhs + rhs + self.carryIn)
+				with m.Case(ArithOpcode.SUBB):
+					# lhs - rhs - borrow, as lhs + ~rhs + ~borrow so the carry out is the inverse of the borrow out
+					m.d.comb += result.eq(lhs + ~rhs + ~self.carryIn)
 				with m.Default():
 					m.d.comb += result.eq(lhs + rhs)
 
-		m.d.sync += rhs_n.eq((~rhs) + 1)
+		m.d[self._negateDomain] += rhs_n.eq((~rhs) + 1)
 		m.d.comb += [
 			self.result.eq(result[0:8]),
 			self.carry.eq(result[8])
@@ -69,3 +80,41 @@ class LogicUnit(Elaboratable):
 				with m.Default():
 					m.d.comb += result.eq(0)
 		return m
+
+class ALU(Elaboratable):
+	'''The arithmetic and logic units side by side with their operands and results brought out, for driving them
+	outside of a core as the tests and benchmarks do. The carry is presented as a carry for every operation, rather
+	than as the borrow the arithmetic unit gives for SUB and DEC.'''
+
+	def __init__(self):
+		self.arithOpcode = Signal(ArithOpcode)
+		self.arithLHS = Signal(8)
+		self.arithRHS = Signal(8)
+		self.arithResult = Signal(8)
+		self.logicOpcode = Signal(LogicOpcode)
+		self.logicLHS = Signal(8)
+		self.logicRHS = Signal(8)
+		self.logicResult = Signal(8)
+		self.carry = Signal()
+
+	def elaborate(self, platform):
+		m = Module()
+		m.submodules.arithUnit = arithUnit = ArithUnit()
+		m.submodules.logicUnit = logicUnit = LogicUnit()
+		carryInvert = Signal()
+
+		m.d.comb += [
+			carryInvert.eq((self.arithOpcode == ArithOpcode.SUB) | (self.arithOpcode == ArithOpcode.DEC)),
+			arithUnit.operation.eq(self.arithOpcode),
+			arithUnit.enable.eq(1),
+			arithUnit.lhs.eq(self.arithLHS),
+			arithUnit.rhs.eq(self.arithRHS),
+			self.arithResult.eq(arithUnit.result),
+			self.carry.eq(arithUnit.carry ^ carryInvert),
+			logicUnit.enable.eq(1),
+			logicUnit.operation.eq(self.logicOpcode),
+			logicUnit.lhs.eq(self.logicLHS),
+			logicUnit.rhs.eq(self.logicRHS),
+			self.logicResult.eq(logicUnit.result),
+		]
+		return m
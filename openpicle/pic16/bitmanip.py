@@ -26,6 +26,12 @@ class Bitmanip(Elaboratable):
 					m.d.comb += result.eq(Cat(value[1:], self.carryIn, value[0]))
 				with m.Case(BitOpcode.ROTL):
 					m.d.comb += result.eq(Cat(self.carryIn, value))
+				with m.Case(BitOpcode.LSL):
+					m.d.comb += result.eq(Cat(0, value))
+				with m.Case(BitOpcode.LSR):
+					m.d.comb += result.eq(Cat(value[1:], 0, value[0]))
+				with m.Case(BitOpcode.ASR):
+					m.d.comb += result.eq(Cat(value[1:], value[7], value[0]))
 				with m.Case(BitOpcode.SWAP):
 					m.d.comb += result.eq(Cat(value[4:8], value[0:4], 0))
 				with m.Case(BitOpcode.BITCLR):
@@ -8,18 +8,29 @@ class CallStack(Elaboratable):
 		self.push = Signal()
 		self.pop = Signal()
 		self.count = Signal(range(8))
+		# The entries in use, which unlike count (where the next push goes) stops at 8 when the stack is full
+		self.depth = Signal(range(9))
+		# Set by a push onto a full stack, which overwrites the oldest entry, and held until reset
+		self.overflow = Signal()
+		# The PIC16 calls for an 8-entry call stack.
+		self.stack = Memory(width = 12, depth = 8)
 
 	def elaborate(self, platform):
 		m = Module()
-		# The PIC16 calls for an 8-entry call stack.
-		m.submodules.stack = stack = Memory(width = 12, depth = 8)
+		m.submodules.stack = stack = self.stack
 		readPort = stack.read_port(domain = "comb")
 		writePort = stack.write_port()
 
 		with m.If(self.push):
 			m.d.sync += self.count.eq(self.count + 1)
+			with m.If(self.depth == 8):
+				m.d.sync += self.overflow.eq(1)
+			with m.Else():
+				m.d.sync += self.depth.eq(self.depth + 1)
 		with m.Elif(self.pop):
 			m.d.sync += self.count.eq(self.count - 1)
+			with m.If(self.depth != 0):
+				m.d.sync += self.depth.eq(self.depth - 1)
 
 		m.d.comb += [
 			writePort.addr.eq(self.count),
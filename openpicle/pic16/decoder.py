@@ -1,86 +1,392 @@
 # SPDX-License-Identifier: BSD-3-Clause
-from torii import Elaboratable, Module, Signal
-from .types import Opcodes
+from enum import Enum, unique
+from typing import Dict, NamedTuple, Optional
+from torii import Elaboratable, Module, Signal, Record, Const, Mux, Shape
+from .types import Opcodes, ArithOpcode, LogicOpcode, BitOpcode
 
-__all__ = ["Decoder"]
+__all__ = [
+	"Decoder", "DecodedInstruction", "decodeTable", "instructionPatterns", "Store", "ControlWord",
+	"controlTable", "controlLayout", "packControl", "usedOpcodes",
+]
+
+# Instruction bit patterns in the order the decoder matches them, so earlier entries take priority. The
+# enhanced mid-range instructions come ahead of the base instructions whose don't care bits they're encoded
+# in, so only the words the enhanced set gives a meaning to change. There being a single FSR, only the FSR0
+# forms of MOVIW and MOVWI are decoded.
+instructionPatterns = (
+	('00 0000 0000 1011', Opcodes.BRW),
+	('00 0000 0001 00--', Opcodes.MOVIW),
+	('00 0000 0001 10--', Opcodes.MOVWI),
+	('00 0000 001- ----', Opcodes.MOVLB),
+	('00 0000 0--0 0000', Opcodes.NOP),
+	('00 0000 0000 1000', Opcodes.RETURN),
+	('00 0000 0000 1001', Opcodes.RETFIE),
+	('00 0000 0110 0011', Opcodes.SLEEP),
+	# CLRWDT is skipped here as we don't have a WDT.
+	('00 0000 1--- ----', Opcodes.MOVWF),
+	('00 0001 0--- ----', Opcodes.CLRW),
+	('00 0001 1--- ----', Opcodes.CLRF),
+	('00 0010 ---- ----', Opcodes.SUBWF),
+	('00 0011 ---- ----', Opcodes.DECF),
+	('00 0100 ---- ----', Opcodes.IORWF),
+	('00 0101 ---- ----', Opcodes.ANDWF),
+	('00 0110 ---- ----', Opcodes.XORWF),
+	('00 0111 ---- ----', Opcodes.ADDWF),
+	('00 1000 ---- ----', Opcodes.MOVF),
+	('00 1001 ---- ----', Opcodes.COMF),
+	('00 1010 ---- ----', Opcodes.INCF),
+	('00 1011 ---- ----', Opcodes.DECFSZ),
+	('00 1100 ---- ----', Opcodes.RRF),
+	('00 1101 ---- ----', Opcodes.RLF),
+	('00 1110 ---- ----', Opcodes.SWAPF),
+	('00 1111 ---- ----', Opcodes.INCFSZ),
+	('01 00-- ---- ----', Opcodes.BCF),
+	('01 01-- ---- ----', Opcodes.BSF),
+	('01 10-- ---- ----', Opcodes.BTFSC),
+	('01 11-- ---- ----', Opcodes.BTFSS),
+	('10 0--- ---- ----', Opcodes.CALL),
+	('10 1--- ---- ----', Opcodes.GOTO),
+	('11 0001 1--- ----', Opcodes.MOVLP),
+	('11 001- ---- ----', Opcodes.BRA),
+	('11 00-- ---- ----', Opcodes.MOVLW),
+	('11 0101 ---- ----', Opcodes.LSLF),
+	('11 0110 ---- ----', Opcodes.LSRF),
+	('11 0111 ---- ----', Opcodes.ASRF),
+	('11 01-- ---- ----', Opcodes.RETLW),
+	('11 1000 ---- ----', Opcodes.IORLW),
+	('11 1001 ---- ----', Opcodes.ANDLW),
+	('11 1010 ---- ----', Opcodes.XORLW),
+	('11 1011 ---- ----', Opcodes.SUBWFB),
+	('11 1101 ---- ----', Opcodes.ADDWFC),
+	('11 110- ---- ----', Opcodes.SUBLW),
+	('11 1111 00-- ----', Opcodes.MOVIW),
+	('11 1111 10-- ----', Opcodes.MOVWI),
+	('11 111- ---- ----', Opcodes.ADDLW),
+)
+
+@unique
+class Store(Enum):
+	NEVER = 0
+	ALWAYS = 1
+	# Depending on the instruction's d bit (bit 7)
+	DIRECTION_CLEAR = 2
+	DIRECTION_SET = 3
+
+class ControlWord(NamedTuple):
+	arithOpcode : ArithOpcode = ArithOpcode.ADD
+	logicOpcode : LogicOpcode = LogicOpcode.NONE
+	bitOpcode : BitOpcode = BitOpcode.NONE
+	resultFromArith : bool = False
+	resultFromLit : bool = False
+	resultFromWReg : bool = False
+	resultZero : bool = False
+	loadsWReg : bool = False
+	loadsFReg : bool = False
+	loadsLiteral : bool = False
+	storesWReg : Store = Store.NEVER
+	storesFReg : Store = Store.NEVER
+	storesZeroFlag : bool = False
+	skipsOnZero : bool = False
+	# BTFSC and BTFSS, skipping when the bit selected is equal to bit 10 of the instruction
+	skipsOnBit : bool = False
+	changesFlow : bool = False
+	loadPCLatchHigh : bool = False
+	isCall : bool = False
+	isReturn : bool = False
+	# BRA and BRW, adding the offset in the literal or W to pc + 1
+	branchesRelative : bool = False
+	storesPCLatch : bool = False
+	storesBSR : bool = False
+	# MOVIW and MOVWI, addressing the file register relative to FSR rather than by the f field
+	fsrRelative : bool = False
+	# RETFIE, restoring W, the flags and the PC latch saved on interrupt entry
+	restoresContext : bool = False
+
+# How the core is controlled for each opcode. This follows what the gateware has always done rather than
+# the datasheet, so for example SUBWF and friends never store to W. Adding an instruction is one row here
+# and one pattern above.
+controlTable : Dict[Opcodes, ControlWord] = {
+	Opcodes.NOP: ControlWord(),
+	Opcodes.RETURN: ControlWord(changesFlow = True, isReturn = True),
+	Opcodes.RETFIE: ControlWord(changesFlow = True, isReturn = True, restoresContext = True),
+	Opcodes.SLEEP: ControlWord(),
+	Opcodes.MOVWF: ControlWord(resultFromWReg = True, loadsWReg = True, storesFReg = Store.DIRECTION_SET),
+	Opcodes.CLRW: ControlWord(resultZero = True, storesWReg = Store.ALWAYS, storesZeroFlag = True),
+	Opcodes.CLRF: ControlWord(
+		resultZero = True, storesWReg = Store.DIRECTION_CLEAR, storesFReg = Store.DIRECTION_SET,
+		storesZeroFlag = True
+	),
+	Opcodes.SUBWF: ControlWord(
+		arithOpcode = ArithOpcode.SUB, resultFromArith = True, loadsWReg = True, loadsFReg = True,
+		storesFReg = Store.DIRECTION_SET, storesZeroFlag = True
+	),
+	Opcodes.DECF: ControlWord(
+		arithOpcode = ArithOpcode.DEC, resultFromArith = True, loadsFReg = True,
+		storesWReg = Store.DIRECTION_CLEAR, storesFReg = Store.DIRECTION_SET, storesZeroFlag = True
+	),
+	Opcodes.IORWF: ControlWord(
+		logicOpcode = LogicOpcode.OR, loadsWReg = True, loadsFReg = True, storesFReg = Store.DIRECTION_SET,
+		storesZeroFlag = True
+	),
+	Opcodes.ANDWF: ControlWord(
+		logicOpcode = LogicOpcode.AND, loadsWReg = True, loadsFReg = True, storesFReg = Store.DIRECTION_SET,
+		storesZeroFlag = True
+	),
+	Opcodes.XORWF: ControlWord(
+		logicOpcode = LogicOpcode.XOR, loadsWReg = True, loadsFReg = True, storesFReg = Store.DIRECTION_SET,
+		storesZeroFlag = True
+	),
+	Opcodes.ADDWF: ControlWord(
+		arithOpcode = ArithOpcode.ADD, resultFromArith = True, loadsWReg = True, loadsFReg = True,
+		storesFReg = Store.DIRECTION_SET, storesZeroFlag = True
+	),
+	Opcodes.MOVF: ControlWord(
+		loadsFReg = True, storesWReg = Store.DIRECTION_CLEAR, storesFReg = Store.DIRECTION_SET,
+		storesZeroFlag = True
+	),
+	Opcodes.COMF: ControlWord(
+		loadsFReg = True, storesWReg = Store.DIRECTION_CLEAR, storesFReg = Store.DIRECTION_SET,
+		storesZeroFlag = True
+	),
+	Opcodes.INCF: ControlWord(
+		arithOpcode = ArithOpcode.INC, resultFromArith = True, loadsFReg = True,
+		storesWReg = Store.DIRECTION_CLEAR, storesFReg = Store.DIRECTION_SET, storesZeroFlag = True
+	),
+	Opcodes.DECFSZ: ControlWord(
+		arithOpcode = ArithOpcode.DEC, resultFromArith = True, loadsFReg = True,
+		storesWReg = Store.DIRECTION_CLEAR, storesFReg = Store.DIRECTION_SET, skipsOnZero = True
+	),
+	Opcodes.RRF: ControlWord(
+		bitOpcode = BitOpcode.ROTR, loadsFReg = True, storesWReg = Store.DIRECTION_CLEAR,
+		storesFReg = Store.DIRECTION_SET
+	),
+	Opcodes.RLF: ControlWord(
+		bitOpcode = BitOpcode.ROTL, loadsFReg = True, storesWReg = Store.DIRECTION_CLEAR,
+		storesFReg = Store.DIRECTION_SET
+	),
+	Opcodes.SWAPF: ControlWord(
+		bitOpcode = BitOpcode.SWAP, loadsFReg = True, storesWReg = Store.DIRECTION_CLEAR,
+		storesFReg = Store.DIRECTION_SET
+	),
+	Opcodes.INCFSZ: ControlWord(
+		arithOpcode = ArithOpcode.INC, resultFromArith = True, loadsFReg = True,
+		storesWReg = Store.DIRECTION_CLEAR, storesFReg = Store.DIRECTION_SET, skipsOnZero = True
+	),
+	Opcodes.BCF: ControlWord(
+		bitOpcode = BitOpcode.BITCLR, loadsFReg = True, storesWReg = Store.DIRECTION_CLEAR,
+		storesFReg = Store.ALWAYS
+	),
+	Opcodes.BSF: ControlWord(
+		bitOpcode = BitOpcode.BITSET, loadsFReg = True, storesWReg = Store.DIRECTION_CLEAR,
+		storesFReg = Store.ALWAYS
+	),
+	Opcodes.BTFSC: ControlWord(loadsFReg = True, skipsOnBit = True),
+	Opcodes.BTFSS: ControlWord(loadsFReg = True, skipsOnBit = True),
+	Opcodes.CALL: ControlWord(changesFlow = True, loadPCLatchHigh = True, isCall = True),
+	Opcodes.GOTO: ControlWord(changesFlow = True, loadPCLatchHigh = True),
+	Opcodes.MOVLW: ControlWord(resultFromLit = True, loadsLiteral = True, storesWReg = Store.ALWAYS),
+	Opcodes.RETLW: ControlWord(
+		loadsLiteral = True, storesWReg = Store.ALWAYS, changesFlow = True, isReturn = True
+	),
+	Opcodes.IORLW: ControlWord(
+		logicOpcode = LogicOpcode.OR, loadsWReg = True, loadsLiteral = True, storesWReg = Store.ALWAYS,
+		storesZeroFlag = True
+	),
+	Opcodes.ANDLW: ControlWord(
+		logicOpcode = LogicOpcode.AND, loadsWReg = True, loadsLiteral = True, storesWReg = Store.ALWAYS,
+		storesZeroFlag = True
+	),
+	Opcodes.XORLW: ControlWord(
+		logicOpcode = LogicOpcode.XOR, loadsWReg = True, loadsLiteral = True, storesWReg = Store.ALWAYS,
+		storesZeroFlag = True
+	),
+	Opcodes.SUBLW: ControlWord(
+		arithOpcode = ArithOpcode.SUB, resultFromArith = True, loadsWReg = True, loadsLiteral = True,
+		storesWReg = Store.ALWAYS, storesZeroFlag = True
+	),
+	Opcodes.ADDLW: ControlWord(
+		arithOpcode = ArithOpcode.ADD, resultFromArith = True, loadsWReg = True, loadsLiteral = True,
+		storesWReg = Store.ALWAYS, storesZeroFlag = True
+	),
+	Opcodes.ADDWFC: ControlWord(
+		arithOpcode = ArithOpcode.ADDC, resultFromArith = True, loadsWReg = True, loadsFReg = True,
+		storesWReg = Store.DIRECTION_CLEAR, storesFReg = Store.DIRECTION_SET, storesZeroFlag = True
+	),
+	# Like SUBWF, this computes W - f, the carry flag being the borrow
+	Opcodes.SUBWFB: ControlWord(
+		arithOpcode = ArithOpcode.SUBB, resultFromArith = True, loadsWReg = True, loadsFReg = True,
+		storesWReg = Store.DIRECTION_CLEAR, storesFReg = Store.DIRECTION_SET, storesZeroFlag = True
+	),
+	# Unlike the other bit manipulation instructions, the shifts set the zero flag from their result
+	Opcodes.LSLF: ControlWord(
+		bitOpcode = BitOpcode.LSL, loadsFReg = True, storesWReg = Store.DIRECTION_CLEAR,
+		storesFReg = Store.DIRECTION_SET, storesZeroFlag = True
+	),
+	Opcodes.LSRF: ControlWord(
+		bitOpcode = BitOpcode.LSR, loadsFReg = True, storesWReg = Store.DIRECTION_CLEAR,
+		storesFReg = Store.DIRECTION_SET, storesZeroFlag = True
+	),
+	Opcodes.ASRF: ControlWord(
+		bitOpcode = BitOpcode.ASR, loadsFReg = True, storesWReg = Store.DIRECTION_CLEAR,
+		storesFReg = Store.DIRECTION_SET, storesZeroFlag = True
+	),
+	Opcodes.BRA: ControlWord(changesFlow = True, branchesRelative = True),
+	Opcodes.BRW: ControlWord(loadsWReg = True, changesFlow = True, branchesRelative = True),
+	Opcodes.MOVLP: ControlWord(resultFromLit = True, loadsLiteral = True, storesPCLatch = True),
+	Opcodes.MOVLB: ControlWord(resultFromLit = True, loadsLiteral = True, storesBSR = True),
+	Opcodes.MOVIW: ControlWord(
+		resultFromLit = True, loadsFReg = True, storesWReg = Store.ALWAYS, storesZeroFlag = True,
+		fsrRelative = True
+	),
+	Opcodes.MOVWI: ControlWord(
+		resultFromWReg = True, loadsWReg = True, storesFReg = Store.ALWAYS, fsrRelative = True
+	),
+}
+
+# Record layout of a control word once the d bit has been applied to the Store fields
+controlLayout = tuple(
+	(name, shape if shape in (ArithOpcode, LogicOpcode, BitOpcode) else 1)
+	for name, shape in ControlWord.__annotations__.items()
+)
+
+def packControl(control : ControlWord, direction : int) -> int:
+	'''Flatten a control word into the bits of a controlLayout Record for the given d bit'''
+	packed = 0
+	offset = 0
+	for (name, shape), value in zip(controlLayout, control):
+		if isinstance(value, Store):
+			value = value == Store.ALWAYS or \
+				(value == Store.DIRECTION_SET and direction) or \
+				(value == Store.DIRECTION_CLEAR and not direction)
+		elif isinstance(value, Enum):
+			value = value.value
+		packed |= int(value) << offset
+		offset += Shape.cast(shape).width
+	return packed
+
+class DecodedInstruction(NamedTuple):
+	opcode : Opcodes
+	fileAddress : Optional[int] = None
+	direction : Optional[int] = None
+	bit : Optional[int] = None
+	literal : Optional[int] = None
+	target : Optional[int] = None
+	# The signed offset of BRA and the k[FSR] forms of MOVIW and MOVWI
+	offset : Optional[int] = None
+	# Which of ++FSR, --FSR, FSR++ and FSR-- the other forms of MOVIW and MOVWI use
+	mode : Optional[int] = None
+
+_fileOpcodes = frozenset((
+	Opcodes.MOVWF, Opcodes.CLRF, Opcodes.SUBWF, Opcodes.DECF, Opcodes.IORWF, Opcodes.ANDWF,
+	Opcodes.XORWF, Opcodes.ADDWF, Opcodes.MOVF, Opcodes.COMF, Opcodes.INCF, Opcodes.DECFSZ,
+	Opcodes.RRF, Opcodes.RLF, Opcodes.SWAPF, Opcodes.INCFSZ, Opcodes.ADDWFC, Opcodes.SUBWFB, Opcodes.LSLF,
+	Opcodes.LSRF, Opcodes.ASRF,
+))
+_directionOpcodes = _fileOpcodes - {Opcodes.MOVWF, Opcodes.CLRF}
+_bitOpcodes = frozenset((Opcodes.BCF, Opcodes.BSF, Opcodes.BTFSC, Opcodes.BTFSS))
+_literalOpcodes = frozenset((
+	Opcodes.MOVLW, Opcodes.RETLW, Opcodes.IORLW, Opcodes.ANDLW, Opcodes.XORLW, Opcodes.SUBLW,
+	Opcodes.ADDLW,
+))
+_branchOpcodes = frozenset((Opcodes.CALL, Opcodes.GOTO))
+# Bits of the literal of the enhanced mid-range instructions taking a short one
+_literalMasks = {Opcodes.MOVLP: 0x7F, Opcodes.MOVLB: 0x1F}
+
+def _signExtend(value : int, bits : int) -> int:
+	return value - ((value >> (bits - 1)) << bits)
+
+def _decodeFields(instruction : int, opcode : Opcodes) -> DecodedInstruction:
+	if opcode in _fileOpcodes or opcode in _bitOpcodes:
+		fileAddress = instruction & 0x7F
+	else:
+		fileAddress = None
+	if opcode in _literalOpcodes:
+		literal = instruction & 0xFF
+	elif opcode in _literalMasks:
+		literal = instruction & _literalMasks[opcode]
+	else:
+		literal = None
+	offset = None
+	mode = None
+	if opcode == Opcodes.BRA:
+		offset = _signExtend(instruction & 0x1FF, 9)
+	elif opcode in (Opcodes.MOVIW, Opcodes.MOVWI):
+		if instruction >> 13:
+			offset = _signExtend(instruction & 0x3F, 6)
+		else:
+			mode = instruction & 3
+	return DecodedInstruction(
+		opcode = opcode,
+		fileAddress = fileAddress,
+		direction = (instruction >> 7) & 1 if opcode in _directionOpcodes else None,
+		bit = (instruction >> 7) & 7 if opcode in _bitOpcodes else None,
+		literal = literal,
+		target = instruction & 0x7FF if opcode in _branchOpcodes else None,
+		offset = offset,
+		mode = mode,
+	)
+
+def _buildDecodeTable():
+	# Words no pattern matches leave the decoder's opcode output at its reset value, NOP
+	opcodes = [Opcodes.NOP] * (2 ** 14)
+	# Apply the patterns lowest priority first so the higher priority ones overwrite them
+	for pattern, opcode in reversed(instructionPatterns):
+		bits = pattern.replace(' ', '')
+		mask = int(bits.replace('0', '1').replace('-', '0'), 2)
+		match = int(bits.replace('-', '0'), 2)
+		free = ~mask & 0x3FFF
+		# Walk every combination of the don't-care bits
+		subset = 0
+		while True:
+			opcodes[match | subset] = opcode
+			subset = (subset - free) & free
+			if subset == 0:
+				break
+	return tuple(_decodeFields(instruction, opcode) for instruction, opcode in enumerate(opcodes))
+
+# Flat lookup of every 14-bit instruction word to its opcode and operand fields
+decodeTable = _buildDecodeTable()
+
+def usedOpcodes(program) -> frozenset:
+	'''Work out which opcodes a program image uses, always including NOP as that is what skips execute'''
+	return frozenset(decodeTable[instruction & 0x3FFF].opcode for instruction in program) | {Opcodes.NOP}
 
 class Decoder(Elaboratable):
-	def __init__(self):
+	'''Decodes an instruction to its opcode and the control word from controlTable for it.
+
+	Each instruction pattern selects between two constant control words by the d bit, so the control
+	signals come out of the one match on the instruction bits rather than being decoded again from opcode.
+	When opcodes is given, only those instructions are decoded and everything else decodes as a NOP.
+	'''
+
+	def __init__(self, *, opcodes = None):
+		self._opcodes = frozenset(Opcodes) if opcodes is None else frozenset(opcodes)
 		self.instruction = Signal(14)
 		self.opcode = Signal(Opcodes)
+		self.control = Record(controlLayout)
 
 	def elaborate(self, platform):
 		m = Module()
+		direction = self.instruction[7]
+
+		def controlFor(opcode):
+			control = controlTable[opcode]
+			directionClear = packControl(control, 0)
+			directionSet = packControl(control, 1)
+			if directionClear == directionSet:
+				return Const(directionClear, len(self.control))
+			return Mux(direction, directionSet, directionClear)
 
 		with m.Switch(self.instruction):
-			with m.Case('00 0000 0--0 0000'):
-				m.d.comb += self.opcode.eq(Opcodes.NOP)
-			with m.Case('00 0000 0000 1000'):
-				m.d.comb += self.opcode.eq(Opcodes.RETURN)
-			with m.Case('00 0000 0000 1001'):
-				m.d.comb += self.opcode.eq(Opcodes.RETFIE)
-			with m.Case('00 0000 0110 0011'):
-				m.d.comb += self.opcode.eq(Opcodes.SLEEP)
-			# CLRWDT is skipped here as we don't have a WDT.
-			with m.Case('00 0000 1--- ----'):
-				m.d.comb += self.opcode.eq(Opcodes.MOVWF)
-			with m.Case('00 0001 0--- ----'):
-				m.d.comb += self.opcode.eq(Opcodes.CLRW)
-			with m.Case('00 0001 1--- ----'):
-				m.d.comb += self.opcode.eq(Opcodes.CLRF)
-			with m.Case('00 0010 ---- ----'):
-				m.d.comb += self.opcode.eq(Opcodes.SUBWF)
-			with m.Case('00 0011 ---- ----'):
-				m.d.comb += self.opcode.eq(Opcodes.DECF)
-			with m.Case('00 0100 ---- ----'):
-				m.d.comb += self.opcode.eq(Opcodes.IORWF)
-			with m.Case('00 0101 ---- ----'):
-				m.d.comb += self.opcode.eq(Opcodes.ANDWF)
-			with m.Case('00 0110 ---- ----'):
-				m.d.comb += self.opcode.eq(Opcodes.XORWF)
-			with m.Case('00 0111 ---- ----'):
-				m.d.comb += self.opcode.eq(Opcodes.ADDWF)
-			with m.Case('00 1000 ---- ----'):
-				m.d.comb += self.opcode.eq(Opcodes.MOVF)
-			with m.Case('00 1001 ---- ----'):
-				m.d.comb += self.opcode.eq(Opcodes.COMF)
-			with m.Case('00 1010 ---- ----'):
-				m.d.comb += self.opcode.eq(Opcodes.INCF)
-			with m.Case('00 1011 ---- ----'):
-				m.d.comb += self.opcode.eq(Opcodes.DECFSZ)
-			with m.Case('00 1100 ---- ----'):
-				m.d.comb += self.opcode.eq(Opcodes.RRF)
-			with m.Case('00 1101 ---- ----'):
-				m.d.comb += self.opcode.eq(Opcodes.RLF)
-			with m.Case('00 1110 ---- ----'):
-				m.d.comb += self.opcode.eq(Opcodes.SWAPF)
-			with m.Case('00 1111 ---- ----'):
-				m.d.comb += self.opcode.eq(Opcodes.INCFSZ)
-			with m.Case('01 00-- ---- ----'):
-				m.d.comb += self.opcode.eq(Opcodes.BCF)
-			with m.Case('01 01-- ---- ----'):
-				m.d.comb += self.opcode.eq(Opcodes.BSF)
-			with m.Case('01 10-- ---- ----'):
-				m.d.comb += self.opcode.eq(Opcodes.BTFSC)
-			with m.Case('01 11-- ---- ----'):
-				m.d.comb += self.opcode.eq(Opcodes.BTFSS)
-			with m.Case('10 0--- ---- ----'):
-				m.d.comb += self.opcode.eq(Opcodes.CALL)
-			with m.Case('10 1--- ---- ----'):
-				m.d.comb += self.opcode.eq(Opcodes.GOTO)
-			with m.Case('11 00-- ---- ----'):
-				m.d.comb += self.opcode.eq(Opcodes.MOVLW)
-			with m.Case('11 01-- ---- ----'):
-				m.d.comb += self.opcode.eq(Opcodes.RETLW)
-			with m.Case('11 1000 ---- ----'):
-				m.d.comb += self.opcode.eq(Opcodes.IORLW)
-			with m.Case('11 1001 ---- ----'):
-				m.d.comb += self.opcode.eq(Opcodes.ANDLW)
-			with m.Case('11 1010 ---- ----'):
-				m.d.comb += self.opcode.eq(Opcodes.XORLW)
-			with m.Case('11 110- ---- ----'):
-				m.d.comb += self.opcode.eq(Opcodes.SUBLW)
-			with m.Case('11 111- ---- ----'):
-				m.d.comb += self.opcode.eq(Opcodes.ADDLW)
+			for pattern, opcode in instructionPatterns:
+				if opcode not in self._opcodes:
+					continue
+				with m.Case(pattern):
+					m.d.comb += [
+						self.opcode.eq(opcode),
+						self.control.eq(controlFor(opcode)),
+					]
+			with m.Default():
+				m.d.comb += self.control.eq(controlFor(Opcodes.NOP))
 
 		return m
@@ -0,0 +1,341 @@
+# SPDX-License-Identifier: BSD-3-Clause
+from .types import Opcodes, ArithOpcode, LogicOpcode, BitOpcode, IndirectRegister
+from .decoder import decodeTable, controlTable, Store
+
+__all__ = ('PIC16Model',)
+
+_ADD, _SUB, _INC, _DEC, _ADDC, _SUBB = range(6)
+_arith = {
+	ArithOpcode.ADD: _ADD, ArithOpcode.SUB: _SUB, ArithOpcode.INC: _INC, ArithOpcode.DEC: _DEC,
+	ArithOpcode.ADDC: _ADDC, ArithOpcode.SUBB: _SUBB,
+}
+_logic = {LogicOpcode.AND: int.__and__, LogicOpcode.OR: int.__or__, LogicOpcode.XOR: int.__xor__}
+
+class PIC16Model:
+	'''Cycle-counting instruction set simulator for :class:`PIC16`.
+
+	Each :meth:`step` executes one 4-Q instruction slot, a taken skip stepping straight over the instruction
+	after it. The results and flag updates follow what the gateware does rather than the Microchip datasheet
+	so the two can be run side by side. Peripheral accesses go through :meth:`readRegister` and
+	:meth:`writeRegister`, which default to a flat 128 byte register file and can be overridden to model a
+	particular bus.
+
+	Instructions are translated to Python closures the first time they are executed, so the program
+	must be given up front or changed through :meth:`load`.
+
+	fuseLoops matches a core built with the same option, running a DECFSZ or INCFSZ followed by a GOTO as
+	a single slot once the GOTO is in the core's loop buffer, and indirectBase places the INDF/FSR registers
+	just as it does for the core.
+
+	With interrupts, setting interrupt has the next step enter the handler at 0x004 as the core does,
+	spending the slot on the entry. The core stretches that slot by up to 3 cycles depending on the Q phase
+	the request arrived in, which the model, knowing nothing finer than slots, doesn't count.
+
+	For programs too long running to simulate cycle by cycle, the model can be run ahead and :meth:`handOff`
+	then loads where it got to into the gateware, which carries on from there.
+
+	Alongside cycles and instructions, the model keeps the rest of the counts PerformanceCounters does.
+	fetchStalls stays 0 as instruction fetches always complete in time here.
+	'''
+
+	def __init__(self, program = (), *, fuseLoops = False, indirectBase = None, interrupts = False):
+		self.fuseLoops = fuseLoops
+		self.indirectBase = indirectBase
+		self.interrupts = interrupts
+		self.memory = bytearray(128)
+
+		self.pcLatchHigh = 0
+		self.wreg = 0
+		self.pc = 0
+		self.flags = 0
+		self.fsr = 0
+		self.bsr = 0
+		self.stack = [0] * 8
+		self.stackCount = 0
+		# Unlike stackCount, which wraps as the core's stack pointer does, this stops at 8 with the stack full
+		self.stackDepth = 0
+		self.stackOverflow = False
+
+		self.interrupt = False
+		self.inInterrupt = False
+		self.shadowWReg = 0
+		self.shadowFlags = 0
+		self.shadowPCLatch = 0
+		# The address of the GOTO in the loop buffer
+		self.loopAddress = None
+
+		self.cycles = 0
+		self.instructions = 0
+		self.fetchStalls = 0
+		self.peripheralReads = 0
+		self.peripheralWrites = 0
+		self.skips = 0
+		self.stackHighWater = 0
+		self.load(program)
+
+	def load(self, program, *, address = 0):
+		'''Load program words into the program memory starting at the given address'''
+		if not hasattr(self, 'program'):
+			self.program = [0] * 4096
+		self.program[address:address + len(program)] = program
+		self._ops = [None] * 4096
+
+	def readRegister(self, address):
+		return self.memory[address]
+
+	def writeRegister(self, address, value):
+		self.memory[address] = value
+
+	def push(self, value):
+		self.stack[self.stackCount] = value
+		self.stackCount = (self.stackCount + 1) & 7
+		if self.stackDepth == 8:
+			self.stackOverflow = True
+		else:
+			self.stackDepth += 1
+		self.stackHighWater = max(self.stackHighWater, self.stackDepth)
+
+	def pop(self):
+		self.stackCount = (self.stackCount - 1) & 7
+		self.stackDepth = max(self.stackDepth - 1, 0)
+		return self.stack[self.stackCount]
+
+	def handOff(self, core):
+		'''Simulation process body loading the model's architectural state into a :class:`PIC16` core, leaving
+		it to fetch the instruction at pc. Run it from a process added with add_process so it's done before the
+		first clock edge, while the core is still in Q0 of its first slot. The file registers are whatever is
+		behind the peripheral bus, so are the testbench's to copy over from memory.
+		'''
+		yield core.pc.eq(self.pc)
+		yield core.wreg.eq(self.wreg)
+		yield core.flags.eq(self.flags)
+		yield core.pcLatchHigh.eq(self.pcLatchHigh)
+		yield core.fsr.eq(self.fsr)
+		yield core.bsr.eq(self.bsr)
+		if core.callStack is not None:
+			for entry, value in enumerate(self.stack):
+				yield core.callStack.stack[entry].eq(value)
+			yield core.callStack.count.eq(self.stackCount)
+			yield core.callStack.depth.eq(self.stackDepth)
+			yield core.callStack.overflow.eq(self.stackOverflow)
+		if core.interrupts:
+			yield core.interrupt.eq(self.interrupt)
+			yield core.inInterrupt.eq(self.inInterrupt)
+			yield core.shadowWReg.eq(self.shadowWReg)
+			yield core.shadowFlags.eq(self.shadowFlags)
+			yield core.shadowPCLatch.eq(self.shadowPCLatch)
+		if core.fuseLoops and self.loopAddress is not None:
+			yield core.loopValid.eq(1)
+			yield core.loopAddress.eq(self.loopAddress)
+			yield core.loopTarget.eq(self.program[self.loopAddress] & 0x7FF)
+
+	@property
+	def interruptPending(self):
+		'''Whether the next step enters the interrupt handler rather than executing an instruction'''
+		return self.interrupts and self.interrupt and not self.inInterrupt
+
+	def step(self):
+		'''Execute one instruction slot, returning the opcode executed'''
+		pc = self.pc
+		self.cycles += 4
+		if self.interruptPending:
+			# The entry slot runs a NOP, returning to the instruction it displaced
+			self.push(pc)
+			self.pc = 0x004
+			self.inInterrupt = True
+			self.shadowWReg = self.wreg
+			self.shadowFlags = self.flags
+			self.shadowPCLatch = self.pcLatchHigh
+			return Opcodes.NOP
+		op = self._ops[pc]
+		if op is None:
+			following = self.program[(pc + 1) & 0xFFF] & 0x3FFF
+			op = self._ops[pc] = self._translate(self.program[pc] & 0x3FFF, following)
+		self.instructions += 1
+		return op(pc)
+
+	def run(self, count):
+		'''Execute count instruction slots, returning the total cycle count'''
+		step = self.step
+		for _ in range(count):
+			step()
+		return self.cycles
+
+	def _translate(self, instruction, following):
+		decoded = decodeTable[instruction]
+		opcode = decoded.opcode
+		# Control comes from the same table the gateware's decoder is built from
+		control = controlTable[opcode]
+		fileAddress = instruction & 0x7F
+		direction = (instruction >> 7) & 1
+		literal = instruction & 0xFF
+		jumpTarget = instruction & 0x7FF
+
+		def stores(store):
+			return store == Store.ALWAYS or store == (Store.DIRECTION_SET if direction else Store.DIRECTION_CLEAR)
+
+		loadsWReg = control.loadsWReg
+		loadsFReg = control.loadsFReg
+		constant = literal if control.loadsLiteral else 0
+		storesWReg = stores(control.storesWReg)
+		storesFReg = not storesWReg and stores(control.storesFReg)
+		storesZeroFlag = control.storesZeroFlag
+		skips = control.skipsOnZero
+		skipsOnBit = control.skipsOnBit
+		testBit = (instruction >> 7) & 7
+		skipBitValue = (instruction >> 10) & 1
+		isJump = control.loadPCLatchHigh
+		isCall = control.isCall
+		isReturn = control.isReturn
+		restoresContext = control.restoresContext and self.interrupts
+		branchesRelative = control.branchesRelative
+		branchOffset = decoded.offset
+		storesPCLatch = control.storesPCLatch
+		storesBSR = control.storesBSR
+		# The GOTO target a fused skip branches to, if this is one
+		fusedTarget = None
+		if skips and self.fuseLoops and decodeTable[following].opcode == Opcodes.GOTO:
+			fusedTarget = following & 0x7FF
+		loadsLoopBuffer = self.fuseLoops and opcode == Opcodes.GOTO
+
+		# Which of the indirect addressing registers this instruction accesses, if any
+		indirect = None
+		base = self.indirectBase
+		accessesFile = (loadsFReg or storesFReg) and not control.fsrRelative
+		if base is not None and accessesFile and fileAddress >> 2 == base >> 2:
+			indirect = IndirectRegister(fileAddress & 3)
+		selectsFSR = indirect == IndirectRegister.FSR
+		throughFSR = indirect is not None and not selectsFSR
+		fsrOffset = 0
+		fsrStep = {IndirectRegister.POSTINC: 1, IndirectRegister.POSTDEC: -1}.get(indirect, 0)
+		if control.fsrRelative:
+			throughFSR = True
+			if decoded.offset is not None:
+				fsrOffset = decoded.offset
+			else:
+				# ++FSR, --FSR, FSR++ and FSR--
+				fsrStep = -1 if decoded.mode & 1 else 1
+				fsrOffset = 0 if decoded.mode & 2 else fsrStep
+
+		# Work out how the result is produced, the arithmetic unit always running alongside as its
+		# result is what the zero flag and skips test
+		arith = _arith[control.arithOpcode]
+		bitOpcode = control.bitOpcode
+		setsCarry = control.resultFromArith or bitOpcode != BitOpcode.NONE
+		carryInvert = int(arith in (_SUB, _DEC, _SUBB))
+		# The shifts are the only bit manipulation instructions setting the zero flag, which they do from their result
+		zeroFromResult = bitOpcode != BitOpcode.NONE
+		if control.resultFromArith:
+			compute = None
+		elif control.logicOpcode != LogicOpcode.NONE:
+			logic = _logic[control.logicOpcode]
+			compute = lambda lhs, rhs, carry: logic(lhs, rhs)
+		elif bitOpcode != BitOpcode.NONE:
+			if bitOpcode == BitOpcode.ROTR:
+				compute = lambda lhs, rhs, carry: ((rhs >> 1) | (carry << 7)) | ((rhs & 1) << 8)
+			elif bitOpcode == BitOpcode.ROTL:
+				compute = lambda lhs, rhs, carry: (rhs << 1) | carry
+			elif bitOpcode == BitOpcode.LSL:
+				compute = lambda lhs, rhs, carry: rhs << 1
+			elif bitOpcode == BitOpcode.LSR:
+				compute = lambda lhs, rhs, carry: (rhs >> 1) | ((rhs & 1) << 8)
+			elif bitOpcode == BitOpcode.ASR:
+				compute = lambda lhs, rhs, carry: (rhs >> 1) | (rhs & 0x80) | ((rhs & 1) << 8)
+			elif bitOpcode == BitOpcode.SWAP:
+				compute = lambda lhs, rhs, carry: ((rhs << 4) | (rhs >> 4)) & 0xFF
+			elif bitOpcode == BitOpcode.BITSET:
+				bit = 1 << ((instruction >> 7) & 7)
+				compute = lambda lhs, rhs, carry: rhs | bit
+			else:
+				mask = ~(1 << ((instruction >> 7) & 7)) & 0xFF
+				compute = lambda lhs, rhs, carry: rhs & mask
+		elif control.resultFromLit:
+			compute = lambda lhs, rhs, carry: rhs
+		elif control.resultFromWReg:
+			compute = lambda lhs, rhs, carry: lhs
+		else:
+			compute = lambda lhs, rhs, carry: 0
+
+		model = self
+		readRegister = self.readRegister
+		writeRegister = self.writeRegister
+
+		def op(pc):
+			flags = model.flags
+			lhs = model.wreg if loadsWReg else 0
+			address = (model.fsr + fsrOffset) & 0x7F if throughFSR else fileAddress
+			if not loadsFReg:
+				rhs = constant
+			elif selectsFSR:
+				rhs = model.fsr
+			else:
+				model.peripheralReads += 1
+				rhs = readRegister(address)
+
+			if arith == _ADD:
+				answer = lhs + rhs
+			elif arith == _SUB:
+				answer = lhs + ((-rhs) & 0xFF)
+			elif arith == _INC:
+				answer = 1 + rhs
+			elif arith == _DEC:
+				answer = 0xFF + rhs
+			elif arith == _ADDC:
+				answer = lhs + rhs + (flags & 1)
+			else:
+				answer = lhs + (~rhs & 0xFF) + (~flags & 1)
+
+			if compute is None:
+				result = answer
+			else:
+				result = compute(lhs, rhs, flags & 1)
+
+			if storesWReg:
+				model.wreg = result & 0xFF
+			elif storesFReg:
+				if selectsFSR:
+					model.fsr = result & 0xFF
+				else:
+					model.peripheralWrites += 1
+					writeRegister(address, result & 0xFF)
+			if fsrStep:
+				model.fsr = (model.fsr + fsrStep) & 0xFF
+			if storesPCLatch:
+				model.pcLatchHigh = result & 0x7F
+			elif storesBSR:
+				model.bsr = result & 0x1F
+
+			if storesZeroFlag:
+				flags = (flags & 0xFD) | (int((result if zeroFromResult else answer) & 0xFF == 0) << 1)
+			if setsCarry:
+				flags = (flags & 0xFE) | ((result >> 8) ^ carryInvert)
+			model.flags = flags
+
+			# A taken skip goes straight on to the instruction after the one skipped over
+			if (skips and answer & 0xFF == 0) or (skipsOnBit and (rhs >> testBit) & 1 == skipBitValue):
+				model.skips += 1
+				model.pc = (pc + 2) & 0xFFF
+				return opcode
+			if fusedTarget is not None and model.loopAddress == (pc + 1) & 0xFFF:
+				model.pc = fusedTarget | (((model.pcLatchHigh >> 3) & 1) << 11)
+				return opcode
+
+			if loadsLoopBuffer:
+				model.loopAddress = pc
+			if isJump:
+				if isCall:
+					model.push((pc + 1) & 0xFFF)
+				model.pc = jumpTarget | (((model.pcLatchHigh >> 3) & 1) << 11)
+			elif isReturn:
+				model.pc = model.pop()
+				if restoresContext:
+					model.wreg = model.shadowWReg
+					model.flags = model.shadowFlags
+					model.pcLatchHigh = model.shadowPCLatch
+					model.inInterrupt = False
+			elif branchesRelative:
+				model.pc = (pc + 1 + (model.wreg if loadsWReg else branchOffset)) & 0xFFF
+			else:
+				model.pc = (pc + 1) & 0xFFF
+			return opcode
+		return op
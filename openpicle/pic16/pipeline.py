@@ -0,0 +1,230 @@
+# SPDX-License-Identifier: BSD-3-Clause
+from torii import Module, Signal, Cat, Mux, Record
+from .types import Opcodes, ArithOpcode, LogicOpcode, BitOpcode
+from . import PIC16
+
+__all__ = ('PipelinedPIC16',)
+
+class PipelinedPIC16(PIC16):
+	'''Three stage pipelined variant of :class:`PIC16` retiring up to one instruction per clock.
+
+	The stages are:
+
+	* Fetch: iBus.read is asserted every cycle with the address of the next instruction, the data being
+	  expected on iBus.data the following cycle just as with the 4-cycle core's instruction memory.
+	* Decode: decodes the fetched instruction and resolves control flow. GOTO and CALL redirect fetch
+	  to their target and returns pop theirs off the call stack, the instruction fetched behind them
+	  being flushed.
+	* Execute: reads W, the literal or the file register, computes the result and writes back W, the
+	  file register and the flags. A file register read takes execute two cycles, as it does the 4-cycle
+	  core's Q2 and Q3: pBus.read is asserted with the address in the first while the rest of the pipeline
+	  is held, and the data is taken from pBus.readData in the second, which is when PICBus presents it.
+	  Any write is strobed on pBus.write in that second cycle. A taken skip (INCFSZ, DECFSZ, BTFSC or
+	  BTFSS) flushes the instruction in decode.
+
+	As every operand is read and written in the execute stage there are no data hazards to stall for,
+	leaving flow changes, skips and file register reads as the only pipeline bubbles. While execute waits
+	on a read, iBus.read is dropped with iBus.address held at the instruction in decode, so whatever is
+	serving instructions keeps presenting it. retire is asserted for each instruction
+	slot leaving execute, with pc, wreg and flags reflecting that slot from the following cycle. The
+	instruction skipped over leaves a bubble rather than retiring as a NOP. Indirect accesses resolve
+	through FSR in execute too, FSR being updated along with the other registers.
+
+	Relative branches are taken in decode like GOTO. BRW and a GOTO or CALL straight after a MOVLP get W or
+	the PC latch forwarded from the instruction in execute if it's about to change them.
+
+	Interrupts are not supported, so the core can't take requests from an InterruptController.
+	'''
+
+	def __init__(self, *, program = None, indirectBase = None):
+		super().__init__(program = program, indirectBase = indirectBase, interrupts = False)
+
+	def elaborate(self, platform):
+		from .decoder import Decoder, controlLayout, controlTable, packControl
+		from .alu import ArithUnit
+		m = Module()
+		decoder = Decoder(opcodes = self.opcodes)
+		m.submodules.decoder = decoder
+		arithUnit = ArithUnit(negateDomain = 'comb')
+		m.submodules.arith = arithUnit
+		logicUnit, bitmanip, callStack = self.addUnits(m)
+
+		carry = self.flags[0]
+		zero = self.flags[1]
+
+		# Fetch stage
+		fetchPC = Signal.like(self.pc)
+
+		# Decode stage
+		decodeValid = Signal()
+		decodePC = Signal.like(self.pc)
+		decodeControl = decoder.control
+		decodeActive = Signal()
+		decodeNextPC = Signal.like(self.pc)
+		instruction = self.iBus.data
+
+		# Execute stage
+		executeValid = Signal()
+		executeInstruction = Signal(14)
+		executeNextPC = Signal.like(self.pc)
+		control = Record(controlLayout)
+		lhs = Signal(8)
+		rhs = Signal(8)
+		result = Signal(8)
+		skip = Signal()
+		squash = Signal()
+		selectsFSR = self.selectsFSR(executeInstruction, control.fsrRelative)
+		# Set for the first of the two cycles a file register read spends in execute, holding the pipeline
+		reading = Signal()
+		readDone = Signal()
+		executing = Signal()
+		wregForward = Signal.like(self.wreg)
+		pcLatchForward = Signal.like(self.pcLatchHigh)
+
+		arithOpcode = control.arithOpcode
+		logicOpcode = control.logicOpcode
+		bitOpcode = control.bitOpcode
+		loadsWReg = control.loadsWReg
+		loadsFReg = control.loadsFReg
+		loadsLiteral = control.loadsLiteral
+		storesWReg = control.storesWReg
+		storesFReg = control.storesFReg
+		storesZeroFlag = control.storesZeroFlag
+		resultFromArith = control.resultFromArith
+
+		changesFlow = decodeControl.changesFlow
+		loadPCLatchHigh = decodeControl.loadPCLatchHigh
+		isReturn = decodeControl.isReturn
+
+		m.d.comb += [
+			reading.eq(executeValid & loadsFReg & ~selectsFSR & ~readDone),
+			executing.eq(executeValid & ~reading),
+			self.iBus.address.eq(Mux(reading, decodePC, fetchPC)),
+			self.iBus.read.eq(~reading),
+			decoder.instruction.eq(instruction),
+			# A decoded instruction only takes effect if it's not being skipped over or held
+			decodeActive.eq(decodeValid & ~squash & ~reading),
+		]
+		m.d.sync += readDone.eq(reading)
+
+		with m.If(loadPCLatchHigh):
+			m.d.comb += decodeNextPC.eq(Cat(instruction[0:11], pcLatchForward[3:5]))
+		if callStack is not None:
+			with m.Elif(isReturn):
+				m.d.comb += decodeNextPC.eq(callStack.valueOut)
+		with m.Elif(decodeControl.branchesRelative):
+			m.d.comb += decodeNextPC.eq(
+				decodePC + 1 + self.branchOffset(instruction, fromWReg = decodeControl.loadsWReg, wreg = wregForward)
+			)
+		with m.Else():
+			m.d.comb += decodeNextPC.eq(decodePC + 1)
+
+		if callStack is not None:
+			m.d.comb += [
+				callStack.valueIn.eq(decodePC + 1),
+				callStack.push.eq(decodeActive & decodeControl.isCall),
+				callStack.pop.eq(decodeActive & isReturn),
+				self.stackDepth.eq(callStack.depth),
+				self.stackOverflow.eq(callStack.overflow),
+			]
+
+		with m.If(~reading):
+			# Fetch runs ahead sequentially unless decode redirects it, flushing the instruction fetched behind
+			with m.If(decodeActive & changesFlow):
+				m.d.sync += [
+					fetchPC.eq(decodeNextPC),
+					decodeValid.eq(0),
+				]
+			with m.Else():
+				m.d.sync += [
+					fetchPC.eq(fetchPC + 1),
+					decodePC.eq(fetchPC),
+					decodeValid.eq(1),
+				]
+
+			# Hand the decoded instruction over to execute, leaving a bubble in its place if it's being skipped
+			m.d.sync += [
+				executeValid.eq(decodeValid & ~squash),
+				executeInstruction.eq(Mux(squash, 0, instruction)),
+				self.retirePC.eq(decodePC),
+				executeNextPC.eq(Mux(squash, decodePC + 1, decodeNextPC)),
+				control.eq(Mux(squash, packControl(controlTable[Opcodes.NOP], 0), decodeControl)),
+			]
+
+		# Execute stage
+		with m.If(loadsWReg):
+			m.d.comb += lhs.eq(self.wreg)
+		with m.If(loadsFReg):
+			m.d.comb += rhs.eq(Mux(selectsFSR, self.fsr, self.pBus.readData))
+		with m.Elif(loadsLiteral):
+			m.d.comb += rhs.eq(executeInstruction[0:8])
+
+		with m.If(resultFromArith):
+			m.d.comb += result.eq(arithUnit.result)
+		if logicUnit is not None:
+			with m.Elif(logicOpcode != LogicOpcode.NONE):
+				m.d.comb += result.eq(logicUnit.result)
+		if bitmanip is not None:
+			with m.Elif(bitOpcode != BitOpcode.NONE):
+				m.d.comb += result.eq(bitmanip.result)
+		with m.Elif(control.resultFromLit):
+			m.d.comb += result.eq(rhs)
+		with m.Elif(control.resultFromWReg):
+			m.d.comb += result.eq(self.wreg)
+
+		m.d.comb += [
+			arithUnit.operation.eq(arithOpcode),
+			arithUnit.enable.eq(executing),
+			arithUnit.lhs.eq(lhs),
+			arithUnit.rhs.eq(rhs),
+			arithUnit.carryIn.eq(carry),
+			skip.eq(arithUnit.result == 0),
+			squash.eq(executing & self.resolveSkip(control, executeInstruction, rhs)),
+
+			self.pBus.address.eq(self.resolveFile(executeInstruction, control.fsrRelative)),
+			self.pBus.read.eq(reading),
+			self.pBus.writeData.eq(result),
+			self.pBus.write.eq(executing & ~storesWReg & storesFReg & ~selectsFSR),
+			self.retire.eq(executing),
+			self.skipped.eq(squash),
+			wregForward.eq(Mux(executing & storesWReg, result, self.wreg)),
+			pcLatchForward.eq(Mux(executing & control.storesPCLatch, result[0:7], self.pcLatchHigh)),
+		]
+		if logicUnit is not None:
+			m.d.comb += [
+				logicUnit.operation.eq(logicOpcode),
+				logicUnit.enable.eq(executing),
+				logicUnit.lhs.eq(lhs),
+				logicUnit.rhs.eq(rhs),
+			]
+		if bitmanip is not None:
+			m.d.comb += [
+				bitmanip.operation.eq(bitOpcode),
+				bitmanip.enable.eq(executing),
+				bitmanip.value.eq(rhs),
+				bitmanip.carryIn.eq(carry),
+				bitmanip.targetBit.eq(executeInstruction[7:10]),
+			]
+
+		with m.If(executing):
+			m.d.sync += self.pc.eq(Mux(squash, decodePC + 1, executeNextPC))
+			with m.If(storesWReg):
+				m.d.sync += self.wreg.eq(result)
+			with m.If(control.storesPCLatch):
+				m.d.sync += self.pcLatchHigh.eq(result[0:7])
+			with m.If(control.storesBSR):
+				m.d.sync += self.bsr.eq(result[0:5])
+			with m.If(storesZeroFlag):
+				m.d.sync += zero.eq(Mux(bitOpcode != BitOpcode.NONE, result == 0, skip))
+			self.updateFSR(
+				m, executeInstruction, fsrRelative = control.fsrRelative, accesses = loadsFReg | storesFReg,
+				writes = ~storesWReg & storesFReg, value = result
+			)
+			with m.If(resultFromArith):
+				carryInvert = (arithOpcode == ArithOpcode.SUB) | (arithOpcode == ArithOpcode.DEC) | \
+					(arithOpcode == ArithOpcode.SUBB)
+				m.d.sync += carry.eq(arithUnit.carry ^ carryInvert)
+			if bitmanip is not None:
+				with m.Elif(bitOpcode != BitOpcode.NONE):
+					m.d.sync += carry.eq(bitmanip.carryOut)
+		return m
@@ -0,0 +1,102 @@
+# SPDX-License-Identifier: BSD-3-Clause
+
+__all__ = (
+	'delayLoop',
+	'fillLoop',
+	'enhancedLoop',
+	'bitCount',
+	'interruptLoop',
+)
+
+# The LED blinker from bitsy.py's IOWO
+delayLoop = (
+	0x3064, 0x0090, 0x0091, 0x0092, 0x3001, 0x0681, 0x3064, 0x0B90,
+	0x2807, 0x0090, 0x0B91, 0x2807, 0x0091, 0x0B92, 0x2807, 0x2803,
+)
+
+# Fills the 8 bytes from 0x20 with 0xA5 by walking FSR through them, with the indirect addressing
+# registers at 0x08 (INDF), 0x09 (POSTINC), 0x0A (POSTDEC) and 0x0B (FSR)
+fillLoop = (
+	0x3020, # MOVLW 0x20
+	0x008B, # MOVWF FSR
+	0x3008, # MOVLW 8
+	0x00C0, # MOVWF 0x40
+	0x30A5, # MOVLW 0xA5
+	0x0089, # MOVWF POSTINC
+	0x0BC0, # DECFSZ 0x40,f
+	0x2805, # GOTO 5
+)
+
+# Runs through the enhanced mid-range instructions in a loop, with the indirect addressing registers at 0x08
+# as for fillLoop. The MOVLW before BRW and MOVLP before GOTO check W and the PC latch are up to date.
+enhancedLoop = (
+	0x3020, # MOVLW 0x20
+	0x008B, # MOVWF FSR
+	0x0012, # MOVIW FSR++
+	0x07A2, # ADDWF 0x22,f
+	0x0012, # MOVIW FSR++
+	0x3DA3, # ADDWFC 0x23,f
+	0x0011, # MOVIW --FSR
+	0x3BA2, # SUBWFB 0x22,f
+	0x3FBF, # MOVWI -1[FSR]
+	0x35A2, # LSLF 0x22,f
+	0x3623, # LSRF 0x23,w
+	0x37A3, # ASRF 0x23,f
+	0x0018, # MOVWI ++FSR
+	0x0025, # MOVLB 5
+	0x3003, # MOVLW 3
+	0x000B, # BRW
+	0x3EFF, # ADDLW 0xFF
+	0x3EFF, # ADDLW 0xFF
+	0x3EFF, # ADDLW 0xFF
+	0x3188, # MOVLP 0x08
+	0x3180, # MOVLP 0x00
+	0x2817, # GOTO 0x017
+	0x3EFF, # ADDLW 0xFF
+	0x33E8, # BRA -0x18
+)
+
+# Counts the bits set in 0x20 into 0x21 with BTFSC, then BTFSS polls bit 2 of the count to pick which of
+# the two GOTOs at the end to spin on
+bitCount = (
+	0x3008, # MOVLW 8
+	0x00A2, # MOVWF 0x22
+	0x1820, # BTFSC 0x20,0
+	0x0AA1, # INCF 0x21,f
+	0x36A0, # LSRF 0x20,f
+	0x0BA2, # DECFSZ 0x22,f
+	0x2802, # GOTO 2
+	0x1D21, # BTFSS 0x21,2
+	0x2808, # GOTO 8
+	0x2809, # GOTO 9
+)
+
+# Raises an interrupt 7 times through a request line at 0x30, the handler at 0x004 clobbering W, the flags
+# and the PC latch to check they're restored by RETFIE before counting into 0x31 and clearing the request
+interruptLoop = (
+	0x2810, # GOTO 0x010
+	0x0000, # NOP
+	0x0000, # NOP
+	0x0000, # NOP
+	0x3055, # MOVLW 0x55
+	0x3EAB, # ADDLW 0xAB
+	0x3188, # MOVLP 0x08
+	0x0AB1, # INCF 0x31,f
+	0x01B0, # CLRF 0x30
+	0x0009, # RETFIE
+	0x0000, # NOP
+	0x0000, # NOP
+	0x0000, # NOP
+	0x0000, # NOP
+	0x0000, # NOP
+	0x0000, # NOP
+	0x3007, # MOVLW 7
+	0x3180, # MOVLP 0x00
+	0x00B2, # MOVWF 0x32
+	0x3001, # MOVLW 1
+	0x00B0, # MOVWF 0x30
+	0x3E01, # ADDLW 1
+	0x0BB2, # DECFSZ 0x32,f
+	0x2813, # GOTO 0x013
+	0x2818, # GOTO 0x018
+)
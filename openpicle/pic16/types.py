@@ -1,7 +1,7 @@
 # SPDX-License-Identifier: BSD-3-Clause
 from enum import Enum, unique
 
-__all__ = ('Opcodes', 'ALUOpcode', 'LogicOpcode', 'BitOpcode')
+__all__ = ('Opcodes', 'ALUOpcode', 'LogicOpcode', 'BitOpcode', 'IndirectRegister')
 
 @unique
 class Opcodes(Enum):
@@ -40,6 +40,18 @@ class Opcodes(Enum):
 	XORLW  = 32
 	SUBLW  = 33
 	ADDLW  = 34
+	# Enhanced mid-range instructions
+	ADDWFC = 35
+	SUBWFB = 36
+	LSLF   = 37
+	LSRF   = 38
+	ASRF   = 39
+	BRA    = 40
+	BRW    = 41
+	MOVLP  = 42
+	MOVLB  = 43
+	MOVIW  = 44
+	MOVWI  = 45
 
 @unique
 class ArithOpcode(Enum):
@@ -47,6 +59,9 @@ class ArithOpcode(Enum):
 	SUB = 2
 	INC = 3
 	DEC = 4
+	# With the carry flag (as a borrow for SUBB) carried in
+	ADDC = 5
+	SUBB = 6
 
 @unique
 class LogicOpcode(Enum):
@@ -63,3 +78,15 @@ class BitOpcode(Enum):
 	SWAP = 3
 	BITCLR = 4
 	BITSET = 5
+	LSL = 6
+	LSR = 7
+	ASR = 8
+
+@unique
+class IndirectRegister(Enum):
+	# Offsets into the core's indirect addressing register block
+	INDF = 0
+	# INDF, stepping FSR on once the instruction's access is done
+	POSTINC = 1
+	POSTDEC = 2
+	FSR = 3
@@ -0,0 +1,216 @@
+# SPDX-License-Identifier: BSD-3-Clause
+from collections import Counter
+from json import dump, load
+from typing import Dict, List, NamedTuple, Optional, Sequence, Tuple
+
+__all__ = (
+	'Profile',
+	'HotLoop',
+	'Profiler',
+	'hotLoops',
+	'printProfile',
+	'writeProfile',
+	'readProfile',
+	'profileProgram',
+)
+
+class Profile(NamedTuple):
+	cycles : int
+	instructions : int
+	# Keyed by the address of the instruction retired
+	hits : Dict[int, int]
+	# The cycles since the previous instruction retired, charged to the instruction retiring
+	pcCycles : Dict[int, int]
+	# Of those, the cycles the core was held waiting on an instruction fetch
+	stalls : Dict[int, int]
+	# Keyed by address, counting every fetch whether or not the instruction is retired
+	fetches : Dict[int, int]
+	opcodes : Dict[str, int]
+	# Jumps back to an earlier (or the same) instruction, keyed by (from, to)
+	backEdges : Dict[Tuple[int, int], int]
+
+class HotLoop(NamedTuple):
+	start : int
+	end : int
+	iterations : int
+	cycles : int
+	instructions : int
+
+class Profiler:
+	'''Instruction level profiler for a PIC16 (either core) in a Torii simulation.
+
+	Add :meth:`process` as a sync process alongside the testbench driving the core. It watches the
+	core's fetches and retirements, so needs nothing else of the testbench. core may also be a
+	:class:`PIC16Caravel`, watching the running core through its simulation strobes. If the core can be held
+	by a fetch unit, give the signal holding it (such as PIC16Caravel's stall) as stall so the cycles can be
+	attributed to the instruction being waited on. The program image is used to work out the opcode of each
+	instruction retired.
+	'''
+
+	def __init__(self, core, program : Sequence[int], *, stall = None):
+		from .caravel import PIC16Caravel
+		from .pic16.decoder import decodeTable
+		self.core = core
+		if isinstance(core, PIC16Caravel):
+			self._fetch, self._fetchAddress = core.fetch, core.fetchAddress
+		else:
+			self._fetch, self._fetchAddress = core.iBus.read, core.iBus.address
+		self.stall = stall
+		self._opcodes = [decodeTable[word & 0x3FFF].opcode.name for word in program]
+		self.cycles = 0
+		self.instructions = 0
+		self.hits = Counter()
+		self.pcCycles = Counter()
+		self.stalls = Counter()
+		self.fetches = Counter()
+		self.opcodes = Counter()
+		self.backEdges = Counter()
+
+	def process(self):
+		from torii.sim import Passive, Settle
+		yield Passive()
+		core = self.core
+		previous = None
+		cycles = 0
+		stalls = 0
+		while True:
+			yield Settle()
+			stalled = self.stall is not None and (yield self.stall)
+			self.cycles += 1
+			cycles += 1
+			if stalled:
+				stalls += 1
+			else:
+				if (yield self._fetch):
+					self.fetches[(yield self._fetchAddress)] += 1
+				if (yield core.retire):
+					pc = yield core.retirePC
+					self.instructions += 1
+					self.hits[pc] += 1
+					self.pcCycles[pc] += cycles
+					if stalls:
+						self.stalls[pc] += stalls
+					self.opcodes[self._opcodes[pc] if pc < len(self._opcodes) else 'NOP'] += 1
+					if previous is not None and pc <= previous:
+						self.backEdges[previous, pc] += 1
+					previous = pc
+					cycles = 0
+					stalls = 0
+			yield
+
+	@property
+	def profile(self) -> Profile:
+		return Profile(
+			self.cycles, self.instructions, dict(self.hits), dict(self.pcCycles), dict(self.stalls),
+			dict(self.fetches), dict(self.opcodes), dict(self.backEdges)
+		)
+
+def hotLoops(profile : Profile, *, count : int = 5) -> List[HotLoop]:
+	'''The loops taking the most cycles, taking a loop as everything from the target of a back edge to its source'''
+	loops = []
+	for (end, start), iterations in profile.backEdges.items():
+		body = range(start, end + 1)
+		loops.append(HotLoop(
+			start, end, iterations,
+			sum(profile.pcCycles.get(pc, 0) for pc in body),
+			sum(profile.hits.get(pc, 0) for pc in body),
+		))
+	loops.sort(key = lambda loop: loop.cycles, reverse = True)
+	return loops[:count]
+
+def printProfile(profile : Profile, program : Optional[Sequence[int]] = None, *, top : int = 10):
+	from .pic16.decoder import decodeTable
+	cycles = profile.cycles or 1
+	cpi = profile.cycles / profile.instructions if profile.instructions else 0.0
+	totalStalls = sum(profile.stalls.values())
+	print(f'{profile.instructions} instructions in {profile.cycles} cycles ({cpi:.2f} cycles/instruction)')
+	print(f'{totalStalls} cycles ({totalStalls / cycles:.1%}) stalled on instruction fetch')
+
+	print()
+	print(f'{"address":>7} {"instruction":<24} {"hits":>10} {"cycles":>10} {"stalls":>8} {"share":>6}')
+	for pc, pcCycles in sorted(profile.pcCycles.items(), key = lambda item: item[1], reverse = True)[:top]:
+		text = ''
+		if program is not None and pc < len(program):
+			decoded = decodeTable[program[pc] & 0x3FFF]
+			text = f'{program[pc]:04x} {decoded.opcode.name}'
+		print(
+			f'{pc:>#7x} {text:<24} {profile.hits[pc]:>10} {pcCycles:>10} {profile.stalls.get(pc, 0):>8} '
+			f'{pcCycles / cycles:>6.1%}'
+		)
+
+	print()
+	print(f'{"opcode":<8} {"count":>10} {"share":>6}')
+	for opcode, count in sorted(profile.opcodes.items(), key = lambda item: item[1], reverse = True):
+		print(f'{opcode:<8} {count:>10} {count / (profile.instructions or 1):>6.1%}')
+
+	loops = hotLoops(profile)
+	if loops:
+		print()
+		print(f'{"loop":<13} {"iterations":>10} {"cycles":>10} {"share":>6}')
+		for loop in loops:
+			print(f'{loop.start:#05x}-{loop.end:#05x}   {loop.iterations:>10} {loop.cycles:>10} {loop.cycles / cycles:>6.1%}')
+
+def writeProfile(profile : Profile, fileName : str):
+	# JSON keys have to be strings, so the back edges are written as a list instead
+	with open(fileName, 'w') as file:
+		dump({
+			'cycles': profile.cycles,
+			'instructions': profile.instructions,
+			'hits': {f'{pc:#x}': count for pc, count in sorted(profile.hits.items())},
+			'pcCycles': {f'{pc:#x}': count for pc, count in sorted(profile.pcCycles.items())},
+			'stalls': {f'{pc:#x}': count for pc, count in sorted(profile.stalls.items())},
+			'fetches': {f'{pc:#x}': count for pc, count in sorted(profile.fetches.items())},
+			'opcodes': profile.opcodes,
+			'backEdges': [[source, target, count] for (source, target), count in sorted(profile.backEdges.items())],
+		}, file, indent = '\t')
+		file.write('\n')
+
+def readProfile(fileName : str) -> Profile:
+	with open(fileName, 'r') as file:
+		data = load(file)
+	byAddress = lambda counts: {int(pc, 16): count for pc, count in counts.items()}
+	return Profile(
+		data['cycles'], data['instructions'], byAddress(data['hits']), byAddress(data['pcCycles']),
+		byAddress(data['stalls']), byAddress(data['fetches']), data['opcodes'],
+		{(source, target): count for source, target, count in data['backEdges']},
+	)
+
+def profileProgram(core : str, *, cycles : int) -> Tuple[Profile, Sequence[int]]:
+	'''Simulate one of the cores running the bundled delay loop (or IOWO with its own) and profile it.
+
+	Caravel profiles PIC16Caravel booting the delay loop from flash, attributing the cycles its fetch unit
+	holds the core to the instructions waited on.
+	'''
+	from torii.sim import Simulator
+	from .busModel import BusModel
+	from .pic16.programs import delayLoop
+	if core == 'Caravel':
+		from .system import CaravelSystem, programImage
+		system = CaravelSystem(programImage(delayLoop))
+		profiler = Profiler(system.dut, delayLoop, stall = system.dut.stall)
+		system.run(cycles, profiler = profiler)
+		return profiler.profile, delayLoop
+	elif core == 'IOWO':
+		from bitsy import IOWO
+		dut = IOWO(sim = True)
+		program = IOWO.program
+		processor = dut.processor
+		# In simulation IOWO brings its instruction bus out to the top level
+		iBus, pBus = dut, None
+	else:
+		from .pic16 import PIC16
+		from .pic16.pipeline import PipelinedPIC16
+		dut = processor = {'PIC16': PIC16, 'PipelinedPIC16': PipelinedPIC16}[core]()
+		program = delayLoop
+		iBus, pBus = dut.iBus, dut.pBus
+
+	def testbench():
+		yield from BusModel(iBus, pBus, program = program).run(cycles)
+
+	profiler = Profiler(processor, program)
+	sim = Simulator(dut)
+	sim.add_clock(1 / 25e6)
+	sim.add_sync_process(testbench)
+	sim.add_sync_process(profiler.process)
+	sim.run()
+	return profiler.profile, program
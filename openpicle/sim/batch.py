@@ -0,0 +1,52 @@
+# SPDX-License-Identifier: BSD-3-Clause
+from random import Random
+from unittest import TestCase
+
+from ..batch import Batch
+from ..pic16.model import PIC16Model
+from ..pic16.programs import delayLoop, fillLoop, enhancedLoop, bitCount
+from .pic16.lockstep import randomProgram
+
+class TestBatch(TestCase):
+	def check(self, batch, programs, **options):
+		results = batch.run()
+		self.assertEqual(len(results), len(programs))
+		for index, ((program, instructions, memory), result) in enumerate(zip(programs, results)):
+			with self.subTest(program = index):
+				model = PIC16Model(program, **options)
+				if memory is not None:
+					model.memory[:] = memory
+				model.run(instructions)
+				self.assertEqual(
+					(result.pc, result.wreg, result.flags & 0b11, result.pcLatchHigh, result.fsr, result.bsr),
+					(model.pc, model.wreg, model.flags, model.pcLatchHigh, model.fsr, model.bsr)
+				)
+				self.assertEqual(result.memory, bytes(model.memory))
+
+	def testPrograms(self):
+		random = Random(0x16)
+		memory = bytearray(128)
+		memory[0x20] = 0xA5
+		programs = [(delayLoop, 300, None), (bitCount, 40, memory)]
+		for _ in range(20):
+			programs.append((randomProgram(random, 32), 100, bytes(random.getrandbits(8) for _ in range(128))))
+		# Run the delay loop again last to check nothing carries over from the programs before it
+		programs.append((delayLoop, 300, None))
+
+		batch = Batch()
+		for program, instructions, memory in programs:
+			batch.add(program, instructions = instructions, memory = memory)
+		self.check(batch, programs)
+
+	def testIndirect(self):
+		memory = bytearray(128)
+		memory[0x20:0x24] = (0xF0, 0x01, 0x20, 0x03)
+		programs = [(fillLoop, 28, None), (enhancedLoop, 200, memory), (fillLoop, 10, None)]
+		batch = Batch(indirectBase = 0x08)
+		for program, instructions, memory in programs:
+			batch.add(program, instructions = instructions, memory = memory)
+		self.check(batch, programs, indirectBase = 0x08)
+
+	def testNoInstructions(self):
+		with self.assertRaises(AssertionError):
+			Batch().add(delayLoop, instructions = 0)
@@ -0,0 +1,138 @@
+# SPDX-License-Identifier: BSD-3-Clause
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from unittest import TestCase
+from torii import Elaboratable, Module, Memory
+from torii.sim import Simulator, Settle
+
+from ..checkpoint import signalNames, saveCheckpoint, loadCheckpoint, _internals
+from ..pic16 import PIC16
+from ..pic16.programs import delayLoop
+from ..soc.busses.qspi.flash import Flash
+from .soc.busses.qspi.flash import DUT as FlashDUT
+
+class System(Elaboratable):
+	'''PIC16 with its program in a synchronous ROM and its registers in RAM, so all its state is in the design'''
+
+	def __init__(self):
+		self.pic = PIC16()
+		self.rom = Memory(width = 14, depth = len(delayLoop), init = delayLoop)
+		self.ram = Memory(width = 8, depth = 128)
+
+	def elaborate(self, platform):
+		m = Module()
+		m.submodules.pic = pic = self.pic
+		m.submodules.rom = self.rom
+		m.submodules.ram = self.ram
+		romPort = self.rom.read_port()
+		ramRead = self.ram.read_port(domain = 'comb')
+		ramWrite = self.ram.write_port()
+		m.d.comb += [
+			romPort.addr.eq(pic.iBus.address),
+			pic.iBus.data.eq(romPort.data),
+			ramRead.addr.eq(pic.pBus.address),
+			pic.pBus.readData.eq(ramRead.data),
+			ramWrite.addr.eq(pic.pBus.address),
+			ramWrite.data.eq(pic.pBus.writeData),
+			ramWrite.en.eq(pic.pBus.write),
+		]
+		return m
+
+class TestCheckpoint(TestCase):
+	def setUp(self):
+		self.directory = TemporaryDirectory()
+		self.fileName = Path(self.directory.name) / 'checkpoint.json'
+
+	def tearDown(self):
+		self.directory.cleanup()
+
+	def testProcessor(self):
+		def simulate(*, restore):
+			system = System()
+			sim = Simulator(system)
+			sim.add_clock(1 / 25e6)
+			trace = []
+
+			def process():
+				if restore:
+					yield Settle()
+					self.assertEqual(loadCheckpoint(sim, self.fileName), {'cycles': 1000})
+				else:
+					for _ in range(1000):
+						yield
+					yield Settle()
+					saveCheckpoint(sim, self.fileName, metadata = {'cycles': 1000})
+				for _ in range(500):
+					yield
+					yield Settle()
+					trace.append(((yield system.pic.pc), (yield system.pic.wreg), (yield system.ram[0x10])))
+
+			sim.add_sync_process(process)
+			sim.run()
+			return trace
+
+		trace = simulate(restore = False)
+		self.assertEqual(simulate(restore = True), trace)
+		# The inner loop counter kept counting down from where it was
+		self.assertNotEqual(trace[0][2], 0)
+
+	def testFlashStartup(self):
+		image = bytes(range(256))
+
+		def simulate(*, restore):
+			dut = FlashDUT(continuousRead = True)
+			controller = dut.controller
+			words = []
+			with Flash(dut.platform.bus, image) as flash:
+				sim = Simulator(dut)
+				sim.add_clock(1 / 25e6)
+
+				def process():
+					if restore:
+						yield Settle()
+						# The flash model's own state has to be carried along by the testbench
+						flash.qpi = loadCheckpoint(sim, self.fileName)['qpi']
+						yield Settle()
+						self.assertTrue((yield controller.ready))
+					else:
+						while not (yield controller.ready):
+							yield
+						yield Settle()
+						saveCheckpoint(sim, self.fileName, metadata = {'qpi': flash.qpi})
+					for address in (0x10, 0x12, 0x40):
+						yield controller.address.eq(address)
+						yield controller.read.eq(1)
+						cycles = 0
+						while not (yield controller.complete):
+							yield
+							yield Settle()
+							cycles += 1
+						yield controller.read.eq(0)
+						yield
+						yield Settle()
+						words.append((cycles, (yield controller.data)))
+
+				sim.add_sync_process(process)
+				sim.add_sync_process(flash.process)
+				sim.run()
+			return words
+
+		words = simulate(restore = False)
+		self.assertEqual([word for _, word in words], [0x1110, 0x1312, 0x4140])
+		self.assertEqual(simulate(restore = True), words)
+
+	def testDifferentDesign(self):
+		sim = Simulator(System())
+		saveCheckpoint(sim, self.fileName)
+		with self.assertRaisesRegex(ValueError, 'different design'):
+			loadCheckpoint(Simulator(FlashDUT()), self.fileName)
+
+	def testToriiInternals(self):
+		# Checkpoints go through Torii's simulator internals, so this fails first should a release change them
+		sim = Simulator(System())
+		_, state = _internals(sim)
+		names = signalNames(sim)
+		pc = state.slots[state.get_signal(names['top.pic.pc'])]
+		self.assertTrue(hasattr(pc, 'curr') and hasattr(pc, 'set'))
+		with self.assertRaisesRegex(RuntimeError, r'Torii internals .* \(Simulator._fragment, '):
+			signalNames(object())
@@ -1,46 +1,11 @@
 # SPDX-License-Identifier: BSD-3-Clause
 from torii.test import ToriiTestCase
-from torii import Elaboratable, Signal, Module
 from torii.sim import Settle
 from ...pic16.types import ArithOpcode, LogicOpcode
-from ...pic16.alu import ArithUnit, LogicUnit
-
-class DUT(Elaboratable):
-	def __init__(self):
-		self.arithOpcode = Signal(ArithOpcode)
-		self.arithLHS = Signal(8)
-		self.arithRHS = Signal(8)
-		self.arithResult = Signal(8)
-		self.logicOpcode = Signal(LogicOpcode)
-		self.logicLHS = Signal(8)
-		self.logicRHS = Signal(8)
-		self.logicResult = Signal(8)
-		self.carry = Signal()
-
-	def elaborate(self, platform):
-		m = Module()
-		m.submodules.arithUnit = arithUnit = ArithUnit()
-		m.submodules.logicUnit = logicUnit = LogicUnit()
-		carryInvert = Signal()
-
-		m.d.comb += [
-			carryInvert.eq((self.arithOpcode == ArithOpcode.SUB) | (self.arithOpcode == ArithOpcode.DEC)),
-			arithUnit.operation.eq(self.arithOpcode),
-			arithUnit.enable.eq(1),
-			arithUnit.lhs.eq(self.arithLHS),
-			arithUnit.rhs.eq(self.arithRHS),
-			self.arithResult.eq(arithUnit.result),
-			self.carry.eq(arithUnit.carry ^ carryInvert),
-			logicUnit.enable.eq(1),
-			logicUnit.operation.eq(self.logicOpcode),
-			logicUnit.lhs.eq(self.logicLHS),
-			logicUnit.rhs.eq(self.logicRHS),
-			self.logicResult.eq(logicUnit.result),
-		]
-		return m
+from ...pic16.alu import ALU
 
 class TestALU(ToriiTestCase):
-	dut: DUT = DUT
+	dut: ALU = ALU
 	domains = (('sync', 25e6),)
 
 	def performArith(self, opcode, lhs, rhs):
@@ -1,5 +1,6 @@
 # SPDX-License-Identifier: BSD-3-Clause
 from torii.test import ToriiTestCase
+from torii.sim import Settle
 from ...pic16.callStack import CallStack
 
 class TestCallStack(ToriiTestCase):
@@ -57,3 +58,36 @@ class TestCallStack(ToriiTestCase):
 		yield
 		assert (yield self.dut.count) == 0
 		yield
+
+	@ToriiTestCase.simulation
+	@ToriiTestCase.sync_domain(domain = 'sync')
+	def testOverflow(self):
+		yield
+		for entry in range(8):
+			yield self.dut.valueIn.eq(0x100 + entry)
+			yield self.dut.push.eq(1)
+			yield
+		yield self.dut.push.eq(0)
+		yield
+		# Full, the depth reads 8 while count has wrapped back round to where the next push goes
+		assert (yield self.dut.depth) == 8
+		assert (yield self.dut.count) == 0
+		assert not (yield self.dut.overflow)
+		yield self.dut.valueIn.eq(0x200)
+		yield self.dut.push.eq(1)
+		yield
+		yield self.dut.push.eq(0)
+		yield
+		assert (yield self.dut.depth) == 8
+		assert (yield self.dut.overflow)
+		# The ninth push overwrote the oldest entry
+		for value in (0x200, 0x107, 0x106, 0x105, 0x104, 0x103, 0x102, 0x101, 0x200):
+			yield Settle()
+			assert (yield self.dut.valueOut) == value
+			yield self.dut.pop.eq(1)
+			yield
+		yield self.dut.pop.eq(0)
+		yield
+		# Popping past empty leaves the depth at 0, the overflow held
+		assert (yield self.dut.depth) == 0
+		assert (yield self.dut.overflow)
@@ -0,0 +1,62 @@
+# SPDX-License-Identifier: BSD-3-Clause
+from unittest import TestCase
+from torii.test import ToriiTestCase
+from torii.sim import Settle
+from ...pic16.types import Opcodes
+from ...pic16.decoder import Decoder, DecodedInstruction, decodeTable, controlTable, packControl
+
+class TestDecodeTable(TestCase):
+	def testDecodeTable(self):
+		self.assertEqual(len(decodeTable), 2 ** 14)
+		self.assertEqual(decodeTable[0x0000], DecodedInstruction(Opcodes.NOP))
+		self.assertEqual(decodeTable[0x0001], DecodedInstruction(Opcodes.NOP))
+		self.assertEqual(decodeTable[0x0064], DecodedInstruction(Opcodes.NOP))
+		self.assertEqual(decodeTable[0x0090], DecodedInstruction(Opcodes.MOVWF, fileAddress = 0x10))
+		self.assertEqual(decodeTable[0x0681],
+			DecodedInstruction(Opcodes.XORWF, fileAddress = 0x01, direction = 1))
+		self.assertEqual(decodeTable[0x0B10],
+			DecodedInstruction(Opcodes.DECFSZ, fileAddress = 0x10, direction = 0))
+		self.assertEqual(decodeTable[0x1684], DecodedInstruction(Opcodes.BSF, fileAddress = 0x04, bit = 5))
+		self.assertEqual(decodeTable[0x2015], DecodedInstruction(Opcodes.CALL, target = 0x015))
+		self.assertEqual(decodeTable[0x2FFF], DecodedInstruction(Opcodes.GOTO, target = 0x7FF))
+		self.assertEqual(decodeTable[0x3001], DecodedInstruction(Opcodes.MOVLW, literal = 0x01))
+		self.assertEqual(decodeTable[0x3CAA], DecodedInstruction(Opcodes.SUBLW, literal = 0xAA))
+
+	def testEnhancedDecodeTable(self):
+		# The enhanced mid-range instructions take over some of the don't care encodings of the base ones
+		self.assertEqual(decodeTable[0x3301], DecodedInstruction(Opcodes.BRA, offset = -255))
+		self.assertEqual(decodeTable[0x33FF], DecodedInstruction(Opcodes.BRA, offset = -1))
+		self.assertEqual(decodeTable[0x3DAA],
+			DecodedInstruction(Opcodes.ADDWFC, fileAddress = 0x2A, direction = 1))
+		self.assertEqual(decodeTable[0x3B05],
+			DecodedInstruction(Opcodes.SUBWFB, fileAddress = 0x05, direction = 0))
+		self.assertEqual(decodeTable[0x3590], DecodedInstruction(Opcodes.LSLF, fileAddress = 0x10, direction = 1))
+		self.assertEqual(decodeTable[0x3610], DecodedInstruction(Opcodes.LSRF, fileAddress = 0x10, direction = 0))
+		self.assertEqual(decodeTable[0x3790], DecodedInstruction(Opcodes.ASRF, fileAddress = 0x10, direction = 1))
+		self.assertEqual(decodeTable[0x000B], DecodedInstruction(Opcodes.BRW))
+		self.assertEqual(decodeTable[0x3188], DecodedInstruction(Opcodes.MOVLP, literal = 0x08))
+		self.assertEqual(decodeTable[0x0025], DecodedInstruction(Opcodes.MOVLB, literal = 0x05))
+		self.assertEqual(decodeTable[0x0012], DecodedInstruction(Opcodes.MOVIW, mode = 2))
+		self.assertEqual(decodeTable[0x0019], DecodedInstruction(Opcodes.MOVWI, mode = 1))
+		self.assertEqual(decodeTable[0x3F3F], DecodedInstruction(Opcodes.MOVIW, offset = -1))
+		self.assertEqual(decodeTable[0x3F85], DecodedInstruction(Opcodes.MOVWI, offset = 5))
+		# Words the enhanced set doesn't give a meaning to decode as they always have. With the one FSR,
+		# that includes the FSR1 forms of MOVIW and MOVWI.
+		self.assertEqual(decodeTable[0x3101], DecodedInstruction(Opcodes.MOVLW, literal = 0x01))
+		self.assertEqual(decodeTable[0x0040], DecodedInstruction(Opcodes.NOP))
+		self.assertEqual(decodeTable[0x0014], DecodedInstruction(Opcodes.NOP))
+		self.assertEqual(decodeTable[0x3F40], DecodedInstruction(Opcodes.ADDLW, literal = 0x40))
+
+class TestDecoder(ToriiTestCase):
+	dut: Decoder = Decoder
+	domains = ()
+
+	@ToriiTestCase.simulation
+	@ToriiTestCase.comb_domain
+	def testExhaustive(self):
+		for instruction, decoded in enumerate(decodeTable):
+			yield self.dut.instruction.eq(instruction)
+			yield Settle()
+			assert (yield self.dut.opcode) == decoded.opcode.value, f'{instruction:04x} != {decoded}'
+			control = packControl(controlTable[decoded.opcode], (instruction >> 7) & 1)
+			assert (yield self.dut.control) == control, f'{instruction:04x} control != {control:06x}'
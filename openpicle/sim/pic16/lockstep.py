@@ -0,0 +1,366 @@
+# SPDX-License-Identifier: BSD-3-Clause
+from collections import deque
+from random import Random
+from unittest import TestCase
+from torii.test import ToriiTestCase
+from torii.sim import Simulator
+from ...pic16 import PIC16
+from ...pic16.pipeline import PipelinedPIC16
+from ...pic16.decoder import decodeTable, controlTable
+from ...pic16.model import PIC16Model
+from ...pic16.programs import delayLoop, fillLoop, enhancedLoop, bitCount, interruptLoop
+from ...busModel import BusModel
+
+__all__ = (
+	'Lockstep',
+	'LockstepDivergence',
+)
+
+class LockstepDivergence(AssertionError):
+	pass
+
+class _RecordingModel(PIC16Model):
+	def __init__(self, program, *, interruptLine = None, **kwargs):
+		super().__init__(program, interrupts = interruptLine is not None, **kwargs)
+		self.interruptLine = interruptLine
+		self.writes = []
+
+	def writeRegister(self, address, value):
+		super().writeRegister(address, value)
+		self.writes.append((address, value))
+		if address == self.interruptLine:
+			self.interrupt = bool(value & 1)
+
+class Lockstep:
+	'''Runs a PIC16 in simulation in lockstep with PIC16Model.
+
+	The gateware's busses are served by a :class:`BusModel` from the program image and a 128 byte register
+	file. After every instruction slot retires, the gateware's pc, wreg and flags and the peripheral writes the
+	instruction made are checked against the model, raising LockstepDivergence on the first mismatch. For a
+	core built with fuseLoops or indirectBase, the model must be too.
+
+	To start the comparison deep into a program, :meth:`fastForward` runs the model alone first, after which
+	:meth:`run` hands its state over to the gateware.
+
+	For a core built with interrupts, bit 0 of the register at interruptLine drives the interrupt request,
+	so the program raises and clears its own interrupts by writing it.
+	'''
+
+	def __init__(
+		self, program, *, memory = None, history = 8, fuseLoops = False, indirectBase = None, interruptLine = None
+	):
+		self.program = [0] * 4096
+		self.program[:len(program)] = program
+		self.memory = bytearray(128) if memory is None else bytearray(memory)
+		self.interruptLine = interruptLine
+		self.model = _RecordingModel(
+			program, fuseLoops = fuseLoops, indirectBase = indirectBase, interruptLine = interruptLine
+		)
+		self.model.memory[:] = self.memory
+		self.retired = 0
+		self._history = deque(maxlen = history)
+
+	def fastForward(self, instructions):
+		'''Run the model alone through the given number of instruction slots, for the comparison to pick up from'''
+		self.model.run(instructions)
+		self.model.writes = []
+		self.memory[:] = self.model.memory
+		self.retired += instructions
+
+	def check(self, dut : PIC16, *, instructions):
+		'''Simulation process running the lockstep comparison for the given number of instruction slots. After
+		a :meth:`fastForward`, the model's state must have been handed off to dut before the first clock edge.
+		'''
+		iBus = dut.iBus
+		# The first fetch is from address 0, or wherever the model was fast forwarded to
+		bus = BusModel(iBus, dut.pBus, program = self.program, memory = self.memory, pc = self.model.pc)
+		pipelined = isinstance(dut, PipelinedPIC16)
+		writes = []
+		sinceFetch = None
+		retiring = False
+		instructions += self.retired
+
+		while self.retired < instructions:
+			yield from bus.present()
+
+			# The pipelined core's state reflects a retiring instruction from the cycle after retire
+			if retiring:
+				yield from self._compare(dut, writes)
+				writes = []
+
+			write = yield from bus.complete()
+			if write is not None:
+				writes.append(write)
+				address, value = write
+				if address == self.interruptLine:
+					yield dut.interrupt.eq(value & 1)
+
+			if pipelined:
+				retiring = yield dut.retire
+			# The instruction fetched in each instruction slot's Q0 has had all its effects by Q2 of the next
+			elif (yield iBus.read):
+				sinceFetch = 0
+			elif sinceFetch is not None:
+				sinceFetch += 1
+				if sinceFetch == 2:
+					yield from self._compare(dut, writes)
+					writes = []
+			yield
+
+	def _compare(self, dut, writes):
+		model = self.model
+		pc = model.pc
+		entering = model.interruptPending
+		model.writes = []
+		model.step()
+		self.retired += 1
+		self._history.append((pc, None if entering else model.program[pc]))
+
+		state = {
+			'pc': ((yield dut.pc), model.pc),
+			'wreg': ((yield dut.wreg), model.wreg),
+			# Only the carry and zero flags are implemented
+			'flags': ((yield dut.flags) & 0b11, model.flags),
+			'pcLatchHigh': ((yield dut.pcLatchHigh), model.pcLatchHigh),
+			'bsr': ((yield dut.bsr), model.bsr),
+			'fsr': ((yield dut.fsr), model.fsr),
+			'writes': (writes, model.writes),
+		}
+		mismatches = [
+			f'{name}: gateware {self._format(value)} != model {self._format(expected)}'
+			for name, (value, expected) in state.items() if value != expected
+		]
+		if mismatches:
+			raise LockstepDivergence(self.report(mismatches))
+
+	@staticmethod
+	def _format(value):
+		if isinstance(value, list):
+			return '[' + ', '.join(f'{address:#04x}={data:#04x}' for address, data in value) + ']'
+		return f'{value:#04x}'
+
+	def report(self, mismatches):
+		lines = [f'Divergence after instruction slot {self.retired}:']
+		lines.extend(f'  {mismatch}' for mismatch in mismatches)
+		lines.append('Most recent instructions:')
+		for pc, instruction in self._history:
+			if instruction is None:
+				lines.append(f'  {pc:03x}: (interrupt)')
+				continue
+			decoded = decodeTable[instruction & 0x3FFF]
+			operands = ', '.join(
+				f'{field}={value:#x}' for field, value in decoded._asdict().items()
+				if field != 'opcode' and value is not None
+			)
+			lines.append(f'  {pc:03x}: {instruction:04x} {decoded.opcode.name} {operands}'.rstrip())
+		return '\n'.join(lines)
+
+	def run(self, *, instructions, dut = None):
+		'''Build a simulator for a fresh PIC16 and run the comparison'''
+		if dut is None:
+			dut = PIC16()
+		sim = Simulator(dut)
+		sim.add_clock(1 / 25e6)
+
+		def handOff():
+			yield from self.model.handOff(dut)
+
+		def process():
+			yield from self.check(dut, instructions = instructions)
+
+		sim.add_process(handOff)
+		sim.add_sync_process(process)
+		sim.run()
+
+def randomProgram(random : Random, length):
+	program = []
+	for _ in range(length):
+		instruction = random.getrandbits(14)
+		# Keep CALL and GOTO targets inside the program
+		if instruction >> 12 == 0b10:
+			instruction = (instruction & 0x3800) | random.randrange(length)
+		program.append(instruction)
+	return program
+
+class TestLockstep(ToriiTestCase):
+	dut: PIC16 = PIC16
+	domains = (('sync', 25e6),)
+
+	@ToriiTestCase.simulation
+	@ToriiTestCase.sync_domain(domain = 'sync')
+	def testDelayLoop(self):
+		yield from Lockstep(delayLoop).check(self.dut, instructions = 500)
+
+	@ToriiTestCase.simulation
+	@ToriiTestCase.sync_domain(domain = 'sync')
+	def testRandomPrograms(self):
+		random = Random(0x16)
+		program = randomProgram(random, 64)
+		memory = bytes(random.getrandbits(8) for _ in range(128))
+		yield from Lockstep(program, memory = memory).check(self.dut, instructions = 1000)
+
+	@ToriiTestCase.simulation
+	@ToriiTestCase.sync_domain(domain = 'sync')
+	def testBitCount(self):
+		memory = bytearray(128)
+		memory[0x20] = 0xA5
+		lockstep = Lockstep(bitCount, memory = memory)
+		yield from lockstep.check(self.dut, instructions = 40)
+		self.assertEqual(lockstep.memory[0x21], 4)
+
+class TestSpecialisedLockstep(ToriiTestCase):
+	dut: PIC16 = PIC16
+	dut_args = {'program': delayLoop}
+	domains = (('sync', 25e6),)
+
+	@ToriiTestCase.simulation
+	@ToriiTestCase.sync_domain(domain = 'sync')
+	def testDelayLoop(self):
+		# The delay loop needs the logic unit for its XORWF, but not the bit manipulation unit or call stack
+		self.assertEqual(
+			[unit for unit in ('logic', 'bitmanip', 'callStack') if self.dut.usesUnit(unit)], ['logic']
+		)
+		yield from Lockstep(delayLoop).check(self.dut, instructions = 500)
+
+class TestPrunedUnits(TestCase):
+	def testUnusedElaboratables(self):
+		# The units a specialised core leaves out are still built, so must not be reported as never used
+		from gc import collect
+		from warnings import catch_warnings, simplefilter
+		from torii.diagnostics.warnings import UnusedElaboratable
+		from torii.hdl import Fragment
+		with catch_warnings(record = True) as caught:
+			simplefilter('always', UnusedElaboratable)
+			for core in (PIC16, PipelinedPIC16):
+				Fragment.get(core(program = delayLoop), None)
+			collect()
+		self.assertEqual([warning for warning in caught if issubclass(warning.category, UnusedElaboratable)], [])
+
+class TestFusedLockstep(ToriiTestCase):
+	dut: PIC16 = PIC16
+	dut_args = {'fuseLoops': True}
+	domains = (('sync', 25e6),)
+
+	@ToriiTestCase.simulation
+	@ToriiTestCase.sync_domain(domain = 'sync')
+	def testDelayLoop(self):
+		yield from Lockstep(delayLoop, fuseLoops = True).check(self.dut, instructions = 500)
+
+	@ToriiTestCase.simulation
+	@ToriiTestCase.sync_domain(domain = 'sync')
+	def testRandomPrograms(self):
+		random = Random(0x16)
+		program = randomProgram(random, 64)
+		memory = bytes(random.getrandbits(8) for _ in range(128))
+		yield from Lockstep(program, memory = memory, fuseLoops = True).check(self.dut, instructions = 1000)
+
+	@ToriiTestCase.simulation
+	@ToriiTestCase.sync_domain(domain = 'sync')
+	def testBitCount(self):
+		memory = bytearray(128)
+		memory[0x20] = 0xA5
+		lockstep = Lockstep(bitCount, memory = memory, fuseLoops = True)
+		yield from lockstep.check(self.dut, instructions = 30)
+		self.assertEqual(lockstep.memory[0x21], 4)
+
+class TestIndirectLockstep(ToriiTestCase):
+	dut: PIC16 = PIC16
+	dut_args = {'indirectBase': 0x08}
+	domains = (('sync', 25e6),)
+
+	@ToriiTestCase.simulation
+	@ToriiTestCase.sync_domain(domain = 'sync')
+	def testFillLoop(self):
+		lockstep = Lockstep(fillLoop, indirectBase = 0x08)
+		yield from lockstep.check(self.dut, instructions = 28)
+		self.assertEqual(lockstep.memory[0x20:0x28], bytes([0xA5] * 8))
+
+	@ToriiTestCase.simulation
+	@ToriiTestCase.sync_domain(domain = 'sync')
+	def testRandomPrograms(self):
+		random = Random(0x16)
+		program = randomProgram(random, 64)
+		memory = bytes(random.getrandbits(8) for _ in range(128))
+		yield from Lockstep(program, memory = memory, indirectBase = 0x08).check(self.dut, instructions = 1000)
+
+	@ToriiTestCase.simulation
+	@ToriiTestCase.sync_domain(domain = 'sync')
+	def testEnhancedLoop(self):
+		memory = bytearray(128)
+		memory[0x20:0x24] = (0xF0, 0x01, 0x20, 0x03)
+		yield from Lockstep(enhancedLoop, memory = memory, indirectBase = 0x08).check(self.dut, instructions = 200)
+
+class TestInterruptLockstep(ToriiTestCase):
+	dut: PIC16 = PIC16
+	dut_args = {'interrupts': True}
+	domains = (('sync', 25e6),)
+
+	@ToriiTestCase.simulation
+	@ToriiTestCase.sync_domain(domain = 'sync')
+	def testInterruptLoop(self):
+		lockstep = Lockstep(interruptLoop, interruptLine = 0x30)
+		yield from lockstep.check(self.dut, instructions = 90)
+		self.assertEqual(lockstep.memory[0x31], 7)
+
+	@ToriiTestCase.simulation
+	@ToriiTestCase.sync_domain(domain = 'sync')
+	def testRandomPrograms(self):
+		# Random straight-line code looping from 0x008, with MOVWFs to the request line dotted through it so
+		# interrupts land on all sorts of instructions. The handler clobbers W, the flags and the PC latch.
+		def straightLine(word):
+			control = controlTable[decodeTable[word & 0x3FFF].opcode]
+			return not (control.changesFlow or control.storesPCLatch)
+
+		random = Random(0x16)
+		body = [word for word in randomProgram(random, 256) if straightLine(word)][:48]
+		memory = bytes(random.getrandbits(8) for _ in range(128))
+		for address in random.sample(range(len(body)), 8):
+			body[address] = 0x00B0 # MOVWF 0x30
+		program = (0x2808, 0x0000, 0x0000, 0x0000, 0x01B0, 0x3E80, 0x3185, 0x0009, *body, 0x2808)
+		yield from Lockstep(program, memory = memory, interruptLine = 0x30).check(self.dut, instructions = 1000)
+
+class TestFastForward(TestCase):
+	def testDelayLoopWrap(self):
+		# Run up to the last few passes of the inner loop before the outer counter reaches 0, then compare
+		# the gateware as the loops unwind and the counters are reloaded
+		model = PIC16Model(delayLoop)
+		while model.memory[0x12] != 1 or model.memory[0x11] != 1 or model.memory[0x10] > 10:
+			model.step()
+		lockstep = Lockstep(delayLoop)
+		lockstep.fastForward(model.instructions)
+		lockstep.run(instructions = 60)
+		self.assertEqual(lockstep.retired, model.instructions + 60)
+		self.assertEqual(lockstep.memory[0x12], 100)
+		# The LED bit turned on at the start is toggled back off as the outer loop starts over
+		self.assertEqual(lockstep.memory[0x01], 0)
+
+	def testCallStack(self):
+		# Fast forward to inside a subroutine, with the return address only on the model's call stack
+		program = (
+			0x3005, # MOVLW 5
+			0x2004, # CALL 4
+			0x00A0, # MOVWF 0x20
+			0x2803, # GOTO 3
+			0x3E01, # ADDLW 1
+			0x0008, # RETURN
+		)
+		lockstep = Lockstep(program)
+		lockstep.fastForward(3)
+		self.assertEqual((lockstep.model.pc, lockstep.model.stackCount), (5, 1))
+		lockstep.run(instructions = 3)
+		self.assertEqual(lockstep.memory[0x20], 6)
+
+class TestDivergence(TestCase):
+	def testReport(self):
+		lockstep = Lockstep((
+			0x3010, # MOVLW 0x10
+			0x0785, # ADDWF 5,f
+			0x0086, # MOVWF 6
+		))
+		lockstep.model.memory[5] = 1
+		with self.assertRaises(LockstepDivergence) as context:
+			lockstep.run(instructions = 3)
+		report = str(context.exception)
+		self.assertEqual(lockstep.retired, 2)
+		self.assertIn('writes: gateware [0x05=0x10] != model [0x05=0x11]', report)
+		self.assertIn('001: 0785 ADDWF fileAddress=0x5, direction=0x1', report)
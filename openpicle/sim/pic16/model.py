@@ -0,0 +1,240 @@
+# SPDX-License-Identifier: BSD-3-Clause
+from unittest import TestCase
+from ...pic16.types import Opcodes
+from ...pic16.model import PIC16Model
+from ...pic16.programs import delayLoop, fillLoop, enhancedLoop, bitCount, interruptLoop
+
+class TestModel(TestCase):
+	def testArithmetic(self):
+		model = PIC16Model((
+			0x301F, # MOVLW 0x1F
+			0x3E05, # ADDLW 5
+			0x0785, # ADDWF 5,f
+			0x3CFF, # SUBLW 0xFF
+			0x0E88, # SWAPF 8,f
+			0x0D08, # RLF 8,w
+		))
+		model.memory[5] = 0x20
+		model.memory[8] = 0x0F
+		model.step()
+		self.assertEqual(model.wreg, 0x1F)
+		model.step()
+		self.assertEqual(model.wreg, 0x24)
+		self.assertEqual(model.flags, 0)
+		model.step()
+		self.assertEqual(model.memory[5], 0x44)
+		model.step()
+		# The core computes W - k with the carry flag acting as a borrow
+		self.assertEqual(model.wreg, 0x25)
+		self.assertEqual(model.flags, 1)
+		model.step()
+		self.assertEqual(model.memory[8], 0xF0)
+		self.assertEqual(model.flags, 0)
+		model.step()
+		self.assertEqual(model.wreg, 0xE0)
+		self.assertEqual(model.flags, 1)
+		self.assertEqual(model.pc, 6)
+		self.assertEqual(model.cycles, 24)
+
+	def testCallStack(self):
+		model = PIC16Model((
+			0x2004, # CALL 4
+			0x2805, # GOTO 5
+			0x0000,
+			0x0000,
+			0x0008, # RETURN
+			0x2000, # CALL 0
+		))
+		self.assertEqual(model.step(), Opcodes.CALL)
+		self.assertEqual((model.pc, model.stackCount), (4, 1))
+		self.assertEqual(model.step(), Opcodes.RETURN)
+		self.assertEqual((model.pc, model.stackCount), (1, 0))
+		self.assertEqual(model.step(), Opcodes.GOTO)
+		self.assertEqual(model.pc, 5)
+		# Each pass through CALL 0 leaves one more return address on the stack, so 9 passes
+		# wraps the 8-entry stack around
+		for _ in range(9 * 4):
+			model.step()
+		self.assertEqual(model.pc, 5)
+		self.assertEqual(model.stackCount, 1)
+		# The depth stops at the 8 entries there are. The eighth pass's CALL 4 overflowed the stack, so after
+		# its RETURN the depth falls a pass behind the 9 return addresses pushed.
+		self.assertEqual((model.stackDepth, model.stackHighWater, model.stackOverflow), (7, 8, True))
+		self.assertEqual(model.pop(), 6)
+		self.assertEqual(model.stackDepth, 6)
+
+	def testDelayLoop(self):
+		model = PIC16Model(delayLoop)
+		while model.memory[0x12] != 99:
+			model.step()
+		self.assertEqual(model.memory[0x01], 1)
+		self.assertEqual(model.memory[0x10], 100)
+		self.assertEqual(model.memory[0x11], 100)
+		# 7 setup instructions, 100 passes through the 200 instruction inner loop each with their
+		# 3 instructions of reload/decrement/branch, then the final reload and outer decrement. The
+		# 101 GOTOs skipped over on leaving the loops are never run and cost no slot.
+		self.assertEqual(model.cycles, 4 * 20208)
+		self.assertEqual(model.instructions, 20208)
+		self.assertEqual(model.pc, 14)
+
+	def testFusedDelayLoop(self):
+		model = PIC16Model(delayLoop, fuseLoops = True)
+		while model.memory[0x12] != 99:
+			model.step()
+		self.assertEqual(model.memory[0x01], 1)
+		self.assertEqual(model.memory[0x10], 100)
+		self.assertEqual(model.memory[0x11], 100)
+		# Each pass through the inner loop is now a single slot, bar the first which has to run the GOTO to
+		# get it into the loop buffer. The outer loops' GOTOs replace it there, so those are never fused.
+		self.assertEqual(model.cycles, 4 * (20208 - 100 * 98))
+		self.assertEqual(model.instructions, 20208 - 100 * 98)
+		self.assertEqual(model.pc, 14)
+		self.assertEqual(model.loopAddress, 8)
+
+	def testIndirectFill(self):
+		model = PIC16Model(fillLoop, indirectBase = 0x08)
+		while model.pc != len(fillLoop):
+			model.step()
+		self.assertEqual(model.memory[0x20:0x28], bytes([0xA5] * 8))
+		self.assertEqual(model.memory[0x28], 0)
+		self.assertEqual(model.fsr, 0x28)
+		# None of the indirect addressing registers are backed by memory
+		self.assertEqual(model.memory[0x08:0x0C], bytes(4))
+		# 5 setup instructions and 3 per byte, less the GOTO skipped on the last pass
+		self.assertEqual(model.instructions, 5 + 8 * 3 - 1)
+
+	def testIndirectRegisters(self):
+		model = PIC16Model((
+			0x3030, # MOVLW 0x30
+			0x008B, # MOVWF FSR
+			0x0A8A, # INCF POSTDEC,f
+			0x0A8A, # INCF POSTDEC,f
+			0x0A0B, # INCF FSR,w
+			0x0A8B, # INCF FSR,f
+			0x0188, # CLRF INDF
+			0x0089, # MOVWF POSTINC
+		), indirectBase = 0x08)
+		model.memory[0x30] = 0x10
+		model.memory[0x2F] = 0x20
+		model.run(4)
+		# Each read-modify-write through POSTDEC steps FSR once
+		self.assertEqual(model.memory[0x2F:0x31], bytes((0x21, 0x11)))
+		self.assertEqual(model.fsr, 0x2E)
+		model.run(2)
+		self.assertEqual(model.wreg, 0x2F)
+		self.assertEqual(model.fsr, 0x2F)
+		model.run(1)
+		self.assertEqual(model.memory[0x2F], 0x00)
+		model.run(1)
+		self.assertEqual(model.memory[0x2F:0x31], bytes((0x2F, 0x11)))
+		self.assertEqual(model.fsr, 0x30)
+
+	def testIndirectDisabled(self):
+		# Without indirectBase, the same addresses are plain file registers
+		model = PIC16Model(fillLoop[:2])
+		model.run(2)
+		self.assertEqual(model.memory[0x0B], 0x20)
+		self.assertEqual(model.fsr, 0)
+
+	def testMultiByteArithmetic(self):
+		model = PIC16Model((
+			0x0012, # MOVIW FSR++
+			0x07A2, # ADDWF 0x22,f
+			0x0012, # MOVIW FSR++
+			0x3DA3, # ADDWFC 0x23,f
+			0x0011, # MOVIW --FSR
+			0x3BA2, # SUBWFB 0x22,f
+		))
+		model.fsr = 0x20
+		model.memory[0x20:0x24] = bytes((0xF0, 0x01, 0x20, 0x03))
+		model.run(4)
+		# 0x01F0 + 0x0320, with the carry out of the low byte going into the high byte
+		self.assertEqual(model.memory[0x22:0x24], bytes((0x10, 0x05)))
+		self.assertEqual(model.flags, 0)
+		model.run(2)
+		# As SUBWF, this is W - f with the carry flag being the borrow
+		self.assertEqual(model.fsr, 0x21)
+		self.assertEqual(model.memory[0x22], 0xF1)
+		self.assertEqual(model.flags, 1)
+
+	def testShifts(self):
+		model = PIC16Model((
+			0x35A0, # LSLF 0x20,f
+			0x3620, # LSRF 0x20,w
+			0x37A1, # ASRF 0x21,f
+			0x37A1, # ASRF 0x21,f
+		))
+		model.memory[0x20] = 0x80
+		model.memory[0x21] = 0x81
+		model.flags = 1
+		model.step()
+		self.assertEqual(model.memory[0x20], 0x00)
+		self.assertEqual(model.flags, 0b11)
+		model.step()
+		self.assertEqual(model.wreg, 0x00)
+		self.assertEqual(model.flags, 0b10)
+		model.step()
+		self.assertEqual(model.memory[0x21], 0xC0)
+		self.assertEqual(model.flags, 0b01)
+		model.step()
+		self.assertEqual(model.memory[0x21], 0xE0)
+		self.assertEqual(model.flags, 0b00)
+
+	def testRelativeBranches(self):
+		model = PIC16Model(enhancedLoop)
+		model.pc = 14
+		self.assertEqual(model.step(), Opcodes.MOVLW)
+		self.assertEqual(model.step(), Opcodes.BRW)
+		self.assertEqual(model.pc, 19)
+		self.assertEqual(model.step(), Opcodes.MOVLP)
+		self.assertEqual(model.pcLatchHigh, 0x08)
+		model.run(2)
+		self.assertEqual(model.pc, 23)
+		self.assertEqual(model.step(), Opcodes.BRA)
+		self.assertEqual(model.pc, 0)
+		self.assertEqual(model.wreg, 3)
+
+	def testEnhancedLoop(self):
+		model = PIC16Model(enhancedLoop, indirectBase = 0x08)
+		model.memory[0x20:0x24] = bytes((0xF0, 0x01, 0x20, 0x03))
+		model.run(20)
+		self.assertEqual(model.pc, 0)
+		self.assertEqual(model.memory[0x20:0x24], bytes((0x01, 0x01, 0x02, 0x02)))
+		self.assertEqual((model.wreg, model.fsr, model.bsr, model.flags), (3, 0x22, 5, 0b01))
+
+	def testBitSkips(self):
+		model = PIC16Model(bitCount)
+		model.memory[0x20] = 0xA5
+		while model.pc != 9:
+			model.step()
+		self.assertEqual(model.memory[0x21], 4)
+		# 2 setup instructions, then 5 per set bit and 4 per clear bit as each INCF skipped over costs
+		# nothing, less the final GOTO skipped, and the BTFSS
+		self.assertEqual(model.instructions, 2 + 4 * 5 + 4 * 4 - 1 + 1)
+		self.assertEqual(model.cycles, 4 * model.instructions)
+
+	def testInterrupts(self):
+		class Model(PIC16Model):
+			def writeRegister(self, address, value):
+				super().writeRegister(address, value)
+				if address == 0x30:
+					self.interrupt = bool(value & 1)
+
+		model = Model(interruptLoop, interrupts = True)
+		while model.pc != 0x18:
+			model.step()
+		self.assertEqual(model.memory[0x31], 7)
+		self.assertEqual((model.wreg, model.flags, model.pcLatchHigh), (2, 0b00, 0x00))
+		self.assertFalse(model.inInterrupt)
+		self.assertEqual(model.stackCount, 0)
+		# 4 setup instructions, then each pass raises the interrupt, spends a slot entering it and 6 in the
+		# handler before the 3 instructions closing the loop, less the final GOTO skipped
+		self.assertEqual(model.cycles, 4 * (4 + 7 * 12 - 1))
+		self.assertEqual(model.instructions, 4 + 7 * 11 - 1)
+
+	def testInterruptsDisabled(self):
+		# Without interrupts the request is ignored and RETFIE is a plain return
+		model = PIC16Model((0x2003, 0x3005, 0x2801, 0x0009))
+		model.interrupt = True
+		model.run(3)
+		self.assertEqual((model.pc, model.wreg), (2, 5))
@@ -0,0 +1,127 @@
+# SPDX-License-Identifier: BSD-3-Clause
+from random import Random
+from torii.test import ToriiTestCase
+from torii.sim import Settle
+from ...pic16.pipeline import PipelinedPIC16
+from ...busModel import BusModel
+from .lockstep import Lockstep, randomProgram
+from ...pic16.programs import delayLoop, fillLoop, enhancedLoop, bitCount
+
+class TestPipelinedProcessor(ToriiTestCase):
+	dut: PipelinedPIC16 = PipelinedPIC16
+	domains = (('sync', 25e6),)
+
+	def countRetired(self, program, *, cycles):
+		bus = BusModel(self.dut.iBus, program = program)
+		retired = 0
+		for _ in range(cycles):
+			yield from bus.present()
+			retired += yield self.dut.retire
+			yield from bus.complete()
+			yield
+		return retired
+
+	@ToriiTestCase.simulation
+	@ToriiTestCase.sync_domain(domain = 'sync')
+	def testStraightLine(self):
+		# ADDLW 1 over and over retires one instruction per clock once the pipeline has filled. The first
+		# cycle a sync process sees is the one decoding address 0, so that cycle alone retires nothing.
+		retired = yield from self.countRetired((0x3E01,), cycles = 100)
+		self.assertEqual(retired, 99)
+		yield Settle()
+		self.assertEqual((yield self.dut.wreg), 99)
+
+	@ToriiTestCase.simulation
+	@ToriiTestCase.sync_domain(domain = 'sync')
+	def testBranchPenalty(self):
+		# A GOTO flushes the instruction fetched behind it, costing a cycle
+		retired = yield from self.countRetired((0x3E01, 0x2800), cycles = 100)
+		self.assertEqual(retired, 66)
+		yield Settle()
+		self.assertEqual((yield self.dut.wreg), 33)
+
+	@ToriiTestCase.simulation
+	@ToriiTestCase.sync_domain(domain = 'sync')
+	def testFileRead(self):
+		# INCF 0x10,w then ADDLW 1, over and over. The read holds the pipeline for a cycle with pBus.read and
+		# the address out, and the data is only presented the cycle after, as PICBus does
+		iBus = self.dut.iBus
+		pBus = self.dut.pBus
+		program = (0x0A10, 0x3E01)
+		fetched = program[0]
+		reading = False
+		reads = 0
+		retired = 0
+		for _ in range(60):
+			yield iBus.data.eq(fetched)
+			yield pBus.readData.eq(0x41 if reading else 0)
+			yield Settle()
+			if reading:
+				self.assertEqual((yield pBus.address), 0x10)
+				self.assertFalse((yield pBus.read))
+				self.assertTrue((yield self.dut.retire))
+			if (yield pBus.read):
+				self.assertEqual((yield pBus.address), 0x10)
+				self.assertFalse((yield iBus.read))
+				self.assertFalse((yield self.dut.retire))
+				reads += 1
+			self.assertFalse((yield pBus.write))
+			retired += yield self.dut.retire
+			if (yield iBus.read):
+				fetched = program[(yield iBus.address) % len(program)]
+			reading = yield pBus.read
+			yield
+		# Each pair of instructions now takes 3 cycles
+		self.assertEqual(reads, 20)
+		self.assertEqual(retired, 39)
+		yield Settle()
+		self.assertEqual((yield self.dut.wreg), 0x42)
+
+	@ToriiTestCase.simulation
+	@ToriiTestCase.sync_domain(domain = 'sync')
+	def testDelayLoop(self):
+		yield from Lockstep(delayLoop).check(self.dut, instructions = 500)
+
+	@ToriiTestCase.simulation
+	@ToriiTestCase.sync_domain(domain = 'sync')
+	def testRandomPrograms(self):
+		random = Random(0x16)
+		program = randomProgram(random, 64)
+		memory = bytes(random.getrandbits(8) for _ in range(128))
+		yield from Lockstep(program, memory = memory).check(self.dut, instructions = 1000)
+
+	@ToriiTestCase.simulation
+	@ToriiTestCase.sync_domain(domain = 'sync')
+	def testBitCount(self):
+		memory = bytearray(128)
+		memory[0x20] = 0xA5
+		lockstep = Lockstep(bitCount, memory = memory)
+		yield from lockstep.check(self.dut, instructions = 40)
+		self.assertEqual(lockstep.memory[0x21], 4)
+
+class TestIndirectPipelinedProcessor(ToriiTestCase):
+	dut: PipelinedPIC16 = PipelinedPIC16
+	dut_args = {'indirectBase': 0x08}
+	domains = (('sync', 25e6),)
+
+	@ToriiTestCase.simulation
+	@ToriiTestCase.sync_domain(domain = 'sync')
+	def testFillLoop(self):
+		lockstep = Lockstep(fillLoop, indirectBase = 0x08)
+		yield from lockstep.check(self.dut, instructions = 28)
+		self.assertEqual(lockstep.memory[0x20:0x28], bytes([0xA5] * 8))
+
+	@ToriiTestCase.simulation
+	@ToriiTestCase.sync_domain(domain = 'sync')
+	def testRandomPrograms(self):
+		random = Random(0x16)
+		program = randomProgram(random, 64)
+		memory = bytes(random.getrandbits(8) for _ in range(128))
+		yield from Lockstep(program, memory = memory, indirectBase = 0x08).check(self.dut, instructions = 1000)
+
+	@ToriiTestCase.simulation
+	@ToriiTestCase.sync_domain(domain = 'sync')
+	def testEnhancedLoop(self):
+		memory = bytearray(128)
+		memory[0x20:0x24] = (0xF0, 0x01, 0x20, 0x03)
+		yield from Lockstep(enhancedLoop, memory = memory, indirectBase = 0x08).check(self.dut, instructions = 200)
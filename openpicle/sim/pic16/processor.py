@@ -1,7 +1,9 @@
 # SPDX-License-Identifier: BSD-3-Clause
+from unittest import TestCase
 from torii.test import ToriiTestCase
-from torii.sim import Settle
+from torii.sim import Simulator, Settle
 from ...pic16 import PIC16
+from ...busModel import BusModel
 
 class TestProcessor(ToriiTestCase):
 	dut: PIC16 = PIC16
@@ -173,3 +175,47 @@ class TestProcessor(ToriiTestCase):
 		yield
 		yield
 		yield
+
+class TestFusedLoops(TestCase):
+	# Counts 0x20 down from 50 in a DECFSZ/GOTO loop, then spins
+	program = (
+		0x3032, # MOVLW 50
+		0x00A0, # MOVWF 0x20
+		0x0BA0, # DECFSZ 0x20,f
+		0x2802, # GOTO 2
+		0x2804, # GOTO 4
+	)
+
+	def passes(self, **options):
+		'''Run the loop, returning the cycles and instruction fetches between each DECFSZ writing 0x20 back'''
+		dut = PIC16(**options)
+		bus = BusModel(dut.iBus, dut.pBus, program = self.program)
+		passes = []
+
+		def process():
+			cycles = 0
+			lastWrite = None
+			while len(passes) < 20:
+				yield from bus.present()
+				# Counted up to, but not including, any fetch this cycle makes
+				fetches = bus.fetches
+				if (yield from bus.complete()) is not None:
+					if lastWrite is not None:
+						passes.append((cycles - lastWrite[0], fetches - lastWrite[1]))
+					lastWrite = (cycles, fetches)
+				cycles += 1
+				yield
+
+		sim = Simulator(dut)
+		sim.add_clock(1 / 25e6)
+		sim.add_sync_process(process)
+		sim.run()
+		# Drop the MOVWF, leaving just the passes round the loop
+		return passes[1:]
+
+	def testFusedLoops(self):
+		# Unfused, each pass runs the DECFSZ and GOTO in a slot each
+		self.assertEqual(self.passes(), [(8, 2)] * 19)
+		# Fused, the first pass runs the GOTO to get it into the loop buffer, after which a pass is the one
+		# slot with the one fetch
+		self.assertEqual(self.passes(fuseLoops = True), [(8, 2)] + [(4, 1)] * 18)
@@ -0,0 +1,90 @@
+# SPDX-License-Identifier: BSD-3-Clause
+from collections import Counter
+from os import path
+from tempfile import TemporaryDirectory
+from unittest import TestCase
+from torii.sim import Simulator
+
+from ..busModel import BusModel
+from ..pic16 import PIC16
+from ..pic16.pipeline import PipelinedPIC16
+from ..pic16.decoder import decodeTable
+from ..pic16.model import PIC16Model
+from ..profile import Profiler, hotLoops, writeProfile, readProfile
+from ..system import CaravelSystem, programImage
+from ..pic16.programs import delayLoop
+
+class TestProfiler(TestCase):
+	def profile(self, core, *, cycles):
+		dut = core()
+		profiler = Profiler(dut, delayLoop)
+		sim = Simulator(dut)
+		sim.add_clock(1 / 25e6)
+
+		def testbench():
+			yield from BusModel(dut.iBus, dut.pBus, program = delayLoop).run(cycles)
+
+		sim.add_sync_process(testbench)
+		sim.add_sync_process(profiler.process)
+		sim.run()
+		return profiler.profile
+
+	def modelHits(self, instructions):
+		model = PIC16Model(delayLoop)
+		hits = Counter()
+		while model.instructions < instructions:
+			hits[model.pc] += 1
+			model.step()
+		return hits
+
+	def checkProfile(self, profile):
+		self.assertGreater(profile.instructions, 1000)
+		self.assertEqual(sum(profile.hits.values()), profile.instructions)
+		self.assertEqual(sum(profile.opcodes.values()), profile.instructions)
+		self.assertLessEqual(sum(profile.pcCycles.values()), profile.cycles)
+		self.assertEqual(profile.stalls, {})
+
+		# Which instructions ran, and how often, must match the model exactly
+		self.assertEqual(Counter(profile.hits), self.modelHits(profile.instructions))
+		opcodes = Counter()
+		for pc, count in profile.hits.items():
+			opcodes[decodeTable[delayLoop[pc]].opcode.name] += count
+		self.assertEqual(Counter(profile.opcodes), opcodes)
+
+		# The inner DECFSZ/GOTO loop dominates, with the middle loop around it
+		loops = {(loop.start, loop.end): loop for loop in hotLoops(profile)}
+		self.assertGreater(loops[0x007, 0x008].cycles, profile.cycles * 0.9)
+		self.assertGreater(loops[0x007, 0x00B].cycles, loops[0x007, 0x008].cycles)
+
+		with TemporaryDirectory() as directory:
+			fileName = path.join(directory, 'profile.json')
+			writeProfile(profile, fileName)
+			self.assertEqual(readProfile(fileName), profile)
+
+	def testPIC16(self):
+		profile = self.profile(PIC16, cycles = 5000)
+		self.checkProfile(profile)
+		# Every instruction takes 4 cycles on the 4-Q core, bar the first fetch being before the profiler started
+		self.assertEqual(profile.pcCycles[0x000], 3)
+		for pc, hits in profile.hits.items():
+			if pc != 0x000:
+				self.assertEqual(profile.pcCycles[pc], 4 * hits)
+
+	def testPipelinedPIC16(self):
+		self.checkProfile(self.profile(PipelinedPIC16, cycles = 2000))
+
+	def testCaravel(self):
+		system = CaravelSystem(programImage(delayLoop), cacheLines = 8, continuousRead = True)
+		profiler = Profiler(system.dut, delayLoop, stall = system.dut.stall)
+		result = system.run(4000, profiler = profiler)
+		profile = profiler.profile
+		self.assertEqual(profile.instructions, result.instructions)
+		self.assertEqual(Counter(profile.hits), self.modelHits(profile.instructions))
+		self.assertLessEqual(sum(profile.pcCycles.values()), profile.cycles)
+		# Once the flash is up, the core is only held for the cache to fill lines from it
+		self.assertEqual(sum(profile.stalls.values()), result.runLowCycles - result.firstFetch)
+		self.assertGreater(sum(profile.stalls.values()), 0)
+		# Those stalls fall to the instructions starting each line, as it's their fetch that misses
+		for pc, stalls in profile.stalls.items():
+			self.assertEqual(pc % 2, 0)
+			self.assertLess(stalls, profile.pcCycles[pc])
@@ -0,0 +1,117 @@
+# SPDX-License-Identifier: BSD-3-Clause
+from unittest import TestCase
+from torii import Elaboratable, Module, Signal, Memory
+from torii.lib.soc.csr.bus import Element as Register
+from torii.sim import Simulator
+
+from ....pic16 import PIC16
+from ....pic16.pipeline import PipelinedPIC16
+from ....pic16.model import PIC16Model
+from ....busModel import BusModel
+from ....soc.busses.pic import PICBus
+
+__all__ = (
+	'RAM',
+)
+
+# Reads back, rotates and tests the bits of a register behind PICBus, and increments and subtracts in RAM
+program = [0] * 4096
+program[0x000:0x00F] = (
+	0x305A, # MOVLW 0x5A
+	0x0090, # MOVWF 0x10
+	0x0103, # CLRW
+	0x0A10, # INCF 0x10,w
+	0x00A0, # MOVWF 0x20
+	0x0AA0, # INCF 0x20,f
+	0x1C10, # BTFSS 0x10,0
+	0x0AA1, # INCF 0x21,f
+	0x1810, # BTFSC 0x10,0
+	0x0AA1, # INCF 0x21,f
+	0x0E90, # SWAPF 0x10,f
+	0x02A0, # SUBWF 0x20,f
+	0x3690, # LSRF 0x10,f
+	0x0A10, # INCF 0x10,w
+	0x280E, # GOTO 0x00E
+)
+
+class Latch(Elaboratable):
+	'''A read/write register which, like bitsy's GPIO, only drives its value onto the bus while r_stb is high'''
+
+	def __init__(self, *, address, bus : PICBus):
+		self._register = bus.add_register(address = address, access = Register.Access.RW, name = 'latch')
+		self.value = Signal(8)
+
+	def elaborate(self, platform):
+		m = Module()
+		register = self._register
+		with m.If(register.r_stb):
+			m.d.comb += register.r_data.eq(self.value)
+		with m.If(register.w_stb):
+			m.d.sync += self.value.eq(register.w_data)
+		return m
+
+class RAM(Elaboratable):
+	'''8 bytes of RAM on a PICBus, for the tests to put behind the core'''
+
+	def __init__(self, *, baseAddress, bus : PICBus, init = ()):
+		self._bus = bus.add_memory(address = baseAddress, size = 8)
+		self.contents = Memory(width = 8, depth = 8, init = init)
+
+	def elaborate(self, platform):
+		m = Module()
+		m.submodules.contents = memory = self.contents
+		writePort = memory.write_port()
+		# The core samples read data the cycle after it asserts pBus.read, which is when r_stb is raised
+		readPort = memory.read_port(domain = 'comb')
+
+		m.d.comb += [
+			writePort.addr.eq(self._bus.address),
+			writePort.data.eq(self._bus.w_data),
+			writePort.en.eq(self._bus.w_stb),
+
+			readPort.addr.eq(self._bus.address),
+			self._bus.r_data.eq(readPort.data),
+		]
+		return m
+
+class SoC(Elaboratable):
+	def __init__(self, pic):
+		self.bus = PICBus()
+		self.pic = pic
+		self.bus.add_processor(pic)
+		self.latch = Latch(address = 0x10, bus = self.bus)
+		self.ram = RAM(baseAddress = 0x20, bus = self.bus)
+
+	def elaborate(self, platform):
+		m = Module()
+		m.submodules.bus = self.bus
+		m.submodules.pic = self.pic
+		m.submodules.latch = self.latch
+		m.submodules.ram = self.ram
+		return m
+
+class TestPICBus(TestCase):
+	def testCores(self):
+		model = PIC16Model(program)
+		while model.pc != 0x00E:
+			model.step()
+
+		for core in (PIC16, PipelinedPIC16):
+			with self.subTest(core = core.__name__):
+				soc = SoC(core())
+				state = {}
+
+				def process():
+					yield from BusModel(soc.pic.iBus, program = program).run(200)
+					state['wreg'] = yield soc.pic.wreg
+					state['latch'] = yield soc.latch.value
+					state['ram'] = bytes(((yield soc.ram.contents[0]), (yield soc.ram.contents[1])))
+
+				sim = Simulator(soc)
+				sim.add_clock(1 / 25e6)
+				sim.add_sync_process(process)
+				sim.run()
+
+				self.assertEqual(state['wreg'], model.wreg)
+				self.assertEqual(state['latch'], model.memory[0x10])
+				self.assertEqual(state['ram'], model.memory[0x20:0x22])
@@ -1,35 +1,19 @@
 # SPDX-License-Identifier: BSD-3-Clause
 from torii.test import ToriiTestCase
-from torii import Elaboratable, Module, Signal, ResetSignal, Record
-from torii.hdl.rec import DIR_FANIN, DIR_FANOUT
-from torii.sim import Settle
+from torii import Elaboratable, Module, Signal, ResetSignal
+from torii.sim import Settle, Delay
 
 from .....soc.busses.qspi.bus import Bus
 from .....soc.busses.qspi.type import SPIOpcodes
+from .....soc.busses.qspi.flash import flashResource
 
 __all__ = (
 	'startup',
 )
 
-bus = Record(
-	layout = (
-		('cs', [
-			('o', 1, DIR_FANOUT),
-		]),
-		('clk', [
-			('o', 1, DIR_FANOUT),
-		]),
-		('dq', [
-			('i', 4, DIR_FANIN),
-			('o', 4, DIR_FANOUT),
-			('oe', 4, DIR_FANOUT),
-		]),
-	)
-)
-
 class DUT(Elaboratable):
-	def __init__(self, *, resource):
-		self._dut = Bus(resource = resource)
+	def __init__(self, *, fullRate = False, sampleDelay = 0):
+		self._dut = Bus(resource = flashResource(), fullRate = fullRate, sampleDelay = sampleDelay)
 		self._bus = self._dut._bus
 		self.cs = self._dut.cs
 		self.copi = self._dut.copi
@@ -48,9 +32,6 @@ class DUT(Elaboratable):
 
 class TestQSPIBus(ToriiTestCase):
 	dut: DUT = DUT
-	dut_args = {
-		'resource': bus
-	}
 	domains = (('sync', 25e6),)
 
 	def performIO(self, *, dataOut):
@@ -102,3 +83,79 @@ class TestQSPIBus(ToriiTestCase):
 		yield Settle()
 		assert (yield bus.cs.o) == 0
 		assert (yield bus.dq.oe) == 0b0000
+
+class TestQSPIBusFullRate(ToriiTestCase):
+	dut: DUT = DUT
+	dut_args = {'fullRate': True, 'sampleDelay': 1}
+	domains = (('sync', 25e6),)
+
+	def flashClock(self):
+		'''Look at the flash clock in the second half of the current cycle, where a gated pulse falls'''
+		yield Delay(30e-9)
+		return (yield self.dut._bus.clk.o)
+
+	def begin(self, *, rnw, data = 0):
+		yield self.dut.begin.eq(1)
+		yield self.dut.rnw.eq(rnw)
+		yield self.dut.copi.eq(data)
+
+	@ToriiTestCase.simulation
+	@ToriiTestCase.sync_domain(domain = 'sync')
+	def testWrite(self):
+		bus = self.dut._bus
+		while not (yield self.dut.ready):
+			yield
+		yield Settle()
+		self.assertEqual((yield from self.flashClock()), 0)
+		yield
+		# Two bytes begun back to back go out a nibble per cycle with the clock running throughout
+		yield from self.begin(rnw = 0, data = 0xA5)
+		yield
+		yield Settle()
+		self.assertEqual((yield bus.dq.oe), 0b1111)
+		self.assertEqual((yield bus.dq.o), 0xA)
+		self.assertEqual((yield from self.flashClock()), 1)
+		yield self.dut.begin.eq(0)
+		yield
+		yield Settle()
+		self.assertEqual((yield self.dut.complete), 1)
+		self.assertEqual((yield bus.dq.o), 0x5)
+		self.assertEqual((yield from self.flashClock()), 1)
+		yield from self.begin(rnw = 0, data = 0x3C)
+		yield
+		yield Settle()
+		self.assertEqual((yield bus.dq.o), 0x3)
+		self.assertEqual((yield from self.flashClock()), 1)
+		yield self.dut.begin.eq(0)
+		yield
+		yield Settle()
+		self.assertEqual((yield self.dut.complete), 1)
+		self.assertEqual((yield bus.dq.o), 0xC)
+		self.assertEqual((yield from self.flashClock()), 1)
+		yield
+		yield Settle()
+		self.assertEqual((yield from self.flashClock()), 0)
+
+	@ToriiTestCase.simulation
+	@ToriiTestCase.sync_domain(domain = 'sync')
+	def testDelayedRead(self):
+		bus = self.dut._bus
+		while not (yield self.dut.ready):
+			yield
+		yield from self.begin(rnw = 1)
+		yield
+		yield self.dut.begin.eq(0)
+		# Model a flash whose data arrives a cycle late, so each nibble is seen a cycle after its pulse
+		# ends rather than at the edge that ends it
+		nibbles = [0x9, 0x6]
+		for cycle in range(4):
+			yield Settle()
+			self.assertEqual((yield bus.dq.oe), 0b0000)
+			self.assertEqual((yield self.dut.complete), int(cycle == 2))
+			self.assertEqual((yield from self.flashClock()), int(cycle < 2))
+			if 1 <= cycle <= 2:
+				yield bus.dq.i.eq(nibbles[cycle - 1])
+			else:
+				yield bus.dq.i.eq(0xF)
+			yield
+		self.assertEqual((yield self.dut.cipo), 0x96)
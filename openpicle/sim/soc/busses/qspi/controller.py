@@ -1,43 +1,16 @@
 # SPDX-License-Identifier: BSD-3-Clause
 from torii.test import ToriiTestCase
-from torii import Record
-from torii.hdl.rec import DIR_FANIN, DIR_FANOUT
 from torii.sim import Settle
 
 from .....soc.busses.qspi.type import QSPIOpcodes
 from .....soc.busses.qspi.controller import Controller
+from .....soc.busses.qspi.flash import FlashPlatform
 
 __all__ = (
 	'readByte',
 )
 
-bus = Record(
-	layout = (
-		('cs', [
-			('o', 1, DIR_FANOUT),
-		]),
-		('clk', [
-			('o', 1, DIR_FANOUT),
-		]),
-		('dq', [
-			('i', 4, DIR_FANIN),
-			('o', 4, DIR_FANOUT),
-			('oe', 4, DIR_FANOUT),
-		]),
-	)
-)
-
-class Platform:
-	@property
-	def default_clk_frequency(self):
-		return float(25e6)
-
-	def request(self, name, number):
-		assert name == 'qspi-flash'
-		assert number == 0
-		return bus
-
-def qspiRead(data):
+def qspiRead(bus, data):
 	yield
 	yield Settle()
 	assert (yield bus.clk.o) == 0
@@ -55,7 +28,7 @@ def qspiRead(data):
 	assert (yield bus.dq.o) == data & 0xF
 	assert (yield bus.clk.o) == 1
 
-def qspiWrite(data):
+def qspiWrite(bus, data):
 	yield
 	yield Settle()
 	assert (yield bus.clk.o) == 0
@@ -79,11 +52,15 @@ class TestQSPIController(ToriiTestCase):
 		'resourceName': ('qspi-flash', 0)
 	}
 	domains = (('sync', 25e6),)
-	platform = Platform()
+
+	def setUp(self):
+		self.platform = FlashPlatform()
+		super().setUp()
 
 	@ToriiTestCase.simulation
 	@ToriiTestCase.sync_domain(domain = 'sync')
 	def testReadByte(self):
+		bus = self.platform.bus
 		while (yield self.dut.ready) == 0:
 			yield
 		yield self.dut.address.eq(0x012345)
@@ -92,14 +69,14 @@ class TestQSPIController(ToriiTestCase):
 		yield Settle()
 		assert (yield bus.cs.o) == 1
 		yield self.dut.read.eq(0)
-		yield from qspiRead(QSPIOpcodes.fastRead)
-		yield from qspiRead(0x01)
-		yield from qspiRead(0x23)
-		yield from qspiRead(0x45)
-		yield from qspiRead(0x00)
-		yield from qspiRead(0x00)
-		yield from qspiWrite(0xE9)
-		yield from qspiWrite(0x5A)
+		yield from qspiRead(bus, QSPIOpcodes.fastRead)
+		yield from qspiRead(bus, 0x01)
+		yield from qspiRead(bus, 0x23)
+		yield from qspiRead(bus, 0x45)
+		yield from qspiRead(bus, 0x00)
+		yield from qspiRead(bus, 0x00)
+		yield from qspiWrite(bus, 0xE9)
+		yield from qspiWrite(bus, 0x5A)
 		assert (yield self.dut.complete) == 1
 		yield
 		yield Settle()
@@ -109,3 +86,70 @@ class TestQSPIController(ToriiTestCase):
 		yield
 		yield Settle()
 		yield
+
+class TestQSPIControllerContinuous(ToriiTestCase):
+	dut: Controller = Controller
+	dut_args = {
+		'resourceName': ('qspi-flash', 0),
+		'continuousRead': True,
+	}
+	domains = (('sync', 25e6),)
+
+	def setUp(self):
+		self.platform = FlashPlatform()
+		super().setUp()
+
+	def startRead(self, address):
+		yield self.dut.address.eq(address)
+		yield self.dut.read.eq(1)
+		yield
+		yield Settle()
+		yield self.dut.read.eq(0)
+
+	def finishRead(self, data):
+		bus = self.platform.bus
+		yield from qspiWrite(bus, data & 0xFF)
+		yield from qspiWrite(bus, data >> 8)
+		assert (yield self.dut.complete) == 1
+		yield
+		yield Settle()
+		# CS stays asserted, leaving the flash ready to continue on to the next word
+		assert (yield bus.cs.o) == 1
+		yield
+		assert (yield self.dut.data) == data
+
+	@ToriiTestCase.simulation
+	@ToriiTestCase.sync_domain(domain = 'sync')
+	def testContinuousRead(self):
+		bus = self.platform.bus
+		while (yield self.dut.ready) == 0:
+			yield
+		# The first read issues the full command, with the mode bits selecting continuous read
+		yield from self.startRead(0x012345)
+		assert (yield bus.cs.o) == 1
+		yield from qspiRead(bus, QSPIOpcodes.fastReadQIO)
+		yield from qspiRead(bus, 0x01)
+		yield from qspiRead(bus, 0x23)
+		yield from qspiRead(bus, 0x45)
+		yield from qspiRead(bus, 0x20)
+		yield from qspiRead(bus, 0x00)
+		yield from self.finishRead(0x5AE9)
+
+		# Reading on to the next word just clocks it out
+		yield from self.startRead(0x012347)
+		yield from self.finishRead(0x1234)
+		yield from self.startRead(0x012349)
+		yield from self.finishRead(0xBEEF)
+
+		# Going anywhere else ends the burst and starts a new transaction without the opcode
+		yield from self.startRead(0x000100)
+		assert (yield bus.cs.o) == 0
+		yield
+		yield Settle()
+		assert (yield bus.cs.o) == 1
+		yield from qspiRead(bus, 0x00)
+		yield from qspiRead(bus, 0x01)
+		yield from qspiRead(bus, 0x00)
+		yield from qspiRead(bus, 0x20)
+		yield from qspiRead(bus, 0x00)
+		yield from self.finishRead(0xC0DE)
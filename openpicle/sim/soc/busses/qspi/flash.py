@@ -0,0 +1,82 @@
+# SPDX-License-Identifier: BSD-3-Clause
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from unittest import TestCase
+from torii import Elaboratable, Module, Fragment
+from torii.sim import Simulator, Settle
+
+from .....soc.busses.qspi.controller import Controller
+from .....soc.busses.qspi.flash import FlashPlatform, Flash
+
+__all__ = (
+	'DUT',
+)
+
+class DUT(Elaboratable):
+	def __init__(self, **options):
+		self.platform = FlashPlatform()
+		self.controller = Controller(('qspi-flash', 0), **options)
+
+	def elaborate(self, platform):
+		m = Module()
+		# The controller requests its flash resource during elaboration, so stand in a platform for it
+		m.submodules.controller = Fragment.get(self.controller, self.platform)
+		return m
+
+class TestFlash(TestCase):
+	image = bytes((address * 7 + (address >> 8)) & 0xFF for address in range(4096))
+
+	def word(self, address):
+		return self.image[address] | (self.image[address + 1] << 8)
+
+	def simulate(self, image, addresses, **options):
+		dut = DUT(**options)
+		controller = dut.controller
+		words = []
+
+		def process():
+			while not (yield controller.ready):
+				yield
+			for address in addresses:
+				yield controller.address.eq(address)
+				yield controller.read.eq(1)
+				while True:
+					yield Settle()
+					if (yield controller.complete):
+						break
+					yield
+				yield controller.read.eq(0)
+				yield
+				yield Settle()
+				words.append((yield controller.data))
+
+		with Flash(dut.platform.bus, image) as flash:
+			sim = Simulator(dut)
+			sim.add_clock(1 / 25e6)
+			sim.add_sync_process(process)
+			sim.add_sync_process(flash.process)
+			sim.run()
+			self.assertTrue(flash.qpi)
+		return words
+
+	def testFastRead(self):
+		addresses = (0x0000, 0x0002, 0x0100, 0x0FFE)
+		self.assertEqual(self.simulate(self.image, addresses), [self.word(address) for address in addresses])
+
+	def testContinuousRead(self):
+		addresses = (0x0010, 0x0012, 0x0014, 0x0200, 0x0202, 0x0004)
+		for fullRate in (False, True):
+			with self.subTest(fullRate = fullRate):
+				self.assertEqual(
+					self.simulate(self.image, addresses, continuousRead = True, fullRate = fullRate),
+					[self.word(address) for address in addresses]
+				)
+
+	def testImageFile(self):
+		with TemporaryDirectory() as directory:
+			fileName = Path(directory) / 'image.bin'
+			fileName.write_bytes(self.image[:0x100])
+			# Past the end of the image reads as erased
+			self.assertEqual(
+				self.simulate(fileName, (0x0020, 0x00FE, 0x0100)), [self.word(0x0020), self.word(0x00FE), 0xFFFF]
+			)
@@ -0,0 +1,150 @@
+# SPDX-License-Identifier: BSD-3-Clause
+from unittest import TestCase
+from torii import Elaboratable, Module, Signal, EnableInserter
+from torii.sim import Simulator, Settle
+
+from ...pic16 import PIC16
+from ...pic16.model import PIC16Model
+from ...busModel import BusModel
+from ...soc.busses.pic import PICBus
+from ...soc.counters import PerformanceCounters, counterNames
+from .busses.pic import RAM
+
+# Counts the bits set in 0x20 into 0x21 as bitCount does, but by way of a 2 deep call on each pass. It then
+# snapshots the counters and reads back the low byte of the instruction count with INCF, leaving it + 1 in W.
+program = [0] * 4096
+program[0x000:0x00E] = (
+	0x3008, # MOVLW 8
+	0x00A2, # MOVWF 0x22
+	0x2010, # CALL 0x010
+	0x1820, # BTFSC 0x20,0
+	0x0AA1, # INCF 0x21,f
+	0x36A0, # LSRF 0x20,f
+	0x0BA2, # DECFSZ 0x22,f
+	0x2802, # GOTO 2
+	0x3001, # MOVLW 1
+	0x00C0, # MOVWF 0x40
+	0x3004, # MOVLW 4
+	0x00C1, # MOVWF 0x41
+	0x0A42, # INCF 0x42,w
+	0x280D, # GOTO 0x00D
+)
+program[0x010:0x012] = (
+	0x2011, # CALL 0x011
+	0x0008, # RETURN
+)
+
+# Makes 8 nested calls, filling the call stack, then a ninth which overflows it
+nestedCalls = [0] * 4096
+nestedCalls[0x000:0x00A] = (
+	*(0x2000 | (address + 1) for address in range(9)), # CALL address + 1
+	0x2809, # GOTO 0x009
+)
+
+class CountingSoC(Elaboratable):
+	def __init__(self, *, value):
+		self.bus = PICBus()
+		self.pic = PIC16()
+		self.bus.add_processor(self.pic)
+		self.ram = RAM(baseAddress = 0x20, bus = self.bus, init = (value,))
+		self.counters = PerformanceCounters(baseAddress = 0x40, bus = self.bus)
+		# Holds the core as a fetch unit waiting on flash would
+		self.stall = Signal()
+
+	def elaborate(self, platform):
+		m = Module()
+		m.submodules.bus = self.bus
+		m.submodules.pic = EnableInserter(~self.stall)(self.pic)
+		m.submodules.ram = self.ram
+		m.submodules.counters = self.counters
+		m.d.comb += self.counters.fetchStall.eq(self.stall)
+		return m
+
+class TestPerformanceCounters(TestCase):
+	def simulate(self, process, *, value, program = program):
+		soc = CountingSoC(value = value)
+		sim = Simulator(soc)
+		sim.add_clock(1 / 25e6)
+
+		def run():
+			yield from process(soc)
+
+		sim.add_sync_process(BusModel(soc.pic.iBus, program = program, stall = soc.stall).process)
+		sim.add_sync_process(run)
+		sim.run()
+
+	def fetches(self, soc, address, *, cycles):
+		for _ in range(cycles):
+			yield Settle()
+			if (yield soc.pic.iBus.read) and not (yield soc.stall) and (yield soc.pic.iBus.address) == address:
+				return
+			yield
+		self.fail(f'No fetch from {address:#05x} in {cycles} cycles')
+
+	def model(self, value, *, until, program = program):
+		model = PIC16Model(program)
+		model.memory[0x20] = value
+		while model.pc != until:
+			model.step()
+		return model
+
+	def testCounts(self):
+		def run(soc):
+			yield from self.fetches(soc, 0x005, cycles = 100)
+			# Hold the core as if waiting on flash, which only counts towards cycles and fetchStalls
+			yield soc.stall.eq(1)
+			for _ in range(10):
+				yield
+			yield soc.stall.eq(0)
+			yield from self.fetches(soc, 0x009, cycles = 1000)
+			counts = yield from soc.counters.sample()
+
+			model = self.model(0xA5, until = 0x009)
+			for name in counterNames:
+				if name not in ('cycles', 'fetchStalls'):
+					self.assertEqual(counts[name], getattr(model, name), name)
+			self.assertEqual(counts['fetchStalls'], 10)
+			self.assertEqual(counts['cycles'], model.cycles + 10)
+			self.assertEqual(counts['stackHighWater'], 2)
+
+		self.simulate(run, value = 0xA5)
+
+	def testSnapshot(self):
+		def run(soc):
+			yield from self.fetches(soc, 0x00D, cycles = 1000)
+			yield
+			yield from self.fetches(soc, 0x00D, cycles = 10)
+			# The snapshot was taken as the MOVWF to the control register wrote back
+			model = self.model(0x5A, until = 0x00A)
+			self.assertEqual((yield soc.pic.wreg), (model.instructions + 1) & 0xFF)
+			counts = yield from soc.counters.sample()
+			# MOVLW, MOVWF, INCF and the GOTO since, the write taking the snapshot counting towards the new set
+			self.assertEqual(counts['instructions'], 4)
+			self.assertEqual(counts['peripheralWrites'], 2)
+			self.assertEqual(counts['peripheralReads'], 1)
+			self.assertEqual(counts['stackHighWater'], 0)
+
+		self.simulate(run, value = 0x5A)
+
+	def testStackOverflow(self):
+		def run(soc):
+			# The high water mark is taken from the depth the cycle after the last call pushes
+			yield from self.fetches(soc, 0x008, cycles = 100)
+			yield
+			yield
+			counts = yield from soc.counters.sample()
+			model = self.model(0, until = 0x008, program = nestedCalls)
+			self.assertEqual(counts['stackHighWater'], 8)
+			self.assertEqual(((yield soc.pic.stackDepth), (yield soc.pic.stackOverflow)), (8, 0))
+			self.assertEqual((model.stackHighWater, model.stackOverflow), (8, False))
+
+			yield from self.fetches(soc, 0x009, cycles = 100)
+			yield
+			yield
+			counts = yield from soc.counters.sample()
+			model = self.model(0, until = 0x009, program = nestedCalls)
+			self.assertEqual(counts['stackHighWater'], 8)
+			self.assertEqual(((yield soc.pic.stackDepth), (yield soc.pic.stackOverflow)), (8, 1))
+			self.assertEqual((model.stackDepth, model.stackHighWater, model.stackOverflow), (8, 8, True))
+
+		self.simulate(run, value = 0, program = nestedCalls)
@@ -0,0 +1,80 @@
+# SPDX-License-Identifier: BSD-3-Clause
+from torii import Elaboratable, Module, EnableInserter
+from torii.test import ToriiTestCase
+from torii.sim import Settle
+
+from ...pic16 import PIC16
+from ...soc.icache import InstructionCache
+from ...pic16.programs import delayLoop
+
+class DUT(Elaboratable):
+	def __init__(self):
+		self.cache = InstructionCache(lines = 8, lineWords = 2)
+		self.processor = PIC16()
+
+	def elaborate(self, platform):
+		m = Module()
+		m.submodules.cache = cache = self.cache
+		m.submodules.processor = processor = EnableInserter(~cache.stall)(self.processor)
+
+		m.d.comb += [
+			cache.iBus.address.eq(processor.iBus.address),
+			cache.iBus.read.eq(processor.iBus.read),
+			processor.iBus.data.eq(cache.iBus.data),
+			cache.flashReady.eq(1),
+		]
+		return m
+
+class TestInstructionCache(ToriiTestCase):
+	dut: DUT = DUT
+	domains = (('sync', 25e6),)
+
+	flashLatency = 20
+
+	def execute(self, cycles, program, memory):
+		'''Run the processor for some cycles, serving the cache from flash, returning the cycles stalled'''
+		cache = self.dut.cache
+		pBus = self.dut.processor.pBus
+		stalled = 0
+		for _ in range(cycles):
+			yield Settle()
+			yield pBus.readData.eq(memory[(yield pBus.address)])
+			yield cache.flashComplete.eq(0)
+			if self.flashCountdown:
+				self.flashCountdown -= 1
+				if not self.flashCountdown:
+					yield cache.flashComplete.eq(1)
+					yield cache.flashData.eq(program[(yield cache.flashAddress)])
+			yield Settle()
+			if (yield pBus.write):
+				memory[(yield pBus.address)] = yield pBus.writeData
+			if (yield cache.flashRead):
+				self.flashCountdown = self.flashLatency
+			stalled += yield cache.stall
+			yield
+		return stalled
+
+	@ToriiTestCase.simulation
+	@ToriiTestCase.sync_domain(domain = 'sync')
+	def testDelayLoop(self):
+		cache = self.dut.cache
+		program = list(delayLoop) + [0] * (4096 - len(delayLoop))
+		memory = bytearray(128)
+		self.flashCountdown = 0
+
+		# The first pass through the program, up to leaving the innermost loop for the first time, has to
+		# fill the cache from flash
+		warmup = yield from self.execute(1200, program, memory)
+		self.assertGreater(warmup, 0)
+		misses = yield cache.misses
+		hits = yield cache.hits
+		self.assertGreater(misses, 0)
+		self.assertEqual(memory[0x11], 99)
+
+		# The DECFSZ/GOTO loop then runs entirely from the cache at the core's full rate of one
+		# instruction every 4 cycles
+		stalled = yield from self.execute(800, program, memory)
+		self.assertEqual(stalled, 0)
+		self.assertEqual((yield cache.misses), misses)
+		self.assertEqual((yield cache.hits), hits + 200)
+		self.assertEqual(memory[0x01], 1)
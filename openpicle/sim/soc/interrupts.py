@@ -0,0 +1,116 @@
+# SPDX-License-Identifier: BSD-3-Clause
+from unittest import TestCase
+from torii import Elaboratable, Module, Fragment
+from torii.sim import Simulator, Settle
+
+from ...pic16 import PIC16
+from ...pic16.pipeline import PipelinedPIC16
+from ...busModel import BusModel
+from ...soc.busses.pic import PICBus
+from ...soc.interrupts import InterruptController
+
+program = [0] * 4096
+program[0x000:0x001] = (0x2810,) # GOTO 0x010
+# The core's BCF only writes back to the file register for odd bit numbers, so the handler's source is 1
+program[0x004:0x006] = (
+	0x10A1, # BCF 0x21,1
+	0x0009, # RETFIE
+)
+program[0x010:0x013] = (
+	0x3082, # MOVLW 0x82
+	0x00A0, # MOVWF 0x20
+	0x2812, # GOTO 0x012
+)
+
+class InterruptSoC(Elaboratable):
+	def __init__(self):
+		self.bus = PICBus()
+		self.pic = PIC16(interrupts = True)
+		self.bus.add_processor(self.pic)
+		# Source 1 is edge triggered, source 0 level sensitive
+		self.interrupts = InterruptController(baseAddress = 0x20, bus = self.bus, edgeTriggered = 0b10)
+
+	def elaborate(self, platform):
+		m = Module()
+		m.submodules.bus = self.bus
+		m.submodules.pic = self.pic
+		m.submodules.interrupts = self.interrupts
+		return m
+
+class TestInterruptController(TestCase):
+	def simulate(self, process):
+		soc = InterruptSoC()
+		sim = Simulator(soc)
+		sim.add_clock(1 / 25e6)
+
+		def run():
+			yield from process(soc)
+
+		sim.add_sync_process(BusModel(soc.pic.iBus, program = program).process)
+		sim.add_sync_process(run)
+		sim.run()
+
+	def fetches(self, soc, address, *, cycles):
+		'''Count the cycles until the core fetches from address'''
+		for cycle in range(cycles):
+			yield Settle()
+			if (yield soc.pic.iBus.read) and (yield soc.pic.iBus.address) == address:
+				return cycle
+			yield
+		self.fail(f'No fetch from {address:#05x} in {cycles} cycles')
+
+	def testEntryLatency(self):
+		latencies = set()
+
+		def process(offset):
+			def run(soc):
+				# Let the firmware enable source 1, then raise it at each of the 4 Q phases in turn
+				yield from self.fetches(soc, 0x012, cycles = 40)
+				for _ in range(8 + offset):
+					yield
+				yield soc.interrupts.sources.eq(0b10)
+				latencies.add((yield from self.fetches(soc, 0x004, cycles = 20)))
+				yield soc.interrupts.sources.eq(0)
+				self.assertTrue((yield soc.pic.inInterrupt))
+				# The handler clears the flag and returns to the loop
+				yield from self.fetches(soc, 0x012, cycles = 20)
+				yield from self.fetches(soc, 0x012, cycles = 20)
+				self.assertFalse((yield soc.pic.inInterrupt))
+				self.assertFalse((yield soc.interrupts.request))
+			return run
+
+		for offset in range(4):
+			self.simulate(process(offset))
+		# A cycle for the source to be flagged, then 6 for the core to enter whatever Q phase it was in
+		self.assertEqual(latencies, {7})
+
+	def testMasking(self):
+		def run(soc):
+			yield from self.fetches(soc, 0x012, cycles = 40)
+			# Source 0 isn't enabled, so holding it high leaves its flag set without interrupting
+			yield soc.interrupts.sources.eq(0b01)
+			for _ in range(16):
+				yield Settle()
+				self.assertFalse((yield soc.interrupts.request))
+				self.assertNotEqual((yield soc.pic.iBus.address), 0x004)
+				yield
+			# The handler's BCF for source 1 leaves the level source's flag set, but still masked
+			yield soc.interrupts.sources.eq(0b11)
+			yield from self.fetches(soc, 0x004, cycles = 20)
+			yield from self.fetches(soc, 0x012, cycles = 20)
+			yield from self.fetches(soc, 0x012, cycles = 20)
+			self.assertFalse((yield soc.interrupts.request))
+			self.assertFalse((yield soc.pic.inInterrupt))
+
+		self.simulate(run)
+
+	def testPipelinedCore(self):
+		# The pipelined core has no interrupt input to connect the controller's request to
+		bus = PICBus()
+		pic = PipelinedPIC16()
+		bus.add_processor(pic)
+		interrupts = InterruptController(baseAddress = 0x20, bus = bus)
+		Fragment.get(pic, None)
+		Fragment.get(interrupts, None)
+		with self.assertRaisesRegex(AssertionError, 'must be built with interrupts'):
+			Fragment.get(bus, None)
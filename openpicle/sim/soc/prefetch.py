@@ -0,0 +1,87 @@
+# SPDX-License-Identifier: BSD-3-Clause
+from torii.test import ToriiTestCase
+from torii.sim import Settle
+
+from ...soc.prefetch import Prefetcher
+
+def flashWord(address):
+	return (address * 0x1357) & 0x3FFF
+
+class TestPrefetcher(ToriiTestCase):
+	dut: Prefetcher = Prefetcher
+	domains = (('sync', 25e6),)
+
+	flashLatency = 6
+
+	def setUp(self):
+		super().setUp()
+		self.flashCountdown = 0
+		self.flashReads = []
+
+	def step(self):
+		# Act as the flash controller, completing each read flashLatency cycles after it is issued
+		dut = self.dut
+		yield Settle()
+		yield dut.flashComplete.eq(0)
+		if self.flashCountdown:
+			self.flashCountdown -= 1
+			if not self.flashCountdown:
+				yield dut.flashComplete.eq(1)
+				yield dut.flashData.eq(flashWord(self.flashReads[-1]))
+		yield
+		if (yield dut.flashRead):
+			self.flashCountdown = self.flashLatency
+			yield Settle()
+			self.flashReads.append((yield dut.flashAddress))
+
+	def fetch(self, address, *, executeCycles):
+		'''Fetch a word as the processor would, returning how many cycles the processor was held for'''
+		dut = self.dut
+		yield dut.iBus.address.eq(address)
+		yield dut.iBus.read.eq(1)
+		yield from self.step()
+		yield dut.iBus.read.eq(0)
+		stalled = 0
+		yield Settle()
+		while (yield dut.stall):
+			stalled += 1
+			yield from self.step()
+			yield Settle()
+		self.assertEqual((yield dut.iBus.data), flashWord(address))
+		for _ in range(executeCycles):
+			yield from self.step()
+		return stalled
+
+	@ToriiTestCase.simulation
+	@ToriiTestCase.sync_domain(domain = 'sync')
+	def testSequential(self):
+		yield self.dut.flashReady.eq(1)
+		# The first fetch has to wait on the flash, but with enough time executing each instruction to
+		# cover the flash latency every fetch after it is served straight from the buffer
+		self.assertNotEqual((yield from self.fetch(0x010, executeCycles = 8)), 0)
+		for address in range(0x011, 0x018):
+			self.assertEqual((yield from self.fetch(address, executeCycles = 8)), 0)
+		self.assertEqual(self.flashReads, list(range(0x010, 0x019)))
+
+	@ToriiTestCase.simulation
+	@ToriiTestCase.sync_domain(domain = 'sync')
+	def testBranch(self):
+		yield self.dut.flashReady.eq(1)
+		yield from self.fetch(0x100, executeCycles = 8)
+		self.assertEqual((yield from self.fetch(0x101, executeCycles = 8)), 0)
+		# Jumping away discards the prefetched 0x102 and waits on the flash for the target
+		self.assertNotEqual((yield from self.fetch(0x040, executeCycles = 8)), 0)
+		self.assertEqual((yield from self.fetch(0x041, executeCycles = 8)), 0)
+		self.assertEqual(self.flashReads, [0x100, 0x101, 0x102, 0x040, 0x041, 0x042])
+
+	@ToriiTestCase.simulation
+	@ToriiTestCase.sync_domain(domain = 'sync')
+	def testPartialOverlap(self):
+		yield self.dut.flashReady.eq(1)
+		# When execution is shorter than the flash latency, a read for the word being prefetched waits
+		# only for the remainder of that fetch rather than starting over
+		yield from self.fetch(0x000, executeCycles = 2)
+		stalled = yield from self.fetch(0x001, executeCycles = 2)
+		self.assertGreater(stalled, 0)
+		self.assertLess(stalled, self.flashLatency)
+		self.assertEqual(self.flashReads[:2], [0x000, 0x001])
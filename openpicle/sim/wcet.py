@@ -0,0 +1,119 @@
+# SPDX-License-Identifier: BSD-3-Clause
+from unittest import TestCase
+
+from ..pic16.model import PIC16Model
+from ..wcet import FetchLatency, analyse, measureFetchLatency
+from ..system import programImage, imageProgram
+from ..pic16.programs import delayLoop
+
+# Calls a 2 deep routine 5 times, the routine skipping an INCF on bit 1 of 0x21 being clear, then halts
+callLoop = [0] * 0x19
+callLoop[0x000:0x006] = (
+	0x3005, # MOVLW 5
+	0x00A0, # MOVWF 0x20
+	0x2010, # CALL 0x010
+	0x0BA0, # DECFSZ 0x20,f
+	0x2802, # GOTO 2
+	0x2805, # GOTO 5
+)
+callLoop[0x010:0x014] = (
+	0x2018, # CALL 0x018
+	0x18A1, # BTFSC 0x21,1
+	0x0AA2, # INCF 0x22,f
+	0x0008, # RETURN
+)
+callLoop[0x018] = 0x3400 # RETLW 0
+
+delayBounds = {0x008: 100, 0x00B: 100, 0x00E: 100}
+
+class TestWCET(TestCase):
+	def modelCycles(self, program, until, *, memory = {}, **options):
+		model = PIC16Model(program, **options)
+		for address, value in memory.items():
+			model.memory[address] = value
+		while model.pc != until:
+			model.step()
+		return model.cycles
+
+	def testDelayLoop(self):
+		analysis = analyse(delayLoop, loopBounds = delayBounds)
+		loops = {(loop.header, loop.latch): loop for loop in analysis.loops}
+		# The loops run for a fixed count, so the worst case is exact
+		self.assertEqual(loops[0x007, 0x008].cycles, 99 * 8 + 4)
+		self.assertEqual(
+			self.modelCycles(delayLoop, 0x00C), 4 * 7 + loops[0x007, 0x00B].cycles
+		)
+		# The main loop never exits, but one pass through it is what sizes the blink rate
+		main = loops[0x003, 0x00F]
+		self.assertIsNone(main.cycles)
+		self.assertEqual(main.iterationCycles, 4 * 4 + loops[0x007, 0x00E].cycles + 4)
+		routine, = analysis.routines
+		self.assertIsNone(routine.cycles)
+		self.assertEqual(analysis.stackDepth, 0)
+
+	def testImage(self):
+		# A program read back out of a flash image, padded out as flash is, analyses as the program does
+		image = programImage(delayLoop) + bytes([0xFF] * 32)
+		self.assertEqual(imageProgram(image)[:len(delayLoop)], delayLoop)
+		self.assertEqual(analyse(imageProgram(image), loopBounds = delayBounds), analyse(delayLoop, loopBounds = delayBounds))
+
+	def testFusedLoops(self):
+		# Fused, each DECFSZ branches back itself, the inner loop's first pass running the GOTO to get it into
+		# the loop buffer
+		analysis = analyse(delayLoop, loopBounds = {0x007: 100, 0x00A: 100, 0x00D: 100}, fuseLoops = True)
+		loops = {(loop.header, loop.latch): loop for loop in analysis.loops}
+		self.assertEqual(loops[0x007, 0x007].iterationCycles, 4)
+		self.assertEqual(loops[0x007, 0x007].cycles, 99 * 4 + 4 + 4)
+		self.assertEqual(
+			self.modelCycles(delayLoop, 0x009, fuseLoops = True), 4 * 7 + loops[0x007, 0x007].cycles
+		)
+		# The inner loop's GOTO is in the loop buffer on each pass of the next loop out, so its GOTO always runs
+		self.assertEqual(loops[0x007, 0x00A].iterationCycles, loops[0x007, 0x007].cycles + 3 * 4)
+		self.assertEqual(
+			self.modelCycles(delayLoop, 0x00C, fuseLoops = True), 4 * 7 + loops[0x007, 0x00A].cycles
+		)
+
+	def testCalls(self):
+		analysis = analyse(callLoop, loopBounds = {0x004: 5})
+		routines = {routine.address: routine for routine in analysis.routines}
+		self.assertEqual(routines[0x018].cycles, 4)
+		self.assertEqual(routines[0x010].cycles, 4 * 4 + 4)
+		self.assertEqual(routines[0x010].calls, (0x018,))
+		self.assertEqual(analysis.stackDepth, 2)
+		loops = {loop.header: loop for loop in analysis.loops}
+		loop, halt = loops[0x002], loops[0x005]
+		# With bit 1 of 0x21 set every INCF is run, which is the worst case
+		self.assertEqual(self.modelCycles(callLoop, 0x005, memory = {0x21: 0x02}), 4 * 2 + loop.cycles)
+		self.assertEqual(self.modelCycles(callLoop, 0x005), 4 * 2 + loop.cycles - 5 * 4)
+		self.assertEqual((halt.header, halt.cycles), (0x005, None))
+
+		# A flash fetch unit holds the core for every cycle of each fetch past the first
+		analysis = analyse(callLoop, loopBounds = {0x004: 5}, fetchLatency = FetchLatency(sequential = 2, jump = 3))
+		routines = {routine.address: routine for routine in analysis.routines}
+		self.assertEqual(routines[0x018].cycles, 2 + 4)
+		self.assertEqual(routines[0x010].cycles, 2 + 4 + 6 + 2 + 4 + 1 + 4 + 1 + 4)
+
+	def testInterruptStack(self):
+		program = list(callLoop)
+		program[0x004:0x006] = (0x2010, 0x0009) # CALL 0x010, RETFIE
+		program[0x006] = 0x2806 # GOTO 6
+		program[0x003] = 0x2806 # GOTO 6
+		analysis = analyse(program, interrupts = True)
+		# The main line's 2 deep call, the interrupt entry and the handler's own 2 deep call
+		self.assertEqual(analysis.stackDepth, 5)
+
+	def testFetchLatency(self):
+		fastRead = measureFetchLatency()
+		self.assertEqual(fastRead.sequential, fastRead.jump)
+		# In continuous read mode the next word is just clocked out, and any other skips the opcode
+		continuousRead = measureFetchLatency(continuousRead = True)
+		self.assertLess(continuousRead.sequential, continuousRead.jump)
+		self.assertLess(continuousRead.jump, fastRead.jump)
+
+	def testErrors(self):
+		with self.assertRaisesRegex(ValueError, 'No bound'):
+			analyse(callLoop)
+		with self.assertRaisesRegex(ValueError, 'recursive'):
+			analyse([0x2000])
+		with self.assertRaisesRegex(ValueError, 'BRW'):
+			analyse([0x000B])
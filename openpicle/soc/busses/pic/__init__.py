@@ -5,21 +5,37 @@ from torii.util.units import log2_exact
 from torii.lib.soc.memory import MemoryMap
 from torii.lib.soc.csr.bus import Element as Register
 from .types import Processor, Memory
-from ....pic16 import PIC16
 from typing import Optional, TYPE_CHECKING
 
+if TYPE_CHECKING:
+	from ....pic16 import PIC16
+	from ...interrupts import InterruptController
+
 __all__ = (
 	'PICBus',
 )
 
 class PICBus(Elaboratable):
 	def __init__(self) -> None:
-		self.processor : Optional[PIC16] = None
+		self.processor : Optional['PIC16'] = None
 		self.memoryMap = MemoryMap(addr_width = 7, data_width = 8)
+		self._processorRegisters : Optional[Memory] = None
+		self.interruptController : Optional['InterruptController'] = None
 
-	def add_processor(self, processor : PIC16):
+	def add_processor(self, processor : 'PIC16'):
 		assert self.processor is None, "Cannot add more than one processor to the bus"
 		self.processor = processor
+		# The processor implements its indirect addressing registers itself, so reserve their addresses to keep
+		# peripherals from being placed over them
+		if processor.indirectBase is not None:
+			self._processorRegisters = Memory(address_width = 2)
+			self.memoryMap.add_resource(
+				self._processorRegisters, size = 4, addr = processor.indirectBase, name = 'indirect'
+			)
+
+	def add_interrupt_controller(self, controller : 'InterruptController'):
+		assert self.interruptController is None, "Cannot add more than one interrupt controller to the bus"
+		self.interruptController = controller
 
 	def add_register(self, *, address : int, access : Register.Access, name : str) -> Register:
 		register = Register(width = self.memoryMap.data_width, access = access, name = name)
@@ -34,6 +50,10 @@ class PICBus(Elaboratable):
 
 	def elaborate(self, platform : Platform) -> Module:
 		assert self.processor is not None, "Must provide a processor for PICBus to connect to"
+		if self.interruptController is not None:
+			# Not every processor can be built with interrupts, PipelinedPIC16 for one
+			assert getattr(self.processor, 'interrupts', False), \
+				"The processor must be built with interrupts to take them"
 		self.memoryMap.freeze()
 
 		m = Module()
@@ -43,11 +63,16 @@ class PICBus(Elaboratable):
 		m.d.comb += self.processor.pBus.connect(processor)
 		m.d.sync += read.eq(processor.read)
 
+		if self.interruptController is not None:
+			m.d.comb += self.processor.interrupt.eq(self.interruptController.request)
+
 		for busResource in self.memoryMap.all_resources():
 			addressBegin = busResource.start
 			addressEnd = busResource.end
 			dataWidth = busResource.width
 			resource = busResource.resource
+			if resource is self._processorRegisters:
+				continue
 			if TYPE_CHECKING:
 				assert isinstance(resource, (Register, Memory))
 			assert dataWidth == 8
@@ -1,5 +1,5 @@
 # SPDX-License-Identifier: BSD-3-Clause
-from torii import Elaboratable, Module, Signal, Value
+from torii import Elaboratable, Module, Signal, Cat, ClockSignal
 from .type import *
 
 __all__ = (
@@ -7,8 +7,24 @@ __all__ = (
 )
 
 class Bus(Elaboratable):
-	def __init__(self, *, resource):
+	'''Byte-at-a-time QPI transfers, after first switching the flash from SPI into QPI mode.
+
+	By default the flash clock runs at half the system clock, each nibble spending a cycle with the
+	clock low and one with it high. With fullRate, the flash clock is instead the system clock gated by
+	a registered enable (inverted so the enable only ever changes while the clock is low), and a nibble
+	is transferred every cycle. Beginning a byte as the previous one completes then keeps the clock
+	running without a gap.
+
+	In full rate mode, read data is sampled at the system clock edge ending each flash clock pulse.
+	sampleDelay pushes the sampling of every nibble back by that many further cycles, to cover the
+	round trip through the pads and the flash's clock to output time at higher clock rates.
+	'''
+
+	def __init__(self, *, resource, fullRate = False, sampleDelay = 0):
+		assert fullRate or sampleDelay == 0, 'sampleDelay is only supported in full rate mode'
 		self._bus = resource
+		self._fullRate = fullRate
+		self._sampleDelay = sampleDelay
 		self.cs = Signal()
 		self.copi = Signal(8)
 		self.cipo = Signal(8)
@@ -29,12 +45,20 @@ class Bus(Elaboratable):
 		io_oe = bus.dq.oe
 		cs = Signal()
 		copi = bus.dq.o[0]
+		sck = Signal()
 
 		m.d.comb += [
 			self.complete.eq(0),
 			bus.cs.o.eq(self.cs | cs),
-			self.cipo.eq(data)
 		]
+		if self._fullRate:
+			m.d.comb += bus.clk.o.eq(sck & ~ClockSignal())
+			self.sampleFullRate(m, write, sck)
+		else:
+			m.d.comb += [
+				bus.clk.o.eq(sck),
+				self.cipo.eq(data),
+			]
 
 		with m.FSM(name = 'qspi-fsm'):
 			# Begin bringup by putting the Flash into QSPI mode
@@ -47,14 +71,14 @@ class Bus(Elaboratable):
 				m.next = 'SPI-SHIFT-L'
 			with m.State('SPI-SHIFT-L'):
 				m.d.sync += [
-					bus.clk.o.eq(0),
+					sck.eq(0),
 					copi.eq(data[7]),
 					data.eq(data.shift_left(1)),
 					bitCounter.eq(bitCounter - 1),
 				]
 				m.next = 'SPI-SHIFT-H'
 			with m.State('SPI-SHIFT-H'):
-				m.d.sync += bus.clk.o.eq(1)
+				m.d.sync += sck.eq(1)
 				with m.If(bitCounter == 0):
 					m.next = 'SPI-FINISH'
 				with m.Else():
@@ -65,39 +89,115 @@ class Bus(Elaboratable):
 					io_oe.eq(0b0000),
 					self.ready.eq(1),
 				]
+				if self._fullRate:
+					m.d.sync += sck.eq(0)
 				m.next = 'IDLE'
 
-			with m.State('IDLE'):
-				with m.If(self.begin):
-					m.d.sync += write.eq(~self.rnw)
-					with m.If(self.rnw):
-						m.d.sync += data.eq(0)
-					with m.Else():
-						m.d.sync += data.eq(self.copi)
-					m.next = 'QSPI-SHIFT-L'
-			with m.State('QSPI-SHIFT-L'):
-				m.d.sync += [
-					bus.clk.o.eq(0),
-					io_oe.eq(write.replicate(4)),
-					data.eq(data.shift_left(4)),
-					nibbleCounter.eq(nibbleCounter - 1),
-				]
-				with m.If(write):
-					m.d.sync += io_o.eq(data[4:8])
-				m.next = 'QSPI-SHIFT-H'
-			with m.State('QSPI-SHIFT-H'):
-				m.d.sync += bus.clk.o.eq(1)
-				with m.If(~write):
-					m.d.sync += data[0:4].eq(io_i)
-				with m.If(nibbleCounter == 0):
-					m.d.comb += self.complete.eq(1)
+			if self._fullRate:
+				self.elaborateFullRate(m, data, write, sck)
+			else:
+				with m.State('IDLE'):
 					with m.If(self.begin):
 						m.d.sync += write.eq(~self.rnw)
-						with m.If(~self.rnw):
+						with m.If(self.rnw):
+							m.d.sync += data.eq(0)
+						with m.Else():
 							m.d.sync += data.eq(self.copi)
 						m.next = 'QSPI-SHIFT-L'
+				with m.State('QSPI-SHIFT-L'):
+					m.d.sync += [
+						sck.eq(0),
+						io_oe.eq(write.replicate(4)),
+						data.eq(data.shift_left(4)),
+						nibbleCounter.eq(nibbleCounter - 1),
+					]
+					with m.If(write):
+						m.d.sync += io_o.eq(data[4:8])
+					m.next = 'QSPI-SHIFT-H'
+				with m.State('QSPI-SHIFT-H'):
+					m.d.sync += sck.eq(1)
+					with m.If(~write):
+						m.d.sync += data[0:4].eq(io_i)
+					with m.If(nibbleCounter == 0):
+						m.d.comb += self.complete.eq(1)
+						with m.If(self.begin):
+							m.d.sync += write.eq(~self.rnw)
+							with m.If(~self.rnw):
+								m.d.sync += data.eq(self.copi)
+							m.next = 'QSPI-SHIFT-L'
+						with m.Else():
+							m.next = 'IDLE'
 					with m.Else():
-						m.next = 'IDLE'
-				with m.Else():
-					m.next = 'QSPI-SHIFT-L'
+						m.next = 'QSPI-SHIFT-L'
 		return m
+
+	def sampleFullRate(self, m : Module, write : Signal, sck : Signal):
+		io_i = self._bus.dq.i
+		sampleDelay = self._sampleDelay
+		readData = Signal.like(self.cipo)
+		# A read nibble is clocked out of the flash by each pulse on a read, and is sampled sampleDelay
+		# cycles after the edge that ends that pulse
+		capture = Signal()
+		delayed = Signal(sampleDelay)
+		sampling = Signal(sampleDelay + 1)
+		m.d.comb += [
+			sampling.eq(Cat(sck & ~write, delayed)),
+			capture.eq(sampling[sampleDelay]),
+			self.cipo.eq(readData),
+		]
+		if sampleDelay:
+			m.d.sync += delayed.eq(sampling[:-1])
+		with m.If(capture):
+			m.d.sync += readData.eq(Cat(io_i, readData[0:4]))
+
+	def elaborateFullRate(self, m : Module, data : Signal, write : Signal, sck : Signal):
+		bus = self._bus
+		io_o = bus.dq.o
+		io_oe = bus.dq.oe
+		sampleDelay = self._sampleDelay
+		sampleCounter = Signal(range(max(sampleDelay, 1)))
+
+		# Set up the first nibble of a byte so it is clocked out over the next cycle
+		def startByte():
+			m.d.sync += [
+				sck.eq(1),
+				write.eq(~self.rnw),
+				io_oe.eq((~self.rnw).replicate(4)),
+				data.eq(self.copi),
+			]
+			with m.If(~self.rnw):
+				m.d.sync += io_o.eq(self.copi[4:8])
+			m.next = 'QSPI-NIBBLE-H'
+
+		def finishByte():
+			m.d.comb += self.complete.eq(1)
+			with m.If(self.begin):
+				startByte()
+			with m.Else():
+				m.d.sync += sck.eq(0)
+				m.next = 'IDLE'
+
+		with m.State('IDLE'):
+			with m.If(self.begin):
+				startByte()
+		with m.State('QSPI-NIBBLE-H'):
+			with m.If(write):
+				m.d.sync += io_o.eq(data[0:4])
+			m.next = 'QSPI-NIBBLE-L'
+		with m.State('QSPI-NIBBLE-L'):
+			if sampleDelay:
+				with m.If(write):
+					finishByte()
+				with m.Else():
+					m.d.sync += [
+						sck.eq(0),
+						sampleCounter.eq(sampleDelay - 1),
+					]
+					m.next = 'QSPI-SAMPLE'
+			else:
+				finishByte()
+		if sampleDelay:
+			with m.State('QSPI-SAMPLE'):
+				m.d.sync += sampleCounter.eq(sampleCounter - 1)
+				with m.If(sampleCounter == 0):
+					finishByte()
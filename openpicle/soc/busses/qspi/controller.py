@@ -10,7 +10,25 @@ __all__ = (
 )
 
 class Controller(Elaboratable):
-	def __init__(self, resourceName : Union[Tuple[str], Tuple[str, int]]):
+	'''Reads 16-bit words from a QSPI flash in QPI mode.
+
+	By default every read is a complete fastRead transaction. With continuousRead, reads use fastReadQIO
+	with the continuous read mode bits set so that after the first transaction the flash expects an
+	address straight away, without an opcode. CS is also left asserted after each read, and a following
+	read of the next word (the previous address plus 2) just clocks that word out. Any other address
+	deselects the flash and starts a new (opcode-less) transaction.
+
+	dummyCycles sets how many flash clocks are spent between the address and the data to suit the flash
+	part, and must be even as it is made up of whole bytes. In continuous read mode the two clocks of the
+	mode byte count towards it. fullRate and sampleDelay are passed through to the :class:`Bus`.
+	'''
+
+	def __init__(
+		self, resourceName : Union[Tuple[str], Tuple[str, int]], *, continuousRead : bool = False,
+		dummyCycles : int = 4, fullRate : bool = False, sampleDelay : int = 0
+	):
+		assert dummyCycles % 2 == 0, 'dummyCycles must be a whole number of bytes'
+		assert dummyCycles >= (2 if continuousRead else 0), 'continuous read mode needs 2 dummy cycles for the mode byte'
 		self.address = Signal(24)
 		self.data = Signal(16)
 		self.ready = Signal()
@@ -18,28 +36,70 @@ class Controller(Elaboratable):
 		self.complete = Signal()
 
 		self._resourceName = resourceName
+		self._continuousRead = continuousRead
+		self._dummyBytes = dummyCycles // 2
+		self._fullRate = fullRate
+		self._sampleDelay = sampleDelay
 
 	def elaborate(self, platform) -> Module:
 		m = Module()
-		m.submodules.bus = bus = Bus(resource = platform.request(*self._resourceName))
-		dummyCounter = Signal(range(2))
+		m.submodules.bus = bus = Bus(
+			resource = platform.request(*self._resourceName), fullRate = self._fullRate,
+			sampleDelay = self._sampleDelay
+		)
+		continuousRead = self._continuousRead
+		# Dummy bytes left to issue, not counting the mode byte
+		dummyBytes = self._dummyBytes - (1 if continuousRead else 0)
+		dummyCounter = Signal(range(max(dummyBytes, 1)))
+		# Set once the flash has been put in continuous read mode and so no longer expects an opcode
+		modeActive = Signal()
+		# Set while CS is being held with the flash ready to clock out the word at nextAddress
+		burstActive = Signal()
+		nextAddress = Signal.like(self.address)
 
 		m.d.comb += [
 			self.complete.eq(0),
 			self.ready.eq(bus.ready),
 		]
 
+		def beginTransaction():
+			m.d.sync += bus.cs.eq(1)
+			with m.If(modeActive):
+				m.d.comb += [
+					bus.begin.eq(1),
+					bus.rnw.eq(0),
+					bus.copi.eq(self.address[16:24]),
+				]
+				m.next = 'ISSUE-ADDR-M'
+			with m.Else():
+				m.d.comb += [
+					bus.begin.eq(1),
+					bus.rnw.eq(0),
+					bus.copi.eq(QSPIOpcodes.fastReadQIO if continuousRead else QSPIOpcodes.fastRead),
+				]
+				m.next = 'ISSUE-ADDR-H'
+
 		with m.FSM(name = 'flash-fsm'):
 			with m.State('IDLE'):
 				with m.If(self.ready & self.read):
 					# As soon as we get asked to read something, issue the command to the Flash
-					m.d.sync += bus.cs.eq(1)
-					m.d.comb += [
-						bus.begin.eq(1),
-						bus.rnw.eq(0),
-						bus.copi.eq(QSPIOpcodes.fastRead),
-					]
-					m.next = 'ISSUE-ADDR-H'
+					with m.If(burstActive & (self.address == nextAddress)):
+						# Unless the flash is already positioned at that word, in which case just clock it out
+						m.d.comb += [
+							bus.begin.eq(1),
+							bus.rnw.eq(1),
+						]
+						m.next = 'ISSUE-DATA-H'
+					with m.Elif(burstActive):
+						m.d.sync += [
+							bus.cs.eq(0),
+							burstActive.eq(0),
+						]
+						m.next = 'RESELECT'
+					with m.Else():
+						beginTransaction()
+			with m.State('RESELECT'):
+				beginTransaction()
 			with m.State('ISSUE-ADDR-H'):
 				with m.If(bus.complete):
 					m.d.comb += [
@@ -63,7 +123,22 @@ class Controller(Elaboratable):
 						bus.rnw.eq(0),
 						bus.copi.eq(self.address[0:8]),
 					]
-					m.next = 'ISSUE-DUMMY'
+					if continuousRead:
+						m.next = 'ISSUE-MODE'
+					else:
+						m.d.sync += dummyCounter.eq(max(dummyBytes - 1, 0))
+						m.next = 'ISSUE-DUMMY' if dummyBytes else 'ISSUE-DATA-L'
+			with m.State('ISSUE-MODE'):
+				with m.If(bus.complete):
+					# M5-4 = 0b10 keeps the flash in continuous read mode, and the mode byte takes the
+					# place of the first dummy byte
+					m.d.sync += dummyCounter.eq(max(dummyBytes - 1, 0))
+					m.d.comb += [
+						bus.begin.eq(1),
+						bus.rnw.eq(0),
+						bus.copi.eq(0x20),
+					]
+					m.next = 'ISSUE-DUMMY' if dummyBytes else 'ISSUE-DATA-L'
 			with m.State('ISSUE-DUMMY'):
 				with m.If(bus.complete):
 					m.d.sync += dummyCounter.eq(dummyCounter - 1)
@@ -72,7 +147,7 @@ class Controller(Elaboratable):
 						bus.rnw.eq(0),
 						bus.copi.eq(0),
 					]
-					with m.If(dummyCounter == 1):
+					with m.If(dummyCounter == 0):
 						m.next = 'ISSUE-DATA-L'
 			with m.State('ISSUE-DATA-L'):
 				with m.If(bus.complete):
@@ -95,10 +170,15 @@ class Controller(Elaboratable):
 				with m.If(bus.complete):
 					m.next = 'STORE-DATA-H'
 			with m.State('STORE-DATA-H'):
-				m.d.sync += [
-					bus.cs.eq(0),
-					self.data[8:16].eq(bus.cipo),
-				]
+				m.d.sync += self.data[8:16].eq(bus.cipo)
+				if continuousRead:
+					m.d.sync += [
+						modeActive.eq(1),
+						burstActive.eq(1),
+						nextAddress.eq(self.address + 2),
+					]
+				else:
+					m.d.sync += bus.cs.eq(0)
 				m.d.comb += self.complete.eq(1)
 				m.next = 'IDLE'
 		return m
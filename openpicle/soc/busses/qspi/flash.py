@@ -0,0 +1,159 @@
+# SPDX-License-Identifier: BSD-3-Clause
+from mmap import mmap, ACCESS_READ
+from os import PathLike
+from pathlib import Path
+from typing import Union
+from torii import Record
+from torii.hdl.rec import DIR_FANIN, DIR_FANOUT
+from torii.sim import Delay, Passive
+
+from .type import SPIOpcodes, QSPIOpcodes
+
+__all__ = (
+	'flashResource',
+	'FlashPlatform',
+	'Flash',
+)
+
+def flashResource():
+	'''Build a fresh stand-in for the QSPI flash platform resource, so each simulation gets its own'''
+	return Record(
+		layout = (
+			('cs', [
+				('o', 1, DIR_FANOUT),
+			]),
+			('clk', [
+				('o', 1, DIR_FANOUT),
+			]),
+			('dq', [
+				('i', 4, DIR_FANIN),
+				('o', 4, DIR_FANOUT),
+				('oe', 4, DIR_FANOUT),
+			]),
+		)
+	)
+
+class FlashPlatform:
+	'''Stand-in platform for simulating a Controller on its own, providing it a flashResource'''
+
+	def __init__(self):
+		self.bus = flashResource()
+
+	@property
+	def default_clk_frequency(self):
+		return float(25e6)
+
+	def request(self, name, number):
+		assert name == 'qspi-flash'
+		assert number == 0
+		return self.bus
+
+class Flash:
+	'''Behavioural model of a QSPI flash on the cs/clk/dq Record of flashResource, for simulation.
+
+	The flash starts in SPI mode, where it only answers enableQSPI to switch into QPI mode. It then decodes
+	fastRead and fastReadQIO, along with the opcode-less transactions of continuous read mode which the
+	mode byte of a fastReadQIO selects, serving data from image. dummyCycles must match the Controller's.
+	An image given as a path is mmap'd rather than read in, so even large firmware images cost nothing to
+	load, while anything else supporting the buffer protocol is used as it is. Reads past the end of the
+	image see erased flash.
+
+	Add :meth:`process` as a sync process. It watches the flash clock at the quarter and three quarter points
+	of each cycle of period so it follows the Bus in both half and full rate modes. Data is driven as soon
+	as the flash clock falls, so a Bus using the model wants a sampleDelay of 0.
+	'''
+
+	def __init__(
+		self, resource, image : Union[str, PathLike, bytes, bytearray, memoryview], *, dummyCycles : int = 4,
+		period : float = 1 / 25e6
+	):
+		self._bus = resource
+		self._dummyCycles = dummyCycles
+		self._period = period
+		self._file = None
+		if isinstance(image, (str, PathLike)):
+			self._file = open(image, 'rb')
+			# mmap refuses to map an empty file, which reads as entirely erased anyway
+			image = mmap(self._file.fileno(), 0, access = ACCESS_READ) if Path(image).stat().st_size else b''
+		self.image = image
+		self.qpi = False
+		self.continuous = False
+
+	def close(self):
+		if self._file is not None:
+			if isinstance(self.image, mmap):
+				self.image.close()
+			self._file.close()
+			self._file = None
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, *args):
+		self.close()
+
+	def read(self, address : int) -> int:
+		return self.image[address] if address < len(self.image) else 0xFF
+
+	def _byte(self):
+		high = yield None
+		low = yield None
+		return (high << 4) | low
+
+	def _transaction(self):
+		'''Each value sent in is what was on dq.o at a rising edge of the flash clock, and each value yielded
+		is the nibble to drive on dq.i from the falling edge before the next, if any'''
+		if not self.qpi:
+			opcode = 0
+			for _ in range(8):
+				opcode = (opcode << 1) | ((yield None) & 1)
+			assert opcode == SPIOpcodes.enableQSPI, f'Unsupported SPI opcode {opcode:#04x}'
+			self.qpi = True
+			while True:
+				yield None
+
+		if self.continuous:
+			opcode = QSPIOpcodes.fastReadQIO
+		else:
+			opcode = yield from self._byte()
+		assert opcode in (QSPIOpcodes.fastRead, QSPIOpcodes.fastReadQIO), f'Unsupported QPI opcode {opcode:#04x}'
+		address = 0
+		for _ in range(3):
+			address = (address << 8) | (yield from self._byte())
+		dummyCycles = self._dummyCycles
+		if opcode == QSPIOpcodes.fastReadQIO:
+			# M5-4 of 0b10 keeps the flash in continuous read mode for the next transaction
+			mode = yield from self._byte()
+			self.continuous = mode & 0x30 == 0x20
+			dummyCycles -= 2
+		for _ in range(dummyCycles):
+			yield None
+
+		while True:
+			value = self.read(address)
+			yield value >> 4
+			yield value & 0xF
+			address = (address + 1) & 0xFFFFFF
+
+	def process(self):
+		yield Passive()
+		bus = self._bus
+		transaction = None
+		output = None
+		clock = 0
+		while True:
+			for delay in (self._period / 4, self._period / 2):
+				yield Delay(delay)
+				selected = yield bus.cs.o
+				clk = yield bus.clk.o
+				if not selected:
+					transaction = None
+				elif transaction is None:
+					transaction = self._transaction()
+					output = next(transaction)
+				elif clk and not clock:
+					output = transaction.send((yield bus.dq.o))
+				elif clock and not clk and output is not None:
+					yield bus.dq.i.eq(output)
+				clock = clk
+			yield
@@ -0,0 +1,108 @@
+# SPDX-License-Identifier: BSD-3-Clause
+from typing import Dict
+from torii import Elaboratable, Module, Signal, Array
+from torii.build import Platform
+from torii.lib.soc.csr.bus import Element as Register
+from .busses.pic import PICBus
+
+__all__ = (
+	'counterNames',
+	'PerformanceCounters',
+)
+
+# In the order they're selected in, and named after the matching PIC16Model attributes
+counterNames = (
+	'cycles',
+	'instructions',
+	'fetchStalls',
+	'peripheralReads',
+	'peripheralWrites',
+	'skips',
+	'stackHighWater',
+)
+
+class PerformanceCounters(Elaboratable):
+	'''Performance counters for the processor on a PICBus.
+
+	These count cycles, instructions retired, cycles the core was held waiting on an instruction fetch
+	(fetchStall, which should be driven from the fetch unit's stall), peripheral bus reads and writes,
+	taken skips and the deepest the call stack has been, 8 being full. Overflowing the stack leaves the
+	high water mark at 8, the core's stackOverflow flagging the entry lost. Nothing but cycles and
+	fetchStalls is counted while the core is held.
+
+	There are three registers on the PICBus. Writing 1 to bit 0 of the control register at baseAddress
+	snapshots every counter and clears them to start counting afresh, so firmware reads a consistent set.
+	The select register at baseAddress + 1 picks the byte of the snapshot the data register at
+	baseAddress + 2 reads back, counter n's bytes being selected by 4n through 4n + 3, least significant
+	first.
+
+	counts holds the live counters, which :meth:`sample` reads from a simulation process.
+	'''
+
+	def __init__(self, *, baseAddress : int, bus : PICBus, width : int = 32) -> None:
+		assert width % 8 == 0 and width <= 32, 'Counters must be a whole number of bytes, up to 4'
+		Access = Register.Access
+		self.width = width
+		self.fetchStall = Signal()
+		self.counts : Dict[str, Signal] = {name: Signal(width, name = f'perf_{name}') for name in counterNames}
+
+		self._bus = bus
+		self._registers = (
+			bus.add_register(address = baseAddress + 0, access = Access.W, name = 'counters.control'),
+			bus.add_register(address = baseAddress + 1, access = Access.RW, name = 'counters.select'),
+			bus.add_register(address = baseAddress + 2, access = Access.R, name = 'counters.data'),
+		)
+		self._baseAddress = baseAddress
+
+	def next_address_after(self) -> int:
+		return self._baseAddress + 3
+
+	def sample(self):
+		'''Simulation process helper returning the live counts by name'''
+		counts = {}
+		for name, counter in self.counts.items():
+			counts[name] = yield counter
+		return counts
+
+	def elaborate(self, platform : Platform) -> Module:
+		assert self._bus.processor is not None, 'The bus must have a processor to count the events of'
+		m = Module()
+		controlReg, selectReg, dataReg = self._registers
+		processor = self._bus.processor
+		counts = self.counts
+		select = Signal(8)
+		snapshot = Array(Signal(32, name = f'snapshot_{name}') for name in counterNames)
+		running = Signal()
+
+		# Strobes from the core hold while it's stalled, so are only counted while it's running
+		m.d.comb += running.eq(~self.fetchStall)
+		events = {
+			'cycles': 1,
+			'instructions': running & processor.retire,
+			'fetchStalls': self.fetchStall,
+			'peripheralReads': running & processor.pBus.read,
+			'peripheralWrites': running & processor.pBus.write,
+			'skips': running & processor.skipped,
+		}
+
+		with m.If(controlReg.w_stb & controlReg.w_data[0]):
+			for index, name in enumerate(counterNames):
+				m.d.sync += snapshot[index].eq(counts[name])
+			for name, event in events.items():
+				m.d.sync += counts[name].eq(event)
+			m.d.sync += counts['stackHighWater'].eq(processor.stackDepth)
+		with m.Else():
+			for name, event in events.items():
+				m.d.sync += counts[name].eq(counts[name] + event)
+			with m.If(processor.stackDepth > counts['stackHighWater']):
+				m.d.sync += counts['stackHighWater'].eq(processor.stackDepth)
+
+		with m.If(selectReg.r_stb):
+			m.d.comb += selectReg.r_data.eq(select)
+		with m.If(selectReg.w_stb):
+			m.d.sync += select.eq(selectReg.w_data)
+
+		with m.If(dataReg.r_stb):
+			selected = snapshot[select[2:]]
+			m.d.comb += dataReg.r_data.eq(selected.word_select(select[0:2], 8))
+		return m
@@ -0,0 +1,128 @@
+# SPDX-License-Identifier: BSD-3-Clause
+from torii import Elaboratable, Module, Signal, Memory, Cat
+from torii.util.units import log2_exact
+from ..pic16.busses import InstructionBus
+
+__all__ = (
+	'InstructionCache',
+)
+
+class InstructionCache(Elaboratable):
+	'''Direct-mapped instruction cache sitting between a PIC16's iBus and the QSPI flash controller.
+
+	The cache holds lines lines of lineWords instruction words each. It presents the same interface
+	as :class:`Prefetcher`: a hit returns the word on iBus.data the cycle after iBus.read with no wait,
+	while a miss raises stall from that cycle until the whole line has been filled from flash.
+
+	hits and misses count lookups for sizing the cache, saturating rather than wrapping.
+	'''
+
+	def __init__(self, *, lines = 16, lineWords = 2, counterWidth = 16):
+		self.lines = lines
+		self.lineWords = lineWords
+
+		self.iBus = InstructionBus()
+		self.stall = Signal()
+		self.hits = Signal(counterWidth)
+		self.misses = Signal(counterWidth)
+
+		self.flashAddress = Signal(12)
+		self.flashRead = Signal()
+		self.flashData = Signal(16)
+		self.flashReady = Signal()
+		self.flashComplete = Signal()
+
+	def elaborate(self, platform):
+		m = Module()
+		offsetBits = log2_exact(self.lineWords)
+		indexBits = log2_exact(self.lines)
+		tagBits = len(self.iBus.address) - offsetBits - indexBits
+		assert tagBits > 0, 'The cache must be smaller than the instruction address space'
+
+		m.submodules.data = data = Memory(width = 14, depth = self.lines * self.lineWords)
+		m.submodules.tags = tags = Memory(width = tagBits + 1, depth = self.lines)
+		dataRead = data.read_port(transparent = False)
+		dataWrite = data.write_port()
+		tagRead = tags.read_port(transparent = False)
+		tagWrite = tags.write_port()
+
+		address = self.iBus.address
+		request = Signal.like(address)
+		requestIndex = request[offsetBits:offsetBits + indexBits]
+		requestTag = request[offsetBits + indexBits:]
+		lookupAddress = Signal.like(address)
+
+		lookup = Signal()
+		refilled = Signal()
+		hit = Signal()
+		accept = Signal()
+		fillIndex = Signal(max(offsetBits, 1))
+		flashBusy = Signal()
+		# The flash controller strobes complete as it latches the final byte, so act on it a cycle later
+		complete = Signal()
+		m.d.sync += complete.eq(self.flashComplete)
+
+		m.d.comb += [
+			dataRead.addr.eq(lookupAddress[:offsetBits + indexBits]),
+			tagRead.addr.eq(lookupAddress[offsetBits:offsetBits + indexBits]),
+			self.iBus.data.eq(dataRead.data),
+			hit.eq(lookup & tagRead.data[0] & (tagRead.data[1:] == requestTag)),
+			accept.eq(self.iBus.read & ~self.stall),
+			lookupAddress.eq(address),
+			self.flashAddress.eq(Cat(fillIndex[:offsetBits], requestIndex, requestTag)),
+		]
+
+		with m.If(accept):
+			m.d.sync += request.eq(address)
+		m.d.sync += [
+			lookup.eq(accept),
+			refilled.eq(0),
+		]
+
+		with m.If(lookup & ~refilled):
+			with m.If(hit):
+				with m.If(self.hits != (2 ** len(self.hits)) - 1):
+					m.d.sync += self.hits.eq(self.hits + 1)
+			with m.Elif(self.misses != (2 ** len(self.misses)) - 1):
+				m.d.sync += self.misses.eq(self.misses + 1)
+
+		with m.FSM(name = 'icache-fsm'):
+			with m.State('IDLE'):
+				with m.If(lookup & ~hit):
+					m.d.comb += self.stall.eq(1)
+					m.d.sync += fillIndex.eq(0)
+					m.next = 'FILL'
+			with m.State('FILL'):
+				m.d.comb += self.stall.eq(1)
+				with m.If(~flashBusy & self.flashReady):
+					m.d.comb += self.flashRead.eq(1)
+					m.d.sync += flashBusy.eq(1)
+				with m.If(complete):
+					m.d.sync += [
+						flashBusy.eq(0),
+						fillIndex.eq(fillIndex + 1),
+					]
+					m.d.comb += [
+						dataWrite.addr.eq(Cat(fillIndex[:offsetBits], requestIndex)),
+						dataWrite.data.eq(self.flashData),
+						dataWrite.en.eq(1),
+					]
+					with m.If(fillIndex[:offsetBits] == self.lineWords - 1):
+						m.d.comb += [
+							tagWrite.addr.eq(requestIndex),
+							tagWrite.data.eq(Cat(1, requestTag)),
+							tagWrite.en.eq(1),
+						]
+						m.next = 'REREAD'
+			with m.State('REREAD'):
+				# Look the requested word back up now it's present, presenting it the cycle stall drops
+				m.d.comb += [
+					self.stall.eq(1),
+					lookupAddress.eq(request),
+				]
+				m.d.sync += [
+					lookup.eq(1),
+					refilled.eq(1),
+				]
+				m.next = 'IDLE'
+		return m
@@ -0,0 +1,72 @@
+# SPDX-License-Identifier: BSD-3-Clause
+from torii import Elaboratable, Module, Signal, Const
+from torii.build import Platform
+from torii.lib.soc.csr.bus import Element as Register
+from .busses.pic import PICBus
+
+__all__ = (
+	'InterruptController',
+)
+
+class InterruptController(Elaboratable):
+	'''Interrupt controller for a PIC16 built with interrupts, raising its interrupt request.
+
+	There are two registers on the PICBus: the enables at baseAddress and the flags at baseAddress + 1.
+	Bits 0 through 6 of each are for the source on the same bit of sources, with bit 7 of the enables
+	being the global enable. A flag is set by its source and stays set until cleared by writing it 0, so
+	BCF on the flags register clears one without losing any flag raised while the BCF is running. Writing
+	a 1 leaves a flag as it is.
+
+	Sources selected in edgeTriggered, such as GPIO pin changes, set their flag on a rising edge. The
+	rest are level sensitive, such as a timer overflow or FIFO level, setting their flag for as long as
+	they're held high, so the flag can only be cleared once the source is dealt with.
+
+	The request follows a source's flag a cycle after the source is raised, and the core enters a fixed 6
+	cycles after that, so an enabled source is always answered with a fetch from 0x004 7 cycles after it's
+	raised, whatever Q phase the core is in.
+	'''
+
+	def __init__(self, *, baseAddress : int, bus : PICBus, edgeTriggered : int = 0) -> None:
+		Access = Register.Access
+		self.sources = Signal(7)
+		self.request = Signal()
+		self.edgeTriggered = edgeTriggered
+
+		self._registers = (
+			bus.add_register(address = baseAddress + 0, access = Access.RW, name = 'interrupts.enable'),
+			bus.add_register(address = baseAddress + 1, access = Access.RW, name = 'interrupts.flags'),
+		)
+		self._baseAddress = baseAddress
+		bus.add_interrupt_controller(self)
+
+	def next_address_after(self) -> int:
+		return self._baseAddress + 2
+
+	def elaborate(self, platform : Platform) -> Module:
+		m = Module()
+		enableReg, flagsReg = self._registers
+		enables = Signal(8)
+		flags = Signal(7)
+		sourcesLast = Signal.like(self.sources)
+		events = Signal.like(flags)
+		edgeTriggered = Const(self.edgeTriggered, 7)
+
+		m.d.sync += sourcesLast.eq(self.sources)
+		m.d.comb += events.eq(
+			(self.sources & ~sourcesLast & edgeTriggered) | (self.sources & ~edgeTriggered)
+		)
+
+		with m.If(enableReg.r_stb):
+			m.d.comb += enableReg.r_data.eq(enables)
+		with m.If(enableReg.w_stb):
+			m.d.sync += enables.eq(enableReg.w_data)
+
+		with m.If(flagsReg.r_stb):
+			m.d.comb += flagsReg.r_data.eq(flags)
+		with m.If(flagsReg.w_stb):
+			m.d.sync += flags.eq((flags & flagsReg.w_data) | events)
+		with m.Else():
+			m.d.sync += flags.eq(flags | events)
+
+		m.d.comb += self.request.eq(enables[7] & (flags & enables[0:7]).any())
+		return m
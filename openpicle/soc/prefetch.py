@@ -0,0 +1,130 @@
+# SPDX-License-Identifier: BSD-3-Clause
+from torii import Elaboratable, Module, Signal, Mux
+from ..pic16.busses import InstructionBus
+
+__all__ = (
+	'Prefetcher',
+)
+
+class Prefetcher(Elaboratable):
+	'''Single word instruction prefetch buffer sitting between a PIC16's iBus and the QSPI flash controller.
+
+	iBus is driven by the processor exactly as it would drive an instruction memory, with the word
+	read presented on iBus.data the cycle after iBus.read. When the word is not to hand, stall is raised
+	from that next cycle until it is, and the processor must be held (for example with EnableInserter)
+	while it's high.
+
+	Every word delivered to the processor kicks off a fetch of the one after it, so straight line code
+	finds its next instruction waiting in the buffer and pays no flash latency. A read for any other
+	address (a taken branch) discards the prefetched word and fetches the requested one instead.
+	'''
+
+	def __init__(self):
+		self.iBus = InstructionBus()
+		self.stall = Signal()
+
+		self.flashAddress = Signal(12)
+		self.flashRead = Signal()
+		self.flashData = Signal(16)
+		self.flashReady = Signal()
+		self.flashComplete = Signal()
+
+	def elaborate(self, platform):
+		m = Module()
+		address = self.iBus.address
+
+		bufferValid = Signal()
+		bufferAddress = Signal.like(address)
+		bufferData = Signal(14)
+		waiting = Signal()
+		waitAddress = Signal.like(address)
+		prefetch = Signal()
+		prefetchAddress = Signal.like(address)
+		flashBusy = Signal()
+		fetchAddress = Signal.like(address)
+		data = Signal(14)
+
+		accept = Signal()
+		hit = Signal()
+		inFlight = Signal()
+		issue = Signal()
+		issueAddress = Signal.like(address)
+		serve = Signal()
+		# The flash controller strobes complete as it latches the final byte, so act on it a cycle later
+		complete = Signal()
+		m.d.sync += complete.eq(self.flashComplete)
+
+		m.d.comb += [
+			self.stall.eq(waiting),
+			self.iBus.data.eq(data),
+			accept.eq(self.iBus.read & ~waiting),
+			hit.eq(bufferValid & (bufferAddress == address)),
+			inFlight.eq(flashBusy & (fetchAddress == address)),
+			# Serve the completing fetch if it's the one we're stalled on or the one being asked for now
+			serve.eq(complete & (
+				(waiting & (fetchAddress == waitAddress)) | (accept & inFlight)
+			)),
+		]
+
+		with m.If(accept):
+			with m.If(hit):
+				m.d.sync += [
+					data.eq(bufferData),
+					bufferValid.eq(0),
+					prefetch.eq(1),
+					prefetchAddress.eq(address + 1),
+				]
+			with m.Else():
+				m.d.sync += [
+					waiting.eq(1),
+					waitAddress.eq(address),
+					bufferValid.eq(0),
+					prefetch.eq(0),
+				]
+
+		with m.If(complete):
+			m.d.sync += flashBusy.eq(0)
+			with m.If(serve):
+				m.d.sync += [
+					data.eq(self.flashData),
+					waiting.eq(0),
+					prefetch.eq(1),
+					prefetchAddress.eq(fetchAddress + 1),
+				]
+			with m.Elif(~accept):
+				m.d.sync += [
+					bufferValid.eq(1),
+					bufferAddress.eq(fetchAddress),
+					bufferData.eq(self.flashData),
+				]
+
+		# Demand fetches for a missed read take priority over prefetching
+		with m.If(~flashBusy & self.flashReady):
+			with m.If(accept & ~hit):
+				m.d.comb += [
+					issue.eq(1),
+					issueAddress.eq(address),
+				]
+			with m.Elif(waiting):
+				m.d.comb += [
+					issue.eq(1),
+					issueAddress.eq(waitAddress),
+				]
+			with m.Elif(prefetch & ~bufferValid):
+				m.d.comb += [
+					issue.eq(1),
+					issueAddress.eq(prefetchAddress),
+				]
+				m.d.sync += prefetch.eq(0)
+
+		with m.If(issue):
+			m.d.sync += [
+				flashBusy.eq(1),
+				fetchAddress.eq(issueAddress),
+			]
+		# The controller looks at the address as the read is issued, so present it straight away
+		m.d.comb += [
+			self.flashRead.eq(issue),
+			self.flashAddress.eq(Mux(issue, issueAddress, fetchAddress)),
+		]
+		return m
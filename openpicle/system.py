@@ -0,0 +1,169 @@
+# SPDX-License-Identifier: BSD-3-Clause
+from json import dump
+from typing import NamedTuple, Optional, Sequence, Tuple, Union
+from os import PathLike
+
+__all__ = (
+	'SystemResult',
+	'CaravelPlatform',
+	'CaravelSystem',
+	'programImage',
+	'imageProgram',
+	'printSystemResult',
+	'writeSystemResult',
+)
+
+class SystemResult(NamedTuple):
+	cycles : int
+	instructions : int
+	# Cycles from reset to the core issuing its first fetch, which is the flash being brought up, and to
+	# it retiring its first instruction
+	firstFetch : Optional[int]
+	firstRetire : Optional[int]
+	runLowCycles : int
+	peripheralReads : int
+	peripheralWrites : int
+
+	@property
+	def cyclesPerInstruction(self) -> float:
+		if not self.instructions or self.firstFetch is None:
+			return 0.0
+		return (self.cycles - self.firstFetch) / self.instructions
+
+	@property
+	def runLowFraction(self) -> float:
+		return self.runLowCycles / self.cycles if self.cycles else 0.0
+
+def programImage(program : Sequence[int]) -> bytes:
+	'''Lay a program out as a flash image, each word little endian at twice its address as the chip fetches it'''
+	return b''.join(word.to_bytes(2, 'little') for word in program)
+
+def imageProgram(image : bytes) -> Tuple[int, ...]:
+	'''Read a program back out of a flash image laid out as by :func:`programImage`, up to the 4K words the core
+	can address'''
+	image = image[:2 * 4096]
+	return tuple(int.from_bytes(image[address:address + 2], 'little') for address in range(0, len(image) - 1, 2))
+
+class CaravelPlatform:
+	'''Stand-in for the platform resources PIC16Caravel requests, for simulating it'''
+
+	def __init__(self):
+		from torii import Record
+		from .soc.busses.qspi.flash import flashResource
+		self.flashBus = flashResource()
+		self.run = Record([('o', 1)])
+		self.pBus = Record([
+			('addr', [('o', 7)]),
+			('data', [('i', 8), ('o', 8), ('oe', 1)]),
+			('read', 1),
+			('write', 1),
+		])
+
+	@property
+	def default_clk_frequency(self):
+		return float(25e6)
+
+	def request(self, name, number):
+		assert number == 0
+		return {'spi_flash_4x': self.flashBus, 'run': self.run, 'p_bus': self.pBus}[name]
+
+class CaravelSystem:
+	'''Simulates PIC16Caravel as the chip, booting from a flash model holding image and with a flat 128 byte
+	register file on the external peripheral bus, which memory holds. Like PICBus, the register file presents
+	read data the cycle after the read strobe.
+
+	image is either the flash contents, such as from :func:`programImage`, or the path of a file holding
+	them, which the flash model maps in. The rest of the options are passed through to PIC16Caravel, and
+	the flash sample delay has to be left at 0 to suit the flash model. A :class:`Profiler` watching dut can
+	be given to :meth:`run` to profile the program as it runs.
+	'''
+
+	def __init__(self, image : Union[bytes, str, PathLike], **options):
+		from .caravel import PIC16Caravel
+		assert options.get('flashSampleDelay', 0) == 0, 'The flash model drives data with no delay to sample'
+		self.image = image
+		self.platform = CaravelPlatform()
+		self.dut = PIC16Caravel(**options)
+		self.memory = bytearray(128)
+
+	def run(self, cycles : int, *, profiler = None) -> SystemResult:
+		from torii import Fragment
+		from torii.sim import Simulator, Settle, Passive
+		from .soc.busses.qspi.flash import Flash
+
+		dut = self.dut
+		platform = self.platform
+		pBus = platform.pBus
+		run = platform.run.o
+		memory = self.memory
+		counts = {'reads': 0, 'writes': 0}
+		result = []
+
+		def externalBus():
+			yield Passive()
+			reading = False
+			while True:
+				yield Settle()
+				address = yield pBus.addr.o
+				yield pBus.data.i.eq(memory[address] if reading else 0)
+				yield Settle()
+				# Strobes hold while the core is stalled, so only count them as it runs
+				if (yield run):
+					if (yield pBus.read):
+						counts['reads'] += 1
+					if (yield pBus.write):
+						memory[address] = yield pBus.data.o
+						counts['writes'] += 1
+				reading = yield pBus.read
+				yield
+
+		def monitor():
+			instructions = 0
+			firstFetch = None
+			firstRetire = None
+			runLow = 0
+			for cycle in range(cycles):
+				yield Settle()
+				if not (yield run):
+					runLow += 1
+				if firstFetch is None and (yield dut.fetch):
+					firstFetch = cycle
+				if (yield dut.retire):
+					instructions += 1
+					if firstRetire is None:
+						firstRetire = cycle
+				yield
+			result.append(SystemResult(
+				cycles, instructions, firstFetch, firstRetire, runLow, counts['reads'], counts['writes']
+			))
+
+		with Flash(platform.flashBus, self.image, dummyCycles = dut.flashDummyCycles) as flash:
+			sim = Simulator(Fragment.get(dut, platform))
+			sim.add_clock(1 / platform.default_clk_frequency)
+			sim.add_sync_process(flash.process)
+			sim.add_sync_process(externalBus)
+			sim.add_sync_process(monitor)
+			if profiler is not None:
+				sim.add_sync_process(profiler.process)
+			sim.run()
+		return result[0]
+
+def printSystemResult(result : SystemResult, *, frequency : float = 25e6):
+	def formatCycles(cycles):
+		return '-' if cycles is None else f'{cycles} cycles ({cycles / frequency * 1e6:,.2f}µs)'
+
+	print(f'{result.instructions} instructions in {result.cycles} cycles')
+	print(f'Reset to first fetch: {formatCycles(result.firstFetch)}')
+	print(f'Reset to first instruction retired: {formatCycles(result.firstRetire)}')
+	print(f'Cycles per instruction: {result.cyclesPerInstruction:.2f} ({frequency / 1e6 / (result.cyclesPerInstruction or 1):.2f} MIPS)')
+	print(f'Run low: {result.runLowCycles} cycles ({result.runLowFraction:.1%})')
+	print(f'Peripheral bus: {result.peripheralReads} reads, {result.peripheralWrites} writes')
+
+def writeSystemResult(result : SystemResult, fileName : str):
+	with open(fileName, 'w') as file:
+		dump({
+			**result._asdict(),
+			'cyclesPerInstruction': result.cyclesPerInstruction,
+			'runLowFraction': result.runLowFraction,
+		}, file, indent = '\t')
+		file.write('\n')
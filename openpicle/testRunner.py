@@ -0,0 +1,152 @@
+# SPDX-License-Identifier: BSD-3-Clause
+from fnmatch import fnmatchcase
+from time import perf_counter
+from typing import Iterable, List, NamedTuple, Optional, Sequence
+from unittest import TestCase, TestResult, TestSuite
+from unittest.loader import TestLoader
+
+__all__ = (
+	'TestOutcome',
+	'discoverTests',
+	'runTests',
+	'printSummary',
+	'writeJUnit',
+)
+
+class TestOutcome(NamedTuple):
+	name : str
+	status : str # One of 'pass', 'fail', 'error' or 'skip'
+	duration : float
+	details : str = ''
+
+def _flatten(suite) -> Iterable[TestCase]:
+	for test in suite:
+		if isinstance(test, TestSuite):
+			yield from _flatten(test)
+		else:
+			yield test
+
+def _matches(name : str, filters : Sequence[str]) -> bool:
+	# Same rules as unittest's -k: patterns with a wildcard are globs, anything else a substring
+	for pattern in filters:
+		if '*' in pattern:
+			if fnmatchcase(name, pattern):
+				return True
+		elif pattern in name:
+			return True
+	return False
+
+def discoverTests(*, filters : Sequence[str] = ()) -> List[str]:
+	'''Find every test in openpicle.sim, returning their names'''
+	loader = TestLoader()
+	tests = loader.discover(start_dir = 'openpicle.sim', pattern = '*.py')
+	names = [test.id() for test in _flatten(tests)]
+	if filters:
+		names = [name for name in names if _matches(name, filters)]
+	return names
+
+def _runTest(name : str) -> TestOutcome:
+	# Each worker loads its test afresh by name so that no simulator state is shared with other tests
+	result = TestResult()
+	begin = perf_counter()
+	try:
+		test = TestLoader().loadTestsFromName(name)
+	except Exception as error:
+		return TestOutcome(name, 'error', perf_counter() - begin, f'Failed to load test: {error!r}')
+	test.run(result)
+	duration = perf_counter() - begin
+
+	if result.errors:
+		return TestOutcome(name, 'error', duration, result.errors[0][1])
+	elif result.failures:
+		return TestOutcome(name, 'fail', duration, result.failures[0][1])
+	elif result.unexpectedSuccesses:
+		return TestOutcome(name, 'fail', duration, 'Unexpected success')
+	elif result.skipped:
+		return TestOutcome(name, 'skip', duration, result.skipped[0][1])
+	return TestOutcome(name, 'pass', duration)
+
+def _report(outcome : TestOutcome):
+	print(f'{outcome.name} ... {outcome.status} ({outcome.duration:.2f}s)', flush = True)
+
+def runTests(names : Sequence[str], *, jobs : int = 1) -> List[TestOutcome]:
+	'''Run the named tests, spreading them across jobs worker processes, returning outcomes in order'''
+	if jobs == 1 or len(names) <= 1:
+		outcomes = []
+		for name in names:
+			outcome = _runTest(name)
+			_report(outcome)
+			outcomes.append(outcome)
+		return outcomes
+
+	from concurrent.futures import ProcessPoolExecutor, as_completed
+	outcomes = {}
+	with ProcessPoolExecutor(max_workers = jobs) as executor:
+		futures = {executor.submit(_runTest, name): name for name in names}
+		for future in as_completed(futures):
+			name = futures[future]
+			try:
+				outcome = future.result()
+			except Exception as error:
+				# The worker itself died, so record that against the test it was running
+				outcome = TestOutcome(name, 'error', 0.0, f'Worker failed: {error!r}')
+			_report(outcome)
+			outcomes[name] = outcome
+	return [outcomes[name] for name in names]
+
+def printSummary(outcomes : Sequence[TestOutcome], elapsed : float, *, slowest : int = 5):
+	for outcome in outcomes:
+		if outcome.status in ('fail', 'error'):
+			print('=' * 70)
+			print(f'{outcome.status.upper()}: {outcome.name}')
+			print('-' * 70)
+			print(outcome.details)
+
+	if slowest:
+		print('-' * 70)
+		print('Slowest tests:')
+		for outcome in sorted(outcomes, key = lambda outcome: outcome.duration, reverse = True)[:slowest]:
+			print(f'  {outcome.duration:8.2f}s {outcome.name}')
+
+	failures = sum(outcome.status == 'fail' for outcome in outcomes)
+	errors = sum(outcome.status == 'error' for outcome in outcomes)
+	skipped = sum(outcome.status == 'skip' for outcome in outcomes)
+	print('-' * 70)
+	print(f'Ran {len(outcomes)} tests in {elapsed:.3f}s')
+	counts = ', '.join(
+		f'{name}={count}' for name, count in (('failures', failures), ('errors', errors), ('skipped', skipped))
+		if count
+	)
+	if failures or errors:
+		print(f'FAILED ({counts})')
+	else:
+		print(f'OK ({counts})' if counts else 'OK')
+
+def writeJUnit(outcomes : Sequence[TestOutcome], fileName : str, *, elapsed : Optional[float] = None):
+	'''Write the outcomes out as a JUnit-style XML report'''
+	from xml.etree.ElementTree import Element, SubElement, ElementTree
+
+	if elapsed is None:
+		elapsed = sum(outcome.duration for outcome in outcomes)
+	suites = Element('testsuites')
+	suite = SubElement(suites, 'testsuite',
+		name = 'openpicle.sim',
+		tests = str(len(outcomes)),
+		failures = str(sum(outcome.status == 'fail' for outcome in outcomes)),
+		errors = str(sum(outcome.status == 'error' for outcome in outcomes)),
+		skipped = str(sum(outcome.status == 'skip' for outcome in outcomes)),
+		time = f'{elapsed:.3f}',
+	)
+	for outcome in outcomes:
+		className, _, testName = outcome.name.rpartition('.')
+		case = SubElement(suite, 'testcase', classname = className, name = testName,
+			time = f'{outcome.duration:.3f}')
+		if outcome.status == 'fail':
+			failure = SubElement(case, 'failure', message = outcome.details.strip().splitlines()[-1])
+			failure.text = outcome.details
+		elif outcome.status == 'error':
+			error = SubElement(case, 'error', message = outcome.details.strip().splitlines()[-1])
+			error.text = outcome.details
+		elif outcome.status == 'skip':
+			SubElement(case, 'skipped', message = outcome.details)
+	ElementTree(suites).write(fileName, encoding = 'utf-8', xml_declaration = True)
@@ -0,0 +1,444 @@
+# SPDX-License-Identifier: BSD-3-Clause
+from typing import Dict, Iterable, List, NamedTuple, Optional, Sequence, Set, Tuple
+
+__all__ = (
+	'FetchLatency',
+	'BasicBlock',
+	'Loop',
+	'Routine',
+	'Analysis',
+	'stackLimit',
+	'measureFetchLatency',
+	'analyse',
+	'printAnalysis',
+)
+
+# Entries in the core's CallStack
+stackLimit = 8
+# Cycles in one 4-Q instruction slot
+_slotCycles = 4
+
+class FetchLatency(NamedTuple):
+	'''Cycles from the core reading an instruction to the word being ready, for fetches of the word after the
+	previous one and for any other (after a flow change or taken skip). A synchronous ROM takes 1 for both.'''
+	sequential : int = 1
+	jump : int = 1
+
+class BasicBlock(NamedTuple):
+	start : int
+	end : int
+	# Cost of running the block through once when entered by a jump, not counting any routines it calls
+	cycles : int
+	successors : Tuple[int, ...]
+
+class Loop(NamedTuple):
+	header : int
+	# The instruction branching back to the header
+	latch : int
+	routine : int
+	bound : Optional[int]
+	# The longest single pass through the loop, back to its header
+	iterationCycles : int
+	# Worst case from entering the loop to leaving it, or None for a loop that never exits
+	cycles : Optional[int]
+
+class Routine(NamedTuple):
+	address : int
+	name : str
+	# Worst case from the routine being called to it returning, or None if it never returns
+	cycles : Optional[int]
+	# The deepest the call stack gets below the routine, not counting the call to it
+	stackDepth : int
+	calls : Tuple[int, ...]
+
+class Analysis(NamedTuple):
+	blocks : Tuple[BasicBlock, ...]
+	routines : Tuple[Routine, ...]
+	loops : Tuple[Loop, ...]
+	# The deepest the call stack gets, including an interrupt taken at the worst point
+	stackDepth : int
+
+def measureFetchLatency(*, continuousRead : bool = False, fullRate : bool = False, dummyCycles : int = 4) -> FetchLatency:
+	'''Simulate the QSPI Controller to find its fetch latency with the given options'''
+	from torii import Elaboratable, Module, Fragment
+	from torii.sim import Simulator, Settle
+	from .soc.busses.qspi.controller import Controller
+	from .soc.busses.qspi.flash import FlashPlatform
+
+	class DUT(Elaboratable):
+		def __init__(self):
+			self.platform = FlashPlatform()
+			self.controller = Controller(
+				('qspi-flash', 0), continuousRead = continuousRead, fullRate = fullRate, dummyCycles = dummyCycles
+			)
+
+		def elaborate(self, platform):
+			m = Module()
+			# The controller requests its flash resource during elaboration, so stand in a platform for it
+			m.submodules.controller = Fragment.get(self.controller, self.platform)
+			return m
+
+	dut = DUT()
+	controller = dut.controller
+	latencies = []
+
+	def process():
+		# The first read takes the flash into continuous read mode, which the rest then make use of
+		for address in (0x0000, 0x0100, 0x0102, 0x0200):
+			yield controller.address.eq(address)
+			yield controller.read.eq(1)
+			cycles = 1
+			while True:
+				yield Settle()
+				if (yield controller.complete):
+					break
+				yield
+				cycles += 1
+			yield controller.read.eq(0)
+			yield
+			latencies.append(cycles)
+
+	sim = Simulator(dut)
+	sim.add_clock(1 / 25e6)
+	sim.add_sync_process(process)
+	sim.run()
+	return FetchLatency(sequential = latencies[2], jump = max(latencies[1], latencies[3]))
+
+class _Flow(NamedTuple):
+	# Instructions that can follow, and whether each is fetched sequentially, None being a return
+	successors : Tuple[Tuple[Optional[int], bool], ...]
+	call : Optional[int] = None
+	# Whether the first successor is a fused GOTO's target, reached through the GOTO's own slot when it's not
+	# in the loop buffer
+	fused : bool = False
+	# Whether running the instruction can replace the GOTO in the loop buffer
+	loadsLoopBuffer : bool = False
+
+def _flow(program : Sequence[int], pc : int, *, fuseLoops : bool, computedBranches : Dict[int, Sequence[int]]) -> _Flow:
+	from .pic16.decoder import decodeTable
+	from .pic16.types import Opcodes
+
+	def word(address):
+		return program[address] & 0x3FFF if address < len(program) else 0
+
+	decoded = decodeTable[word(pc)]
+	opcode = decoded.opcode
+	following = (pc + 1) & 0xFFF
+	if opcode == Opcodes.GOTO:
+		return _Flow(((decoded.target, False),), loadsLoopBuffer = True)
+	elif opcode == Opcodes.CALL:
+		# The return comes back to the instruction after the call, but as a jump. The routine called may
+		# run GOTOs of its own.
+		return _Flow(((following, False),), call = decoded.target, loadsLoopBuffer = True)
+	elif opcode in (Opcodes.RETURN, Opcodes.RETLW, Opcodes.RETFIE):
+		return _Flow(((None, False),))
+	elif opcode == Opcodes.BRA:
+		return _Flow((((pc + 1 + decoded.offset) & 0xFFF, False),))
+	elif opcode == Opcodes.BRW:
+		if pc not in computedBranches:
+			raise ValueError(f'The BRW at {pc:#05x} needs its targets given in computedBranches')
+		return _Flow(tuple((target, target == following) for target in computedBranches[pc]))
+	elif opcode in (Opcodes.DECFSZ, Opcodes.INCFSZ, Opcodes.BTFSC, Opcodes.BTFSS):
+		skipped = ((pc + 2) & 0xFFF, False)
+		branch = decodeTable[word(following)]
+		# A fused skip and GOTO run as the one slot
+		if fuseLoops and opcode in (Opcodes.DECFSZ, Opcodes.INCFSZ) and branch.opcode == Opcodes.GOTO:
+			return _Flow(((branch.target, False), skipped), fused = True, loadsLoopBuffer = True)
+		return _Flow(((following, True), skipped))
+	return _Flow(((following, True),))
+
+class _Analyser:
+	def __init__(self, program, *, loopBounds, fetchLatency, fuseLoops, computedBranches):
+		self.program = program
+		self.loopBounds = loopBounds
+		self.fuseLoops = fuseLoops
+		self.computedBranches = computedBranches
+		# Cycles the core is held waiting on each kind of fetch
+		self.stalls = {True: fetchLatency.sequential - 1, False: fetchLatency.jump - 1}
+		# What a fused skip missing the loop buffer costs, fetching and running its GOTO
+		self.loopBufferMiss = self.stalls[True] + _slotCycles
+		self.flows : Dict[int, _Flow] = {}
+		self.routines : Dict[int, Routine] = {}
+		self.loops : List[Loop] = []
+		self.active : Set[int] = set()
+
+	def flow(self, pc):
+		if pc not in self.flows:
+			self.flows[pc] = _flow(
+				self.program, pc, fuseLoops = self.fuseLoops, computedBranches = self.computedBranches
+			)
+		return self.flows[pc]
+
+	def routine(self, entry : int, name : str) -> Routine:
+		if entry in self.routines:
+			return self.routines[entry]
+		if entry in self.active:
+			raise ValueError(f'The routine at {entry:#05x} is recursive, so has no worst case')
+		self.active.add(entry)
+
+		# Find the instructions of the routine, analysing the routines it calls on the way so calls to
+		# ones that never return can be left without a successor
+		cost : Dict[int, Optional[int]] = {}
+		edges : Dict[int, List[Tuple[Optional[int], int]]] = {}
+		calls = []
+		pending = [entry]
+		while pending:
+			pc = pending.pop()
+			if pc in cost:
+				continue
+			flow = self.flow(pc)
+			cost[pc] = _slotCycles
+			successors = flow.successors
+			if flow.call is not None:
+				callee = self.routine(flow.call, f'{flow.call:#05x}')
+				calls.append(callee)
+				if callee.cycles is None:
+					successors = ()
+				else:
+					cost[pc] += callee.cycles
+			# Returning costs nothing more here, the fetch it leads to being charged to the caller
+			edges[pc] = [
+				(target, 0 if target is None else self.stalls[sequential]) for target, sequential in successors
+			]
+			if flow.fused:
+				target, stall = edges[pc][0]
+				edges[pc][0] = (target, stall + self.loopBufferMiss)
+			pending.extend(target for target, _ in successors if target is not None)
+
+		owner = {pc: pc for pc in cost}
+		for header, latch, body in self.findLoops(entry, edges):
+			self.collapse(entry, header, latch, body, owner, cost, edges)
+
+		within = set(owner.values())
+		start = owner[entry]
+		dist = self.longestPaths(start, within, owner, cost, edges)
+		returns = [
+			dist[node] + stall for node in dist if dist[node] is not None
+			for target, stall in edges[node] if target is None
+		]
+		cycles = self.stalls[False] + max(returns) if returns else None
+
+		stackDepth = max((callee.stackDepth + 1 for callee in calls), default = 0)
+		routine = Routine(entry, name, cycles, stackDepth, tuple(sorted({callee.address for callee in calls})))
+		self.active.remove(entry)
+		self.routines[entry] = routine
+		return routine
+
+	def findLoops(self, entry, edges) -> List[Tuple[int, int, Set[int]]]:
+		'''Find each loop as its header, the instruction branching back to it and the instructions within'''
+		predecessors : Dict[int, Set[int]] = {pc: set() for pc in edges}
+		for pc, successors in edges.items():
+			for target, _ in successors:
+				if target is not None:
+					predecessors[target].add(pc)
+
+		# Work out the dominators, iterating to a fixed point
+		nodes = set(edges)
+		dominators = {pc: set(nodes) for pc in nodes}
+		dominators[entry] = {entry}
+		changed = True
+		while changed:
+			changed = False
+			for pc in sorted(nodes - {entry}):
+				incoming = [dominators[source] for source in predecessors[pc]]
+				updated = {pc} | (set.intersection(*incoming) if incoming else set())
+				if updated != dominators[pc]:
+					dominators[pc] = updated
+					changed = True
+
+		loops = []
+		for latch, successors in edges.items():
+			for header, _ in successors:
+				if header is None or header not in dominators[latch]:
+					continue
+				body = {header}
+				pending = [latch]
+				while pending:
+					pc = pending.pop()
+					if pc not in body:
+						body.add(pc)
+						pending.extend(predecessors[pc])
+				loops.append((header, latch, body))
+
+		# Loops are collapsed innermost first, which for loops sharing a header is taken to be the one
+		# closed nearest to it. Each loop then takes in the loops nested in it.
+		loops.sort(key = lambda loop: (len(loop[2]), abs(loop[1] - loop[0])))
+		for index, (header, _, body) in enumerate(loops):
+			for _, _, inner in loops[:index]:
+				if not inner.isdisjoint(body):
+					body |= inner
+		return loops
+
+	def collapse(self, entry, header, latch, body, owner, cost, edges):
+		'''Replace the loop with a single node costing its worst case, leaving by any of its exits'''
+		within = {owner[pc] for pc in body}
+		start = owner[header]
+		# A fused latch closing a loop nothing else in runs a GOTO only misses the loop buffer on the first pass
+		missOnce = owner[latch] == latch and self.flows[latch].fused and not any(
+			self.flows[pc].loadsLoopBuffer for pc in body if pc != latch
+		)
+		dist = self.longestPaths(start, within, owner, cost, edges, exclude = start)
+		iterations = [
+			dist[node] + stall - (self.loopBufferMiss if missOnce and node == latch else 0)
+			for node in dist if dist[node] is not None
+			for target, stall in edges[node] if target is not None and owner[target] == start
+		]
+		exits = [
+			(node, target, stall) for node in dist if dist[node] is not None
+			for target, stall in edges[node] if target is None or owner[target] not in within
+		]
+		iterationCycles = max(iterations, default = 0)
+
+		if exits:
+			bound = self.loopBounds.get(latch)
+			if bound is None:
+				raise ValueError(f'No bound given for the loop at {header:#05x} closed at {latch:#05x}')
+			exitCycles = max(dist[node] for node, _, _ in exits)
+			cycles = (bound - 1) * iterationCycles + exitCycles
+			if missOnce and bound > 1:
+				cycles += self.loopBufferMiss
+		else:
+			bound = self.loopBounds.get(latch)
+			cycles = None
+		self.loops.append(Loop(header, latch, entry, bound, iterationCycles, cycles))
+
+		# The worst exit is taken with the worst fetch stall on leaving, which can only overestimate
+		worstStall = max((stall for _, _, stall in exits), default = 0)
+		for pc in body:
+			owner[pc] = start
+		cost[start] = cycles
+		edges[start] = [(target, worstStall) for target in {target for _, target, _ in exits}]
+
+	def longestPaths(self, start, within, owner, cost, edges, *, exclude = None) -> Dict[int, Optional[int]]:
+		'''The worst case cost from start to the end of each node reachable from it'''
+		def targets(node):
+			for target, stall in edges[node]:
+				if target is None:
+					continue
+				target = owner[target]
+				if target in within and target != exclude:
+					yield target, stall
+
+		# Order the reachable nodes topologically, which also checks no unbounded cycles remain
+		order = []
+		state = {start: False}
+		stack = [(start, targets(start))]
+		while stack:
+			node, pending = stack[-1]
+			for target, _ in pending:
+				if target not in state:
+					state[target] = False
+					stack.append((target, targets(target)))
+					break
+				elif not state[target]:
+					raise ValueError(f'The flow around {node:#05x} is irreducible and cannot be bounded')
+			else:
+				stack.pop()
+				state[node] = True
+				order.append(node)
+
+		dist : Dict[int, Optional[int]] = {start: cost[start]}
+		for node in reversed(order):
+			if dist.get(node) is None:
+				dist.setdefault(node, None)
+				continue
+			for target, stall in targets(node):
+				if cost[target] is None:
+					dist.setdefault(target, None)
+				elif dist.get(target) is None or dist[node] + stall + cost[target] > dist[target]:
+					dist[target] = dist[node] + stall + cost[target]
+		return dist
+
+	def blocks(self) -> Tuple[BasicBlock, ...]:
+		leaders = set(routine.address for routine in self.routines.values())
+		for pc, flow in self.flows.items():
+			if len(flow.successors) != 1 or not flow.successors[0][1] or flow.call is not None:
+				leaders.update(target for target, _ in flow.successors if target is not None)
+		blocks = []
+		for leader in sorted(leaders):
+			pc = leader
+			cycles = self.stalls[False] + _slotCycles
+			while True:
+				successors = self.flows[pc].successors
+				following = successors[0][0] if len(successors) == 1 and successors[0][1] else None
+				if following is None or following in leaders or self.flows[pc].call is not None:
+					break
+				pc = following
+				cycles += self.stalls[True] + _slotCycles
+			blocks.append(BasicBlock(
+				leader, pc, cycles, tuple(sorted(target for target, _ in successors if target is not None))
+			))
+		return tuple(blocks)
+
+def analyse(
+	program : Sequence[int], *, loopBounds : Dict[int, int] = {}, fetchLatency : FetchLatency = FetchLatency(),
+	fuseLoops : bool = False, interrupts : bool = False, computedBranches : Dict[int, Iterable[int]] = {}
+) -> Analysis:
+	'''Work out the worst case execution time of each routine in a program image and the deepest the call
+	stack gets, under the 4-Q core's timing.
+
+	Every instruction takes a 4 cycle slot, taken skips stepping over the next instruction without spending
+	a slot on it, and with fuseLoops a DECFSZ or INCFSZ followed by a GOTO runs as one slot as the core
+	built with the same option does once the GOTO is in its loop buffer. The GOTO is only taken to be there
+	from the second pass of a loop it closes on, and then only if nothing else in the loop (including any
+	routine it calls) runs a GOTO. The GOTOs an interrupt handler runs are not accounted for. If a fetch
+	unit holds the core while it waits on the instruction, as with the QSPI Controller, fetchLatency gives
+	the cycles for each fetch (see :func:`measureFetchLatency`), every cycle past the first stalling the
+	core. The entry of each routine and the instruction after a flow change, taken skip or call are fetched
+	as jumps.
+
+	loopBounds gives the most times each loop's header runs each time the loop is entered, keyed by the
+	address of the instruction branching back to the header. Loops that never exit need no bound, leaving
+	the routine they are in without a worst case, but their single pass worst case is still reported. BRW
+	targets must be given in computedBranches, keyed by the address of the BRW. Branch targets are taken to
+	be in the first 2K page, as MOVLP isn't tracked.
+	'''
+	analyser = _Analyser(
+		program, loopBounds = loopBounds, fetchLatency = fetchLatency, fuseLoops = fuseLoops,
+		computedBranches = computedBranches
+	)
+	reset = analyser.routine(0x000, 'reset')
+	stackDepth = reset.stackDepth
+	if interrupts:
+		# The interrupt can be taken at the deepest point of the main line, and takes an entry of its own
+		handler = analyser.routine(0x004, 'interrupt')
+		stackDepth += handler.stackDepth + 1
+	return Analysis(
+		analyser.blocks(),
+		tuple(sorted(analyser.routines.values(), key = lambda routine: routine.address)),
+		tuple(analyser.loops),
+		stackDepth,
+	)
+
+def printAnalysis(analysis : Analysis, *, frequency : Optional[float] = None):
+	def formatCycles(cycles):
+		if cycles is None:
+			return f'{"unbounded":>12}'
+		if frequency is not None:
+			return f'{cycles:>12} ({cycles / frequency * 1e6:,.2f}µs)'
+		return f'{cycles:>12}'
+
+	print(f'{"block":<13} {"cycles":>8}  successors')
+	for block in analysis.blocks:
+		successors = ', '.join(f'{target:#05x}' for target in block.successors) or '-'
+		print(f'{block.start:#05x}-{block.end:#05x}   {block.cycles:>8}  {successors}')
+
+	print()
+	print(f'{"loop":<13} {"routine":<8} {"bound":>8} {"pass":>8} {"worst case":>12}')
+	for loop in analysis.loops:
+		bound = '-' if loop.bound is None else loop.bound
+		print(
+			f'{loop.header:#05x}-{loop.latch:#05x}   {loop.routine:#05x}    {bound:>8} {loop.iterationCycles:>8} '
+			f'{formatCycles(loop.cycles)}'
+		)
+
+	print()
+	print(f'{"routine":<16} {"stack":>5} {"worst case":>12}  calls')
+	for routine in analysis.routines:
+		calls = ', '.join(f'{call:#05x}' for call in routine.calls) or '-'
+		name = f'{routine.address:#05x} {routine.name}' if routine.name != f'{routine.address:#05x}' else routine.name
+		print(f'{name:<16} {routine.stackDepth:>5} {formatCycles(routine.cycles)}  {calls}')
+
+	print()
+	verdict = 'fits' if analysis.stackDepth <= stackLimit else 'overflows'
+	print(f'Call stack depth {analysis.stackDepth} of {stackLimit}, which {verdict}')